@@ -2,6 +2,11 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 # from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
 from database import db_manager
+from retrain_jobs import RetrainQueue, exclusive, model_channel, open_registry, publish
+from online_model import OnlineSpamModel
+from model_registry import ModelRegistryError, training_set_hash
+from spam_scorer import compile_pipeline
+from verdict_cache import VerdictCache
 import joblib
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
@@ -78,6 +83,24 @@ class Config:
     
     # OCR configuration
     TESSERACT_PATH = os.getenv('TESSERACT_PATH', '/usr/bin/tesseract')
+    
+    # Batch analysis configuration
+    BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 100))
+    
+    # Incremental learning: /retrain updates a hashed NB model with partial_fit
+    ONLINE_LEARNING = os.getenv('ONLINE_LEARNING', 'false').lower() == 'true'
+    
+    # Model registry: every trained model is a checksummed version, hot-swapped by every worker
+    MODEL_REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR', 'model_registry')
+    # Background retraining: job table and trainer lock
+    MODEL_DIR = os.getenv('MODEL_DIR', 'models')
+    MODEL_RELOAD_CHECK_SECONDS = float(os.getenv('MODEL_RELOAD_CHECK_SECONDS', 2))
+    
+    # Verdict cache, keyed by text and model version; emptied whenever the active version changes
+    VERDICT_CACHE_ENABLED = os.getenv('VERDICT_CACHE_ENABLED', 'true').lower() == 'true'
+    VERDICT_CACHE_SIZE = int(os.getenv('VERDICT_CACHE_SIZE', 10000))
+    VERDICT_CACHE_TTL = int(os.getenv('VERDICT_CACHE_TTL', 3600))
+    VERDICT_CACHE_SHARED_PATH = os.getenv('VERDICT_CACHE_SHARED_PATH')  # e.g. /tmp/spam_verdicts.sqlite
 
 config = Config()
 
@@ -92,98 +115,130 @@ if config.TESSERACT_PATH:
 # Load the spam detection model
 MODEL_PATH = 'spam_model.joblib'
 model = None
+model_version = None
+model_pointer_mtime = None
+model_checked_at = 0.0
+model_registry = open_registry(config.MODEL_REGISTRY_DIR)
+active_channel = model_channel(config.ONLINE_LEARNING)
+retrain_queue = RetrainQueue(config.MODEL_DIR, config.MODEL_REGISTRY_DIR, online=config.ONLINE_LEARNING)
+verdict_cache = VerdictCache(
+    max_entries=config.VERDICT_CACHE_SIZE,
+    ttl_seconds=config.VERDICT_CACHE_TTL,
+    shared_path=config.VERDICT_CACHE_SHARED_PATH
+) if config.VERDICT_CACHE_ENABLED else None
 
-def load_model():
-    """Load the trained spam detection model"""
-    global model
+# Built-in sample training data
+DEFAULT_TRAINING_DATA = [
+    ("Congratulations! You've won $1000! Click here now!", 1),
+    ("Get rich quick! Make money fast!", 1),
+    ("Free trial! Limited time offer!", 1),
+    ("URGENT: Your account will be suspended!", 1),
+    ("You have won a lottery! Claim your prize now!", 1),
+    ("Click here for exclusive deals! Act now!", 1),
+    ("Meeting scheduled for tomorrow at 2 PM", 0),
+    ("Please review the attached document", 0),
+    ("How was your weekend?", 0),
+    ("Thank you for your email. I will respond shortly.", 0),
+    ("The project deadline has been extended to next week.", 0),
+    ("Please find the requested information below.", 0),
+    ("Can we schedule a call for this afternoon?", 0),
+    ("The meeting has been moved to conference room B.", 0)
+]
+
+def load_active_model():
+    """Load the channel's active registry version; returns False if none is set"""
+    global model, model_version, model_pointer_mtime
+    pointer_mtime = model_registry.pointer_mtime(active_channel)
+    active = model_registry.load_active(active_channel)
+    if active is None:
+        return False
+    
+    # Rebinding the global is atomic; requests already running keep the model they started with
+    manifest, model = active
+    model_version = manifest['version']
+    model_pointer_mtime = pointer_mtime
+    if verdict_cache is not None:
+        verdict_cache.set_model_version(model_version)
+    logger.info(f"Spam detection model version {model_version} ({manifest['format']}) loaded from the registry")
+    return True
+
+def refresh_active_model():
+    """Hot-swap in a newly activated version, checking the pointer at most every few seconds"""
+    global model_checked_at, model_pointer_mtime
+    now = time.monotonic()
+    if now - model_checked_at < config.MODEL_RELOAD_CHECK_SECONDS:
+        return
+    model_checked_at = now
+    
+    pointer_mtime = model_registry.pointer_mtime(active_channel)
+    if pointer_mtime is None or pointer_mtime == model_pointer_mtime:
+        return
+    if model_registry.active_version(active_channel) == model_version:
+        model_pointer_mtime = pointer_mtime
+        return
     try:
-        # Try to load from current directory first
-        if os.path.exists(MODEL_PATH):
-            model = joblib.load(MODEL_PATH)
-            logger.info(f"Spam detection model loaded successfully from {MODEL_PATH}")
-            return
-        
-        # Try to load from backend directory
-        backend_model_path = os.path.join('backend', MODEL_PATH)
-        if os.path.exists(backend_model_path):
-            model = joblib.load(backend_model_path)
-            logger.info(f"Spam detection model loaded successfully from {backend_model_path}")
-            return
-        
-        # If no model found, create default
-        logger.warning(f"Model file not found. Creating default model...")
-        create_default_model()
-        
+        load_active_model()
     except Exception as e:
-        logger.error(f"Error loading model: {e}")
-        logger.info("Attempting to create default model...")
-        create_default_model()
+        logger.error(f"Error hot-swapping registry model: {e}")
+
+def predict_spam(texts):
+    """Return (labels, probabilities) for a list of email texts, through the verdict cache"""
+    current = model
+    if verdict_cache is None:
+        return current.predict_with_proba(texts)
+    
+    verdicts = [verdict_cache.get(text) for text in texts]
+    misses = [index for index, verdict in enumerate(verdicts) if verdict is None]
+    if misses:
+        labels, probabilities = current.predict_with_proba([texts[index] for index in misses])
+        for position, index in enumerate(misses):
+            verdicts[index] = (labels[position], probabilities[position])
+            verdict_cache.put(texts[index], labels[position], probabilities[position])
+    return np.array([verdict[0] for verdict in verdicts]), np.array([verdict[1] for verdict in verdicts])
 
-def create_default_model():
-    """Create a default model if the trained model doesn't exist"""
+def register_first_model():
+    """Publish a first version when the channel has none; returns False if there is nothing to publish
+
+    Online learning starts from counts seeded with the sample data and learns from /retrain.
+    A full-retrain deployment imports a trained spam_model.joblib pipeline, compiled to the
+    mapped format; without one it serves no model until a /retrain job publishes one.
+    """
+    texts = [item[0] for item in DEFAULT_TRAINING_DATA]
+    labels = [item[1] for item in DEFAULT_TRAINING_DATA]
+    if config.ONLINE_LEARNING:
+        online_model = OnlineSpamModel()
+        online_model.partial_fit(texts, labels)
+        with exclusive(model_registry):
+            manifest = publish(model_registry, active_channel, online_model.save,
+                               training_set_hash=training_set_hash(zip(texts, labels)), samples=len(texts))
+        logger.warning(f"Online spam model seeded with {len(texts)} sample emails as version {manifest['version']}; "
+                       f"POST labeled emails to /retrain to train it")
+        return True
+    
+    for path in (MODEL_PATH, os.path.join('backend', MODEL_PATH)):
+        if os.path.exists(path):
+            scorer = compile_pipeline(joblib.load(path))
+            with exclusive(model_registry):
+                manifest = publish(model_registry, active_channel, scorer.save_mapped, imported_from=path)
+            logger.info(f"Spam model pipeline {path} imported as registry version {manifest['version']}")
+            return True
+    return False
+
+def load_model():
+    """Load the active registry version, importing or seeding a first one on an empty registry"""
     global model
     try:
-        logger.info("Creating default spam detection model...")
-        
-        # Enhanced sample training data
-        training_data = [
-            ("Congratulations! You've won $1000! Click here now!", 1),
-            ("Get rich quick! Make money fast!", 1),
-            ("Free trial! Limited time offer!", 1),
-            ("URGENT: Your account will be suspended!", 1),
-            ("You have won a lottery! Claim your prize now!", 1),
-            ("Click here for exclusive deals! Act now!", 1),
-            ("Meeting scheduled for tomorrow at 2 PM", 0),
-            ("Please review the attached document", 0),
-            ("How was your weekend?", 0),
-            ("Thank you for your email. I will respond shortly.", 0),
-            ("The project deadline has been extended to next week.", 0),
-            ("Please find the requested information below.", 0),
-            ("Can we schedule a call for this afternoon?", 0),
-            ("The meeting has been moved to conference room B.", 0)
-        ]
-        
-        texts = [item[0] for item in training_data]
-        labels = [item[1] for item in training_data]
-        
-        # Create pipeline with more robust settings
-        from sklearn.feature_extraction.text import TfidfVectorizer
-        from sklearn.naive_bayes import MultinomialNB
-        from sklearn.pipeline import make_pipeline
-        
-        vectorizer = TfidfVectorizer(
-            max_features=1000,
-            stop_words='english',
-            ngram_range=(1, 2),
-            min_df=1,
-            max_df=0.95
-        )
-        
-        model = make_pipeline(vectorizer, MultinomialNB(alpha=1.0))
-        model.fit(texts, labels)
-        
-        # Save the default model
-        try:
-            joblib.dump(model, MODEL_PATH)
-            logger.info(f"Default spam detection model created and saved to {MODEL_PATH}")
-        except Exception as save_error:
-            logger.warning(f"Could not save model to {MODEL_PATH}: {save_error}")
-            logger.info("Model created in memory only")
-        
-        # Test the model
-        test_prediction = model.predict(["Test email content"])[0]
-        logger.info(f"Model test successful, prediction: {test_prediction}")
-        
-    except Exception as e:
-        logger.error(f"Error creating default model: {e}", exc_info=True)
-        # Create a very basic fallback
-        try:
-            model = make_pipeline(TfidfVectorizer(), MultinomialNB())
-            model.fit(["spam message", "normal message"], [1, 0])
-            logger.info("Created minimal fallback model")
-        except Exception as fallback_error:
-            logger.error(f"Failed to create even fallback model: {fallback_error}")
-            model = None
+        if load_active_model():
+            return
+        if register_first_model():
+            load_active_model()
+            return
+        logger.error(f"No {active_channel} model in registry {config.MODEL_REGISTRY_DIR} and no {MODEL_PATH} "
+                     f"to import; spam detection is unavailable until a /retrain job publishes one")
+    except (ModelRegistryError, ValueError, OSError) as e:
+        # Never quietly replace the active version with a model trained on the sample data
+        logger.error(f"Spam detection model could not be loaded, spam detection disabled: {e}")
+    model = None
 
 # Initialize database and load model
 try:
@@ -194,6 +249,11 @@ except Exception as e:
 
 load_model()
 
+@app.before_request
+def check_for_new_model():
+    """Pick up models published by the background trainer or other workers"""
+    refresh_active_model()
+
 # Utility functions
 def validate_email(email):
     """Validate email format"""
@@ -487,7 +547,8 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'model_version': model_version
     })
 
 @app.route('/register', methods=['POST'])
@@ -597,8 +658,8 @@ def analyze_email():
         
         # Predict spam probability
         logger.debug("Making prediction with model")
-        prediction = model.predict([email_text])[0]
-        probabilities = model.predict_proba([email_text])[0]
+        predictions, probabilities = predict_spam([email_text])
+        prediction, probabilities = predictions[0], probabilities[0]
         
         is_spam = bool(prediction)
         confidence = float(max(probabilities))
@@ -633,6 +694,80 @@ def analyze_email():
         logger.error(f"Analysis error: {str(e)}", exc_info=True)
         return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
 
+@app.route('/analyze/batch', methods=['POST'])
+@custom_jwt_required
+@rate_limit(max_requests=20, window=60)
+def analyze_batch():
+    """Analyze many emails with a single vectorizer/model call"""
+    try:
+        if not model:
+            logger.error("Model not available")
+            return jsonify({'error': 'Spam detection model not available. Please try again later.'}), 500
+        
+        data = request.get_json()
+        if not data or not isinstance(data.get('texts'), list) or not data['texts']:
+            return jsonify({'error': 'A non-empty list of email texts is required'}), 400
+        
+        texts = data['texts']
+        if len(texts) > config.BATCH_MAX_ITEMS:
+            return jsonify({'error': f'Too many emails in batch (maximum {config.BATCH_MAX_ITEMS})'}), 400
+        
+        logger.info(f"Analyzing batch of {len(texts)} emails")
+        
+        # Keep invalid items in place so results line up with the request
+        results = [None] * len(texts)
+        valid_indices = []
+        valid_texts = []
+        for index, item in enumerate(texts):
+            if not isinstance(item, str) or len(item.strip()) < 10:
+                results[index] = {'index': index, 'error': 'Email text too short for analysis (minimum 10 characters)'}
+                continue
+            valid_indices.append(index)
+            valid_texts.append(item.strip())
+        
+        # One transform + predict_proba over the whole batch
+        if valid_texts:
+            predictions, probabilities = predict_spam(valid_texts)
+        
+        user_id = request.current_user_id
+        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR'))
+        history_rows = []
+        
+        for position, index in enumerate(valid_indices):
+            item_probabilities = probabilities[position]
+            is_spam = bool(predictions[position])
+            confidence = float(max(item_probabilities))
+            
+            results[index] = {
+                'index': index,
+                'is_spam': is_spam,
+                'confidence': confidence,
+                'analysis': {
+                    'spam_probability': float(item_probabilities[1]) if len(item_probabilities) > 1 else confidence,
+                    'ham_probability': float(item_probabilities[0]) if len(item_probabilities) > 1 else 1 - confidence
+                }
+            }
+            history_rows.append((user_id, valid_texts[position], is_spam, confidence, 'batch', client_ip))
+        
+        # Save all analyses with one multi-row insert
+        try:
+            db_manager.save_analyses(history_rows)
+            logger.info(f"Saved {len(history_rows)} batch analyses to database")
+        except Exception as db_error:
+            logger.error(f"Failed to save batch analyses to database: {db_error}")
+            # Don't fail the request if database save fails
+        
+        return jsonify({
+            'results': results,
+            'total': len(texts),
+            'analyzed': len(valid_indices),
+            'spam_count': sum(1 for row in history_rows if row[2])
+        })
+        
+    except Exception as e:
+        logger.error(f"Batch analysis error: {str(e)}", exc_info=True)
+        return jsonify({'error': f'Batch analysis failed: {str(e)}'}), 500
+
 @app.route('/analyze-image', methods=['POST'])
 @custom_jwt_required
 @rate_limit(max_requests=20, window=60)
@@ -670,8 +805,8 @@ def analyze_image():
             return jsonify({'error': 'Model not available'}), 500
         
         # Analyze extracted text
-        prediction = model.predict([extracted_text])[0]
-        probabilities = model.predict_proba([extracted_text])[0]
+        predictions, probabilities = predict_spam([extracted_text])
+        prediction, probabilities = predictions[0], probabilities[0]
         
         is_spam = bool(prediction)
         confidence = float(max(probabilities))
@@ -874,20 +1009,72 @@ def retrain_model():
             texts.append(item['text'])
             labels.append(1 if item['is_spam'] else 0)
         
-        # Create and train new model
-        global model
-        model = make_pipeline(TfidfVectorizer(), MultinomialNB())
-        model.fit(texts, labels)
+        global model, model_version, model_pointer_mtime
+        mode = data.get('mode', 'incremental' if config.ONLINE_LEARNING else 'full')
         
-        # Save the retrained model
-        joblib.dump(model, MODEL_PATH)
+        if mode == 'incremental':
+            if not isinstance(model, OnlineSpamModel):
+                return jsonify({'error': 'Incremental retraining requires ONLINE_LEARNING=true'}), 400
+            
+            with exclusive(model_registry):
+                # Build on the newest active counts, which another worker may have published
+                if model_registry.active_version(active_channel) != model_version:
+                    load_active_model()
+                
+                # Fold the new samples into the existing counts and publish them as a new version
+                published = {}
+                timings = model.update(texts, labels, persist=lambda: published.update(
+                    publish(model_registry, active_channel, model.save, samples=len(texts))
+                ))
+                model_version = published['version']
+                model_pointer_mtime = model_registry.pointer_mtime(active_channel)
+                if verdict_cache is not None:
+                    verdict_cache.set_model_version(model_version)
+            logger.info(f"Online model updated with {len(texts)} samples in {timings['total_ms']} ms")
+            
+            return jsonify({
+                'message': f'Model updated incrementally with {len(training_data)} samples',
+                'mode': 'incremental',
+                'model_version': model_version,
+                **timings
+            })
+        
+        if mode != 'full':
+            return jsonify({'error': 'mode must be "full" or "incremental"'}), 400
         
-        return jsonify({'message': f'Model retrained successfully with {len(training_data)} samples'})
+        # Train in the background; every worker hot-swaps once the new version is published
+        job_id = retrain_queue.submit('full', texts, labels)
+        logger.info(f"Queued retrain job {job_id} with {len(texts)} samples")
+        
+        return jsonify({
+            'message': f'Retraining queued with {len(training_data)} samples',
+            'mode': 'full',
+            'job_id': job_id,
+            'status_url': f'/retrain/jobs/{job_id}'
+        }), 202
         
     except Exception as e:
         logger.error(f"Model retraining error: {e}")
         return jsonify({'error': 'Model retraining failed'}), 500
 
+@app.route('/retrain/jobs/<job_id>', methods=['GET'])
+@custom_jwt_required
+def retrain_job_status(job_id):
+    """Status of a background retrain job"""
+    try:
+        job = retrain_queue.status(job_id)
+        if not job:
+            return jsonify({'error': 'Retrain job not found'}), 404
+        
+        return jsonify({
+            **job,
+            'active_model_version': model_version
+        })
+        
+    except Exception as e:
+        logger.error(f"Retrain job status error: {e}")
+        return jsonify({'error': 'Could not get retrain job status'}), 500
+
 @app.route('/verify-token', methods=['GET'])
 @custom_jwt_required
 def verify_token():
@@ -19,6 +19,8 @@ except ImportError:
     print("pip install Flask flask-cors PyJWT python-dotenv")
     exit(1)
 
+from keyword_rules import KeywordRules, DEFAULT_PHRASES_PATH, count_uppercase
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,6 +31,11 @@ CORS(app, origins="*", allow_headers=["Content-Type", "Authorization"])
 # Configuration
 SECRET_KEY = 'local-test-key-123'
 
+# Weighted spam phrase list (phrase<TAB>weight per line), re-read when the file changes
+SPAM_PHRASES_PATH = os.environ.get('SPAM_PHRASES_PATH', DEFAULT_PHRASES_PATH)
+keyword_rules = KeywordRules(SPAM_PHRASES_PATH)
+DOLLAR_AMOUNT_RE = re.compile(r'\$\d+')
+
 # Database setup
 def init_db():
     """Initialize SQLite database"""
@@ -120,27 +127,15 @@ def jwt_required(f):
     return decorated_function
 
 def rule_based_spam_detection(text):
-    """Simple rule-based spam detection"""
+    """Rule-based spam detection: weighted phrases, caps ratio and punctuation"""
     if not text:
         return False, 0.0
     
-    text_lower = text.lower()
-    
-    # Spam indicators
-    spam_keywords = [
-        'urgent', 'winner', 'congratulations', 'free money', 'click here',
-        'limited time', 'act now', 'guaranteed', 'no risk', 'call now',
-        'make money fast', 'work from home', 'lose weight', 'viagra',
-        'casino', 'lottery', 'inheritance', 'prince', 'millions'
-    ]
-    
-    spam_score = 0
-    for keyword in spam_keywords:
-        if keyword in text_lower:
-            spam_score += 1
+    # Weighted spam phrases, all matched in one scan
+    spam_score = keyword_rules.score(text)
     
     # Check for excessive caps
-    caps_ratio = sum(1 for c in text if c.isupper()) / max(len(text), 1)
+    caps_ratio = count_uppercase(text) / max(len(text), 1)
     if caps_ratio > 0.3:
         spam_score += 2
     
@@ -150,7 +145,7 @@ def rule_based_spam_detection(text):
         spam_score += 1
     
     # Check for suspicious patterns
-    if re.search(r'\$\d+', text):  # Dollar amounts
+    if DOLLAR_AMOUNT_RE.search(text):  # Dollar amounts
         spam_score += 1
     
     confidence = min(spam_score / 10.0, 1.0)
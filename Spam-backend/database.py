@@ -3,7 +3,7 @@ Database utility functions for PostgreSQL (Neon.tech) deployment
 """
 import os
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import logging
 from datetime import datetime
 from contextlib import contextmanager
@@ -171,6 +171,22 @@ class DatabaseManager:
             logger.error(f"Error saving analysis: {e}")
             raise
     
+    def save_analyses(self, rows):
+        """Save several analyses to history with a single multi-row insert"""
+        if not rows:
+            return
+        try:
+            with self.get_db_connection() as conn:
+                cursor = conn.cursor()
+                execute_values(cursor, """
+                    INSERT INTO analysis_history (user_id, email_text, is_spam, confidence, analysis_type, ip_address)
+                    VALUES %s
+                """, rows)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error saving analyses: {e}")
+            raise
+    
     def get_user_history(self, user_id, limit=50):
         """Get user's analysis history"""
         try:
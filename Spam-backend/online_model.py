@@ -0,0 +1,134 @@
+"""
+Incrementally trainable spam model for /retrain
+Stateless HashingVectorizer features + MultinomialNB.partial_fit, so new labeled
+samples update the existing class/feature counts instead of refitting from
+scratch. The count matrices are saved as a mapped array file (format
+'online-spam-counts'), written atomically so a crash mid-save never leaves a
+torn model behind, and published as model registry versions (retrain_jobs).
+"""
+import time
+import logging
+import threading
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.naive_bayes import MultinomialNB
+
+from mapped_arrays import write_mapped_arrays, open_mapped_arrays, read_mapped_header
+
+logger = logging.getLogger(__name__)
+
+CLASSES = np.array([0, 1])
+FORMAT = 'online-spam-counts'
+
+
+class OnlineSpamModel:
+    """Hashed-feature Naive Bayes model that learns from new samples in place"""
+
+    def __init__(self, path=None, n_features=2 ** 18, ngram_range=(1, 2), alpha=1.0):
+        self.path = path
+        self.alpha = alpha
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=ngram_range,
+            stop_words='english',
+            alternate_sign=False,
+            norm='l2'
+        )
+        self.classifier = MultinomialNB(alpha=alpha)
+        self.samples_seen = 0
+        self._update_lock = threading.Lock()
+
+    @property
+    def classes_(self):
+        return self.classifier.classes_
+
+    @property
+    def is_fitted(self):
+        return hasattr(self.classifier, 'feature_count_')
+
+    def predict(self, texts):
+        return self.classifier.predict(self.vectorizer.transform(texts))
+
+    def predict_proba(self, texts):
+        return self.classifier.predict_proba(self.vectorizer.transform(texts))
+
+    def predict_with_proba(self, texts):
+        """(labels, probabilities) from one transform, like the compiled scorers"""
+        probabilities = self.predict_proba(texts)
+        return self.classes_[np.argmax(probabilities, axis=1)], probabilities
+
+    def partial_fit(self, texts, labels):
+        """Fold new samples into the existing counts; cost is O(len(texts))"""
+        features = self.vectorizer.transform(texts)
+        with self._update_lock:
+            self.classifier.partial_fit(features, np.asarray(labels), classes=CLASSES)
+            self.samples_seen += len(texts)
+
+    def save(self, path=None):
+        """Write the count matrices atomically (to self.path unless a path is given)"""
+        path = path or self.path
+        with self._update_lock:
+            feature_count = self.classifier.feature_count_.copy()
+            class_count = self.classifier.class_count_.copy()
+            samples_seen = self.samples_seen
+
+        write_mapped_arrays(path, {
+            'feature_count': feature_count,
+            'class_count': class_count,
+            'classes': CLASSES,
+        }, metadata={
+            'format': FORMAT,
+            'n_features': self.vectorizer.n_features,
+            'ngram_range': list(self.vectorizer.ngram_range),
+            'alpha': self.alpha,
+            'samples_seen': samples_seen,
+        })
+
+    def load(self, path=None):
+        """Restore counts saved by save()"""
+        path = path or self.path
+        metadata, arrays = open_mapped_arrays(path)
+        if metadata.get('format') != FORMAT:
+            raise ValueError(f"{path} is not an online spam model")
+        if metadata['n_features'] != self.vectorizer.n_features:
+            raise ValueError(f"{path} was saved with {metadata['n_features']} features, "
+                             f"expected {self.vectorizer.n_features}")
+        # Copied out of the mapping: partial_fit adds to the counts in place
+        feature_count = np.array(arrays['feature_count'])
+        class_count = np.array(arrays['class_count'])
+        self.samples_seen = metadata['samples_seen']
+
+        # Rebuild the fitted NB state from the raw counts (same formulas as MultinomialNB)
+        classifier = MultinomialNB(alpha=self.alpha)
+        classifier.classes_ = CLASSES.copy()
+        classifier.n_features_in_ = feature_count.shape[1]
+        classifier.feature_count_ = feature_count
+        classifier.class_count_ = class_count
+        smoothed = feature_count + self.alpha
+        classifier.feature_log_prob_ = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+        classifier.class_log_prior_ = np.log(class_count) - np.log(class_count.sum())
+        self.classifier = classifier
+
+    @classmethod
+    def open(cls, path):
+        """Model with the settings and counts saved at path (the registry opener for FORMAT)"""
+        metadata = read_mapped_header(path)['metadata']
+        model = cls(path, n_features=metadata['n_features'], ngram_range=tuple(metadata['ngram_range']),
+                    alpha=metadata['alpha'])
+        model.load()
+        return model
+
+    def update(self, texts, labels, persist=None):
+        """partial_fit + persist (save() by default), returning the timings for the /retrain response"""
+        started = time.perf_counter()
+        self.partial_fit(texts, labels)
+        trained = time.perf_counter()
+        (persist or self.save)()
+        saved = time.perf_counter()
+        return {
+            'update_ms': round((trained - started) * 1000, 3),
+            'persist_ms': round((saved - trained) * 1000, 3),
+            'total_ms': round((saved - started) * 1000, 3),
+            'samples_seen': self.samples_seen
+        }
@@ -0,0 +1,239 @@
+"""
+Background retraining jobs published through the model registry
+/retrain enqueues a job in a SQLite job table shared by every worker, and a
+separate trainer process (this script) drains the queue. Each finished job
+registers its model as an immutable, checksummed version in the model registry
+(the repository root's model_registry, installed with `-e ..` and shared with
+app_production) and moves the channel's active pointer to it. Web workers
+notice the pointer change and hot-swap the model between requests, so nothing
+is dropped and no worker stays stale.
+
+Full retrains fit TfidfVectorizer + MultinomialNB and register the compiled
+scorer ('tfidf' channel); with online learning the hashed count model is
+registered instead ('online' channel).
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import fcntl
+import sqlite3
+import logging
+import traceback
+import subprocess
+from contextlib import contextmanager
+
+from model_registry import ModelRegistry, training_set_hash
+from online_model import OnlineSpamModel, FORMAT as ONLINE_FORMAT
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_NAME = 'jobs.sqlite'
+RUNNER_LOCK_NAME = 'trainer.lock'
+PUBLISH_LOCK_NAME = 'publish.lock'
+
+
+def model_channel(online):
+    """Registry channel served and trained: the online count model or the compiled TF-IDF scorer"""
+    return 'online' if online else 'tfidf'
+
+
+def open_registry(registry_dir):
+    """ModelRegistry that can also open online count models"""
+    return ModelRegistry(registry_dir, openers={ONLINE_FORMAT: OnlineSpamModel.open})
+
+
+@contextmanager
+def exclusive(registry):
+    """Cross-process lock held while reading, updating and publishing a model"""
+    with open(os.path.join(registry.root, PUBLISH_LOCK_NAME), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def publish(registry, channel, write_artifact, **manifest):
+    """Register the artifact written by write_artifact(path) and make it the channel's active version"""
+    manifest = registry.register(write_artifact, **manifest)
+    # A new training result replaces whatever is active, even if its content matches an older version
+    registry.activate(channel, manifest['version'], force=True)
+    return manifest
+
+
+class JobStore:
+    """Retrain jobs in a SQLite table visible to every worker process"""
+
+    def __init__(self, model_dir):
+        self.path = os.path.join(model_dir, JOBS_DB_NAME)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS retrain_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    mode TEXT NOT NULL,
+                    sample_count INTEGER NOT NULL,
+                    payload TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    version TEXT,
+                    error TEXT
+                )
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, mode, texts, labels):
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO retrain_jobs (id, status, mode, sample_count, payload, created_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, mode, len(texts), json.dumps({'texts': texts, 'labels': labels}), time.time())
+            )
+        return job_id
+
+    def claim_next(self):
+        """Mark the oldest queued job as running and return it with its payload"""
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                "SELECT * FROM retrain_jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE retrain_jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), row['id']))
+            return dict(row)
+
+    def finish(self, job_id, version):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE retrain_jobs SET status = 'succeeded', finished_at = ?, version = ?, payload = NULL WHERE id = ?",
+                (time.time(), version, job_id)
+            )
+
+    def fail(self, job_id, error):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE retrain_jobs SET status = 'failed', finished_at = ?, error = ?, payload = NULL WHERE id = ?",
+                (time.time(), error, job_id)
+            )
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, status, mode, sample_count, created_at, started_at, finished_at, version, error "
+                "FROM retrain_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def has_queued(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM retrain_jobs WHERE status = 'queued' LIMIT 1").fetchone() is not None
+
+
+def train_job(job, registry, online):
+    """Fit a model for one job and publish it; returns the new version"""
+    payload = json.loads(job['payload'])
+    texts, labels = payload['texts'], payload['labels']
+    channel = model_channel(online)
+    manifest = {
+        'training_set_hash': training_set_hash(zip(texts, labels)),
+        'job_id': job['id'],
+        'samples': len(texts)
+    }
+
+    if online:
+        with exclusive(registry):
+            active = registry.load_active(channel) if job['mode'] == 'incremental' else None
+            model = active[1] if active else OnlineSpamModel()
+            model.partial_fit(texts, labels)
+            return publish(registry, channel, model.save, **manifest)['version']
+
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.pipeline import make_pipeline
+    from spam_scorer import compile_pipeline
+
+    scorer = compile_pipeline(make_pipeline(TfidfVectorizer(), MultinomialNB()).fit(texts, labels))
+    predictions, _ = scorer.predict_with_proba(texts)
+    manifest['metrics'] = {
+        'train_accuracy': round(sum(int(p) == int(label) for p, label in zip(predictions, labels)) / len(labels), 4),
+        'train_samples': len(labels)
+    }
+    with exclusive(registry):
+        return publish(registry, channel, scorer.save_mapped, **manifest)['version']
+
+
+def run_pending_jobs(model_dir, registry_dir, online):
+    """Trainer process entry point: drain the queue; only one trainer runs at a time"""
+    logging.basicConfig(level=logging.INFO)
+    registry = open_registry(registry_dir)
+    store = JobStore(model_dir)
+
+    while True:
+        with open(os.path.join(model_dir, RUNNER_LOCK_NAME), 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # Another trainer is already draining the queue
+
+            while True:
+                job = store.claim_next()
+                if job is None:
+                    break
+                try:
+                    started = time.perf_counter()
+                    version = train_job(job, registry, online)
+                    store.finish(job['id'], version)
+                    logger.info(f"Retrain job {job['id']} published {version} in {time.perf_counter() - started:.2f}s")
+                except Exception as e:
+                    logger.error(f"Retrain job {job['id']} failed: {e}")
+                    store.fail(job['id'], f"{e}\n{traceback.format_exc(limit=3)}")
+
+        # A job queued while we were releasing the lock would otherwise be stranded
+        if not store.has_queued():
+            return
+
+
+class RetrainQueue:
+    """Submits jobs and makes sure a trainer process is running"""
+
+    def __init__(self, model_dir, registry_dir, online=False):
+        self.model_dir = os.path.abspath(model_dir)
+        os.makedirs(self.model_dir, exist_ok=True)
+        self.registry_dir = os.path.abspath(registry_dir)
+        self.online = online
+        self.store = JobStore(self.model_dir)
+        self._trainers = []
+
+    def submit(self, mode, texts, labels):
+        job_id = self.store.create(mode, texts, labels)
+        self.start_trainer()
+        return job_id
+
+    def start_trainer(self):
+        """Launch a trainer; it exits at once if another trainer holds the lock"""
+        # Reap trainers that have finished so they don't linger as zombies
+        self._trainers = [process for process in self._trainers if process.poll() is None]
+        args = [sys.executable, os.path.abspath(__file__), self.model_dir, self.registry_dir]
+        if self.online:
+            args.append('online')
+        process = subprocess.Popen(args, cwd=os.path.dirname(os.path.abspath(__file__)), start_new_session=True)
+        self._trainers.append(process)
+        return process.pid
+
+    def status(self, job_id):
+        return self.store.get(job_id)
+
+
+if __name__ == '__main__':
+    # Trainer process: python retrain_jobs.py <model_dir> <registry_dir> [online]
+    run_pending_jobs(sys.argv[1] if len(sys.argv) > 1 else 'models',
+                     sys.argv[2] if len(sys.argv) > 2 else 'model_registry',
+                     len(sys.argv) > 3 and sys.argv[3] == 'online')
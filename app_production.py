@@ -11,15 +11,19 @@ import io
 import re
 import json
 import secrets
+import shutil
 import hashlib
+import itertools
+import multiprocessing
 from datetime import datetime, timedelta
-from functools import wraps
+from functools import wraps, partial
 from pathlib import Path
 
 # Web Framework
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from dotenv import load_dotenv
 
 # Authentication
@@ -34,7 +38,20 @@ from sklearn.naive_bayes import MultinomialNB
 from sklearn.pipeline import make_pipeline
 import joblib
 import nltk
-from bs4 import BeautifulSoup
+from html_text import strip_html, stats as html_strip_stats
+from text_analyzer import SpamTextAnalyzer, normalize_text
+from mime_ingest import parse_message, extract_parts
+from long_document import score_long_document
+from keyword_rules import KeywordRules, DEFAULT_PHRASES_PATH
+from cascade import Cascade, CascadeRun
+from url_blocklist import extract_links, DomainBlocklist
+from spam_scorer import compile_pipeline, MappedSpamScorer
+from hashed_model import HashedSpamModel, CsvCorpus
+from request_coalescer import RequestCoalescer
+from verdict_cache import VerdictCache
+from near_duplicates import NearDuplicateIndex
+from ocr_cache import OcrCache
+from model_registry import ModelRegistry, ModelRegistryError, training_set_hash
 
 # OCR and Image Processing
 # Logging
@@ -48,20 +65,9 @@ logger = logging.getLogger(__name__)
 from PIL import Image, ImageEnhance, ImageFilter
 import pytesseract
 
-# Optional OCR dependencies
-try:
-    import cv2
-    CV2_AVAILABLE = True
-except ImportError:
-    logger.warning("OpenCV not available - using basic image processing")
-    CV2_AVAILABLE = False
-
-try:
-    import easyocr
-    EASYOCR_AVAILABLE = True
-except ImportError:
-    logger.warning("EasyOCR not available - OCR will use Tesseract only")
-    EASYOCR_AVAILABLE = False
+import ocr_engine
+from ocr_engine import ImageTooLarge
+from ocr_pool import OcrPoolClient, OcrUnavailable, start_service
 
 # Email Processing
 import email
@@ -72,7 +78,7 @@ import smtplib
 # Database
 try:
     import psycopg2
-    from psycopg2.extras import RealDictCursor
+    from psycopg2.extras import RealDictCursor, execute_values
     DB_AVAILABLE = True
 except ImportError:
     DB_AVAILABLE = False
@@ -100,13 +106,103 @@ class Config:
     
     # OCR Configuration
     TESSERACT_PATH = os.getenv('TESSERACT_PATH', '/usr/bin/tesseract')
-    TESSERACT_CONFIG = '--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz .,!?@#$%^&*()_+-=[]{}|;":,.<>?/`~'
+    TESSERACT_CONFIG = '--oem 3 --psm 6 -c "tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz .,!?@#$%^&*()_+-=[]{}|;\\":,.<>?/`~"'
+    
+    # Adaptive OCR: EasyOCR runs only when Tesseract's mean word confidence (0-100) or text yield is below these
+    OCR_MIN_CONFIDENCE = float(os.getenv('OCR_MIN_CONFIDENCE', 60))
+    OCR_MIN_CHARS = int(os.getenv('OCR_MIN_CHARS', 20))
+    # Images are decoded at most at this many pixels (JPEG at a reduced scale) and rescaled to the
+    # x-height OCR reads best; larger dimensions than OCR_MAX_IMAGE_PIXELS are refused from the header
+    OCR_MAX_PIXELS = int(os.getenv('OCR_MAX_PIXELS', 4000000))
+    OCR_MAX_IMAGE_PIXELS = int(os.getenv('OCR_MAX_IMAGE_PIXELS', 50000000))
+    # Preprocessing profile: 'auto' plans it from image statistics, or force none/otsu/adaptive/denoise
+    OCR_PREPROCESS = os.getenv('OCR_PREPROCESS', 'auto').lower()
+    
+    # OCR worker pool: OCR runs in long-lived processes shared by all web workers, with a bounded queue
+    OCR_POOL_ENABLED = os.getenv('OCR_POOL_ENABLED', 'false').lower() == 'true'
+    OCR_POOL_WORKERS = int(os.getenv('OCR_POOL_WORKERS', 2))
+    OCR_QUEUE_SIZE = int(os.getenv('OCR_QUEUE_SIZE', 8))  # waiting jobs beyond the busy workers, host-wide; more get 503
+    OCR_TIMEOUT_SECONDS = float(os.getenv('OCR_TIMEOUT_SECONDS', 45))
     
     # File Upload Configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = '/tmp/uploads'
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp'}
     
+    # Batch Analysis Configuration
+    BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 100))
+    
+    # Request Coalescing Configuration (opt-in, needs threaded workers)
+    COALESCE_ENABLED = os.getenv('COALESCE_ENABLED', 'false').lower() == 'true'
+    COALESCE_WINDOW_MS = float(os.getenv('COALESCE_WINDOW_MS', 3))
+    COALESCE_MAX_BATCH = int(os.getenv('COALESCE_MAX_BATCH', 32))
+    
+    # Model Artifact Configuration (memory-mapped and shared by all workers)
+    MODEL_MMAP_ENABLED = os.getenv('MODEL_MMAP_ENABLED', 'true').lower() == 'true'
+    MODEL_MMAP_PATH = os.getenv('MODEL_MMAP_PATH', 'spam_model.mmap')
+    
+    # Model Mode: 'tfidf' (vocabulary pipeline) or 'hashed' (fixed feature buckets)
+    MODEL_MODE = os.getenv('MODEL_MODE', 'tfidf').lower()
+    HASHED_MODEL_PATH = os.getenv('HASHED_MODEL_PATH', 'spam_model.hashed.mmap')
+    HASHED_MODEL_BUCKETS = int(os.getenv('HASHED_MODEL_BUCKETS', 2 ** 18))
+    TRAINING_DATA_PATH = os.getenv('TRAINING_DATA_PATH')  # CSV with text,label columns
+    
+    # Model Registry: immutable checksummed versions plus an active pointer per model mode ('' disables)
+    MODEL_REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR', 'model_registry')
+    MODEL_RELOAD_CHECK_SECONDS = float(os.getenv('MODEL_RELOAD_CHECK_SECONDS', 2))  # active pointer polling
+    
+    # Explanations (explain=true on /analyze and /analyze-image)
+    EXPLAIN_TOP_K = int(os.getenv('EXPLAIN_TOP_K', 10))
+    EXPLAIN_MAX_TOP_K = int(os.getenv('EXPLAIN_MAX_TOP_K', 50))
+    
+    # Detector cascade: rules (tier 0) -> model (tier 1) -> full OCR (tier 2)
+    CASCADE_ENABLED = os.getenv('CASCADE_ENABLED', 'false').lower() == 'true'
+    CASCADE_RULE_SPAM_SCORE = float(os.getenv('CASCADE_RULE_SPAM_SCORE', 6))  # rule score that decides spam
+    CASCADE_RULE_HAM_SCORE = float(os.getenv('CASCADE_RULE_HAM_SCORE', -1))  # rule score that decides ham (-1: never)
+    CASCADE_MODEL_CONFIDENCE = float(os.getenv('CASCADE_MODEL_CONFIDENCE', 0.9))
+    CASCADE_TEXT_RULES = os.getenv('CASCADE_TEXT_RULES', 'false').lower() == 'true'  # tier 0 on submitted text, not just OCR text
+    SPAM_PHRASES_PATH = os.getenv('SPAM_PHRASES_PATH', DEFAULT_PHRASES_PATH)
+    
+    # Link extraction and domain blocklists for /analyze: comma-separated name=path lists ('' disables)
+    URL_BLOCKLISTS = os.getenv('URL_BLOCKLISTS', '')
+    URL_BLOCKLIST_CACHE_PATH = os.getenv('URL_BLOCKLIST_CACHE_PATH', 'domain_blocklist.mmap')
+    URL_BLOCKLIST_MARKS_SPAM = os.getenv('URL_BLOCKLIST_MARKS_SPAM', 'true').lower() == 'true'
+    URL_BLOCKLIST_CONFIDENCE = float(os.getenv('URL_BLOCKLIST_CONFIDENCE', 0.99))
+    URL_SCAN_MAX_CHARS = int(os.getenv('URL_SCAN_MAX_CHARS', 200000))  # head and tail of longer texts
+    
+    # Long-document mode: /analyze texts above the threshold are scored from sampled windows
+    LONG_DOC_THRESHOLD_CHARS = int(os.getenv('LONG_DOC_THRESHOLD_CHARS', 50000))
+    LONG_DOC_WINDOW_CHARS = int(os.getenv('LONG_DOC_WINDOW_CHARS', 4000))
+    LONG_DOC_TOKEN_BUDGET = int(os.getenv('LONG_DOC_TOKEN_BUDGET', 4000))
+    LONG_DOC_DECISIVE_MARGIN = float(os.getenv('LONG_DOC_DECISIVE_MARGIN', 4.0))  # mean window log-odds
+    LONG_DOC_BATCH_WINDOWS = int(os.getenv('LONG_DOC_BATCH_WINDOWS', 4))
+    
+    # /analyze/raw MIME ingestion
+    RAW_READ_CHUNK_BYTES = int(os.getenv('RAW_READ_CHUNK_BYTES', 64 * 1024))
+    RAW_MAX_PART_BYTES = int(os.getenv('RAW_MAX_PART_BYTES', 256 * 1024))  # decoded bytes examined per text part
+    RAW_MAX_IMAGES = int(os.getenv('RAW_MAX_IMAGES', 5))
+    RAW_MAX_IMAGE_BYTES = int(os.getenv('RAW_MAX_IMAGE_BYTES', 5 * 1024 * 1024))
+    
+    # Verdict Cache Configuration
+    VERDICT_CACHE_ENABLED = os.getenv('VERDICT_CACHE_ENABLED', 'true').lower() == 'true'
+    VERDICT_CACHE_SIZE = int(os.getenv('VERDICT_CACHE_SIZE', 10000))
+    VERDICT_CACHE_TTL = int(os.getenv('VERDICT_CACHE_TTL', 3600))
+    VERDICT_CACHE_SHARED_PATH = os.getenv('VERDICT_CACHE_SHARED_PATH')  # e.g. /tmp/spam_verdicts.sqlite
+    
+    # Near-duplicate index: mutated copies of recently decided texts reuse their verdict
+    NEAR_DUP_ENABLED = os.getenv('NEAR_DUP_ENABLED', 'false').lower() == 'true'
+    NEAR_DUP_CAPACITY = int(os.getenv('NEAR_DUP_CAPACITY', 100000))
+    NEAR_DUP_MIN_SIMILARITY = float(os.getenv('NEAR_DUP_MIN_SIMILARITY', 0.75))  # estimated Jaccard of word 1-2 grams
+    NEAR_DUP_MIN_CONFIDENCE = float(os.getenv('NEAR_DUP_MIN_CONFIDENCE', 0.9))  # only confident verdicts are reused
+    NEAR_DUP_TTL = int(os.getenv('NEAR_DUP_TTL', 3600))
+    
+    # OCR cache: re-encoded, resized or re-bordered copies of a recently read image reuse its text and verdict
+    OCR_CACHE_ENABLED = os.getenv('OCR_CACHE_ENABLED', 'false').lower() == 'true'
+    OCR_CACHE_SIZE = int(os.getenv('OCR_CACHE_SIZE', 10000))
+    OCR_CACHE_MAX_DISTANCE = int(os.getenv('OCR_CACHE_MAX_DISTANCE', 16))  # differing bits of the 256-bit image hash
+    OCR_CACHE_TTL = int(os.getenv('OCR_CACHE_TTL', 86400))
+    OCR_CACHE_SHARED_PATH = os.getenv('OCR_CACHE_SHARED_PATH')  # e.g. /tmp/spam_ocr.sqlite
+    
     # Email Configuration
     EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
     EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
@@ -150,7 +246,16 @@ else:
 
 # Initialize global variables
 spam_model = None
+spam_model_version = None
+spam_scorer = None
+model_registry = None
+model_pointer_mtime = None
+model_checked_at = 0.0
+spam_coalescer = None
 ocr_reader = None
+ocr_pool = None
+ocr_service = None
+domain_blocklist = None
 
 class DatabaseManager:
     """Database manager with fallback to in-memory storage"""
@@ -287,10 +392,112 @@ class DatabaseManager:
                 'ip_address': ip_address,
                 'extracted_text': extracted_text
             })
+    
+    def save_analyses(self, rows):
+        """Save several analyses to history with a single multi-row insert"""
+        if not rows:
+            return
+        if self.use_postgres:
+            try:
+                with psycopg2.connect(self.db_url) as conn:
+                    with conn.cursor() as cur:
+                        execute_values(cur, """
+                            INSERT INTO analysis_history (user_id, email_text, is_spam, confidence, analysis_type, ip_address, extracted_text)
+                            VALUES %s
+                        """, [
+                            (row['user_id'], row['email_text'], row['is_spam'], row['confidence'],
+                             row.get('analysis_type', 'text'), row.get('ip_address'), row.get('extracted_text'))
+                            for row in rows
+                        ])
+                        conn.commit()
+            except Exception as e:
+                logger.error(f"Database error: {e}")
+        else:
+            timestamp = datetime.now()
+            self.analysis_history.extend({
+                'user_id': row['user_id'],
+                'email_text': row['email_text'],
+                'is_spam': row['is_spam'],
+                'confidence': row['confidence'],
+                'analysis_type': row.get('analysis_type', 'text'),
+                'timestamp': timestamp,
+                'ip_address': row.get('ip_address'),
+                'extracted_text': row.get('extracted_text')
+            } for row in rows)
 
 # Initialize database manager
 db_manager = DatabaseManager()
 
+# Initialize verdict cache
+verdict_cache = VerdictCache(
+    max_entries=config.VERDICT_CACHE_SIZE,
+    ttl_seconds=config.VERDICT_CACHE_TTL,
+    shared_path=config.VERDICT_CACHE_SHARED_PATH
+) if config.VERDICT_CACHE_ENABLED else None
+
+# Near-duplicate verdict index (mutated campaign copies)
+near_duplicates = NearDuplicateIndex(
+    capacity=config.NEAR_DUP_CAPACITY,
+    min_similarity=config.NEAR_DUP_MIN_SIMILARITY,
+    min_confidence=config.NEAR_DUP_MIN_CONFIDENCE,
+    ttl_seconds=config.NEAR_DUP_TTL
+) if config.NEAR_DUP_ENABLED else None
+
+# OCR result cache (near-identical images skip OCR)
+ocr_cache = OcrCache(
+    max_entries=config.OCR_CACHE_SIZE,
+    max_distance=config.OCR_CACHE_MAX_DISTANCE,
+    ttl_seconds=config.OCR_CACHE_TTL,
+    shared_path=config.OCR_CACHE_SHARED_PATH
+) if config.OCR_CACHE_ENABLED else None
+
+# Detector cascade; always constructed so /metrics records which tier decided each request
+spam_cascade = Cascade(
+    KeywordRules(config.SPAM_PHRASES_PATH),
+    rule_spam_score=config.CASCADE_RULE_SPAM_SCORE,
+    rule_ham_score=config.CASCADE_RULE_HAM_SCORE,
+    model_confidence=config.CASCADE_MODEL_CONFIDENCE,
+    enabled=config.CASCADE_ENABLED,
+    text_rules=config.CASCADE_TEXT_RULES
+)
+
+# Built-in training data
+DEFAULT_SPAM_SAMPLES = [
+    "Congratulations! You've won $1,000,000! Click here to claim your prize now!",
+    "URGENT: Your account will be suspended! Click here immediately!",
+    "Get rich quick! Make money fast with this amazing opportunity!",
+    "Free trial! Limited time offer! Act now or miss out forever!",
+    "You have been selected for a special offer! Click here now!",
+    "Earn $5000 a week working from home! No experience needed!",
+    "Your credit card has been charged $500. Click to dispute immediately!",
+    "Hot singles in your area want to meet you tonight!",
+    "Lose 30 pounds in 30 days with this miracle pill!",
+    "Work from home and earn big money! No boss! No commute!",
+    "Free iPhone! Just pay shipping and handling!",
+    "Nigerian prince needs your help transferring $10 million!",
+    "Act now! This offer expires in 24 hours!",
+    "100% guaranteed! Risk-free! Money back guarantee!",
+    "Click here to unsubscribe (this is usually a spam trick)"
+]
+
+DEFAULT_HAM_SAMPLES = [
+    "Hi, can we schedule a meeting for next Tuesday?",
+    "Please review the attached document and send me your feedback.",
+    "Thank you for your email. I will respond by tomorrow.",
+    "The project deadline has been extended to next Friday.",
+    "Please find the requested information in the attachment.",
+    "How was your weekend? Hope you had a great time!",
+    "The meeting has been moved to conference room B.",
+    "Can you please send me the latest version of the report?",
+    "Thanks for the quick response. This is very helpful.",
+    "Let's discuss this further in our next team meeting.",
+    "I've forwarded your request to the appropriate department.",
+    "Please let me know if you need any additional information.",
+    "The conference call is scheduled for 3 PM today.",
+    "I appreciate your patience while we resolve this issue.",
+    "Looking forward to hearing from you soon."
+]
+
 def download_nltk_data():
     """Download required NLTK data"""
     try:
@@ -317,18 +524,280 @@ def download_nltk_data():
     except Exception as e:
         logger.error(f"NLTK setup failed: {e}")
 
+def compile_spam_model(model):
+    """Compile a fitted pipeline into the fast request-time scorer"""
+    try:
+        scorer = compile_pipeline(model)
+        logger.info(f"Compiled spam scorer with {scorer.n_features} features")
+    except Exception as e:
+        logger.warning(f"Could not compile spam model, using sklearn pipeline: {e}")
+        return None
+    
+    if not config.MODEL_MMAP_ENABLED:
+        return scorer
+    
+    try:
+        scorer.save_mapped(config.MODEL_MMAP_PATH)
+        return MappedSpamScorer.open(config.MODEL_MMAP_PATH)
+    except Exception as e:
+        logger.warning(f"Could not write mapped model, keeping in-process scorer: {e}")
+        return scorer
+
+def model_fingerprint(model_path):
+    """Short content hash of a model artifact, used as the model version"""
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def model_available():
+    """True when either the scorer or the sklearn pipeline can serve predictions"""
+    return spam_scorer is not None or spam_model is not None
+
+def activate_spam_model(model, version, scorer=None):
+    """Swap in a new model, compiling it if needed, and invalidate cached verdicts"""
+    global spam_model, spam_scorer, spam_model_version
+    
+    if scorer is None and model is not None:
+        scorer = compile_spam_model(model)
+    
+    if getattr(scorer, 'path', None):
+        # The mapped artifact replaces the pipeline, so no worker keeps a private vocabulary dict
+        model = None
+        version = version or model_fingerprint(scorer.path)
+    
+    spam_model = model
+    spam_scorer = scorer
+    spam_model_version = version
+    
+    if verdict_cache is not None:
+        verdict_cache.set_model_version(version)
+    if near_duplicates is not None:
+        near_duplicates.set_model_version(version)
+    logger.info(f"Spam model version {version} active ({type(scorer).__name__ if scorer else 'sklearn pipeline'})")
+
+def predict_spam(texts):
+    """Return (labels, probabilities) for a list of cleaned texts"""
+    if verdict_cache is None and near_duplicates is None:
+        return predict_spam_uncached(texts)
+    
+    verdicts = [verdict_cache.get(text) if verdict_cache is not None else None for text in texts]
+    
+    # Exact misses may still be a few words away from a recently decided text
+    signatures = {}
+    if near_duplicates is not None:
+        for index, verdict in enumerate(verdicts):
+            if verdict is None:
+                verdicts[index], signatures[index] = near_duplicates.lookup(texts[index])
+    misses = [index for index, verdict in enumerate(verdicts) if verdict is None]
+    
+    if misses:
+        labels, probabilities = predict_spam_uncached([texts[index] for index in misses])
+        for position, index in enumerate(misses):
+            verdicts[index] = (labels[position], probabilities[position])
+            if verdict_cache is not None:
+                verdict_cache.put(texts[index], labels[position], probabilities[position])
+            if signatures.get(index) is not None:
+                near_duplicates.add(signatures[index], labels[position], probabilities[position])
+    
+    return np.array([verdict[0] for verdict in verdicts]), np.array([verdict[1] for verdict in verdicts])
+
+def predict_spam_uncached(texts):
+    """Score cleaned texts through the coalescer or a direct batch call"""
+    if spam_coalescer is not None and len(texts) == 1:
+        label, probabilities = spam_coalescer.submit(texts[0])
+        return np.array([label]), probabilities[np.newaxis]
+    
+    return predict_spam_batch(texts)
+
+def predict_spam_batch(texts):
+    """Run one vectorized model call over a list of cleaned texts"""
+    if spam_scorer is not None:
+        return spam_scorer.predict_with_proba(texts)
+    
+    probabilities = spam_model.predict_proba(texts)
+    return spam_model.classes_[np.argmax(probabilities, axis=1)], probabilities
+
+def explain_top_k(data):
+    """Number of contributing n-grams the request asked for, 0 when explain is off"""
+    explain = data.get('explain', request.args.get('explain', False))
+    if isinstance(explain, str):
+        explain = explain.lower() in ('true', '1', 'yes')
+    if not explain:
+        return 0
+    
+    try:
+        top_k = int(data.get('explain_top_k', config.EXPLAIN_TOP_K))
+    except (TypeError, ValueError):
+        top_k = config.EXPLAIN_TOP_K
+    return max(1, min(top_k, config.EXPLAIN_MAX_TOP_K))
+
+def explain_spam(text, top_k):
+    """Score one cleaned text and return (label, probabilities, top contributing n-grams)"""
+    if spam_scorer is None:
+        # The plain sklearn pipeline has no compiled log-odds table to explain with
+        labels, probabilities = predict_spam([text])
+        return labels[0], probabilities[0], None
+    
+    label, probabilities, contributions = spam_scorer.predict_with_explanation(text, top_k)
+    if verdict_cache is not None:
+        verdict_cache.put(text, label, probabilities)
+    return label, probabilities, contributions
+
+def load_hashed_spam_model():
+    """Load or train the feature-hashing model (no vocabulary, O(buckets) training memory)"""
+    model_path = config.HASHED_MODEL_PATH
+    
+    if os.path.exists(model_path):
+        try:
+            activate_spam_model(None, None, scorer=HashedSpamModel.open(model_path))
+            logger.info(f"Hashed spam model loaded from {model_path}")
+            return None
+        except Exception as e:
+            logger.warning(f"Could not open hashed model: {e}")
+    
+    logger.info("Training hashed spam detection model...")
+    corpus = [(text, 1) for text in DEFAULT_SPAM_SAMPLES] + [(text, 0) for text in DEFAULT_HAM_SAMPLES]
+    if config.TRAINING_DATA_PATH and os.path.exists(config.TRAINING_DATA_PATH):
+        corpus = CsvCorpus(config.TRAINING_DATA_PATH)
+    
+    model = HashedSpamModel(n_buckets=config.HASHED_MODEL_BUCKETS).fit(corpus)
+    model.save_mapped(model_path)
+    activate_spam_model(None, None, scorer=HashedSpamModel.open(model_path))
+    logger.info(f"Hashed spam model trained and saved to {model_path}")
+    return corpus
+
+def evaluate_spam_model(corpus, chunk_size=1000):
+    """Accuracy of the active model on (text, label) pairs"""
+    correct = total = 0
+    pairs = iter(corpus)
+    while True:
+        chunk = list(itertools.islice(pairs, chunk_size))
+        if not chunk:
+            break
+        labels, _ = predict_spam_batch([text for text, _ in chunk])
+        correct += int(np.sum(labels == np.array([label for _, label in chunk])))
+        total += len(chunk)
+    return {'train_accuracy': round(correct / total, 4) if total else None, 'train_samples': total}
+
+def register_spam_model(registry, channel, corpus=None):
+    """Store the freshly built model as the first registry version and activate it
+
+    A mapped artifact is copied as is; a pipeline loaded from joblib is compiled to the
+    mapped format first, so the registry (and every worker mapping it) serves it too.
+    """
+    path = getattr(spam_scorer, 'path', None)
+    if not path and spam_model is None:
+        logger.warning("No spam model to add to the registry")
+        return
+    
+    try:
+        manifest = registry.register(
+            partial(shutil.copyfile, path) if path else compile_pipeline(spam_model).save_mapped,
+            metrics=evaluate_spam_model(corpus) if corpus is not None else {},
+            training_set_hash=training_set_hash(corpus) if corpus is not None else None,
+            model_mode=channel
+        )
+        registry.activate(channel, manifest['version'])
+        _, scorer = registry.open(manifest['version'])
+        activate_spam_model(None, manifest['version'], scorer=scorer)
+    except Exception as e:
+        logger.error(f"Could not add spam model to the registry: {e}")
+
 def load_spam_model():
-    """Load or create spam detection model"""
-    global spam_model
+    """Load the active registry version, building and registering a model on first run"""
+    global spam_model, spam_scorer, model_registry
+    
+    if not config.MODEL_REGISTRY_DIR:
+        bootstrap_spam_model()
+        return
+    
+    channel = config.MODEL_MODE
+    registry = model_registry = ModelRegistry(config.MODEL_REGISTRY_DIR)
+    try:
+        active = registry.load_active(channel)
+    except (ModelRegistryError, ValueError, OSError) as e:
+        # Never quietly replace the active version with a freshly trained fallback model
+        logger.error(f"Active {channel} model could not be loaded, spam model disabled: {e}")
+        spam_model = None
+        spam_scorer = None
+        return
+    
+    if active:
+        manifest, scorer = active
+        activate_spam_model(None, manifest['version'], scorer=scorer)
+        logger.info(f"Registry model {manifest['version']} loaded (created {manifest['created_at']})")
+        return
+    
+    register_spam_model(registry, channel, bootstrap_spam_model())
+
+def refresh_spam_model():
+    """Switch to a version activated in the registry since startup, by any process
+
+    The active pointer's mtime is checked at most every MODEL_RELOAD_CHECK_SECONDS. Activating
+    the new version moves the verdict cache and near-duplicate index to it, so no verdict of
+    the previous model is served after the switch.
+    """
+    global model_checked_at, model_pointer_mtime
+    if model_registry is None:
+        return
+    now = time.monotonic()
+    if now - model_checked_at < config.MODEL_RELOAD_CHECK_SECONDS:
+        return
+    model_checked_at = now
+    
+    channel = config.MODEL_MODE
+    pointer_mtime = model_registry.pointer_mtime(channel)
+    if pointer_mtime is None or pointer_mtime == model_pointer_mtime:
+        return
+    model_pointer_mtime = pointer_mtime
+    version = model_registry.active_version(channel)
+    if version == spam_model_version:
+        return
+    try:
+        manifest, scorer = model_registry.open(version)
+        activate_spam_model(None, manifest['version'], scorer=scorer)
+    except (ModelRegistryError, ValueError, OSError) as e:
+        logger.error(f"Could not switch to {channel} model {version}, keeping {spam_model_version}: {e}")
+
+@app.before_request
+def check_for_new_model():
+    """Pick up model versions activated by the registry CLI or another worker"""
+    refresh_spam_model()
+
+def bootstrap_spam_model():
+    """Load or create spam detection model; returns the training pairs if it trained one"""
+    global spam_model, spam_scorer
+    
+    if config.MODEL_MODE == 'hashed':
+        try:
+            return load_hashed_spam_model()
+        except Exception as e:
+            logger.error(f"Hashed model creation failed: {e}")
+            spam_model = None
+            spam_scorer = None
+        return None
     
     model_path = 'spam_model.joblib'
     
+    try:
+        # Prefer the memory-mapped artifact unless the pipeline on disk is newer
+        mmap_path = config.MODEL_MMAP_PATH
+        if config.MODEL_MMAP_ENABLED and os.path.exists(mmap_path) and (
+                not os.path.exists(model_path) or os.path.getmtime(mmap_path) >= os.path.getmtime(model_path)):
+            activate_spam_model(None, None, scorer=MappedSpamScorer.open(mmap_path))
+            logger.info(f"Memory-mapped spam model loaded from {mmap_path}")
+            return None
+    except Exception as e:
+        logger.warning(f"Could not open mapped model: {e}")
+    
     try:
         # Try to load existing model
         if os.path.exists(model_path):
-            spam_model = joblib.load(model_path)
+            activate_spam_model(joblib.load(model_path), model_fingerprint(model_path))
             logger.info("Spam detection model loaded successfully")
-            return
+            return None
     except Exception as e:
         logger.warning(f"Could not load existing model: {e}")
     
@@ -336,53 +805,15 @@ def load_spam_model():
     try:
         logger.info("Creating new spam detection model...")
         
-        # Enhanced training data
-        spam_samples = [
-            "Congratulations! You've won $1,000,000! Click here to claim your prize now!",
-            "URGENT: Your account will be suspended! Click here immediately!",
-            "Get rich quick! Make money fast with this amazing opportunity!",
-            "Free trial! Limited time offer! Act now or miss out forever!",
-            "You have been selected for a special offer! Click here now!",
-            "Earn $5000 a week working from home! No experience needed!",
-            "Your credit card has been charged $500. Click to dispute immediately!",
-            "Hot singles in your area want to meet you tonight!",
-            "Lose 30 pounds in 30 days with this miracle pill!",
-            "Work from home and earn big money! No boss! No commute!",
-            "Free iPhone! Just pay shipping and handling!",
-            "Nigerian prince needs your help transferring $10 million!",
-            "Act now! This offer expires in 24 hours!",
-            "100% guaranteed! Risk-free! Money back guarantee!",
-            "Click here to unsubscribe (this is usually a spam trick)"
-        ]
-        
-        ham_samples = [
-            "Hi, can we schedule a meeting for next Tuesday?",
-            "Please review the attached document and send me your feedback.",
-            "Thank you for your email. I will respond by tomorrow.",
-            "The project deadline has been extended to next Friday.",
-            "Please find the requested information in the attachment.",
-            "How was your weekend? Hope you had a great time!",
-            "The meeting has been moved to conference room B.",
-            "Can you please send me the latest version of the report?",
-            "Thanks for the quick response. This is very helpful.",
-            "Let's discuss this further in our next team meeting.",
-            "I've forwarded your request to the appropriate department.",
-            "Please let me know if you need any additional information.",
-            "The conference call is scheduled for 3 PM today.",
-            "I appreciate your patience while we resolve this issue.",
-            "Looking forward to hearing from you soon."
-        ]
-        
         # Prepare training data
-        texts = spam_samples + ham_samples
-        labels = [1] * len(spam_samples) + [0] * len(ham_samples)
+        texts = DEFAULT_SPAM_SAMPLES + DEFAULT_HAM_SAMPLES
+        labels = [1] * len(DEFAULT_SPAM_SAMPLES) + [0] * len(DEFAULT_HAM_SAMPLES)
         
         # Create and train model
-        spam_model = make_pipeline(
+        model = make_pipeline(
             TfidfVectorizer(
+                analyzer=SpamTextAnalyzer(stop_words='english', ngram_range=(1, 3)),
                 max_features=5000,
-                stop_words='english',
-                ngram_range=(1, 3),
                 min_df=1,
                 max_df=0.95,
                 sublinear_tf=True
@@ -390,28 +821,59 @@ def load_spam_model():
             MultinomialNB(alpha=1.0)
         )
         
-        spam_model.fit(texts, labels)
+        model.fit(texts, labels)
         
         # Save model
-        joblib.dump(spam_model, model_path)
+        joblib.dump(model, model_path)
+        activate_spam_model(model, model_fingerprint(model_path))
         logger.info("Spam detection model created and saved successfully")
         
         # Test model
         test_spam = "Congratulations! You won $1000! Click now!"
         test_ham = "Please review the attached document"
         
-        spam_pred = spam_model.predict([test_spam])[0]
-        ham_pred = spam_model.predict([test_ham])[0]
+        spam_pred = model.predict([test_spam])[0]
+        ham_pred = model.predict([test_ham])[0]
         
         logger.info(f"Model test - Spam prediction: {spam_pred}, Ham prediction: {ham_pred}")
+        return list(zip(texts, labels))
         
     except Exception as e:
         logger.error(f"Model creation failed: {e}")
         spam_model = None
+        spam_scorer = None
+        return None
+
+def initialize_coalescer():
+    """Put the request coalescer in front of the spam model"""
+    global spam_coalescer
+    
+    spam_coalescer = RequestCoalescer(
+        predict_spam_batch,
+        window_ms=config.COALESCE_WINDOW_MS,
+        max_batch_size=config.COALESCE_MAX_BATCH
+    )
+    logger.info(f"Request coalescing enabled ({config.COALESCE_WINDOW_MS} ms window, max batch {config.COALESCE_MAX_BATCH})")
+
+def initialize_blocklist():
+    """Open the domain blocklist, compiling it first if the source lists changed"""
+    global domain_blocklist
+    
+    sources = {}
+    for entry in config.URL_BLOCKLISTS.split(','):
+        name, _, path = entry.strip().rpartition('=')
+        if path:
+            sources[name or Path(path).stem] = path
+    if not sources:
+        return
+    
+    domain_blocklist = DomainBlocklist.load(sources, config.URL_BLOCKLIST_CACHE_PATH)
+    logger.info(f"Domain blocklist loaded: {len(domain_blocklist)} domains from {', '.join(sources)} "
+                f"({domain_blocklist.nbytes / 1024 / 1024:.1f} MB mapped)")
 
 def initialize_ocr():
     """Initialize OCR engines"""
-    global ocr_reader
+    global ocr_reader, ocr_pool, ocr_service
     
     try:
         # Test Tesseract
@@ -420,81 +882,178 @@ def initialize_ocr():
         logger.info("Tesseract OCR initialized successfully")
     except Exception as e:
         logger.warning(f"Tesseract initialization failed: {e}")
-    
-    try:
-        # Initialize EasyOCR
-        ocr_reader = easyocr.Reader(['en'], gpu=False)
-        logger.info("EasyOCR initialized successfully")
-    except Exception as e:
-        logger.warning(f"EasyOCR initialization failed: {e}")
 
-def preprocess_image(image):
-    """Enhanced image preprocessing for better OCR"""
-    try:
-        # Convert to grayscale
-        if image.mode != 'L':
-            image = image.convert('L')
-        
-        # Enhance contrast
-        enhancer = ImageEnhance.Contrast(image)
-        image = enhancer.enhance(2.0)
-        
-        # Enhance sharpness
-        enhancer = ImageEnhance.Sharpness(image)
-        image = enhancer.enhance(1.5)
-        
-        # Convert to OpenCV format
-        cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_GRAY2BGR)
-        
-        # Apply denoising
-        cv_image = cv2.fastNlMeansDenoising(cv_image)
-        
-        # Apply threshold
-        gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        # Convert back to PIL
-        return Image.fromarray(thresh)
-        
-    except Exception as e:
-        logger.error(f"Image preprocessing failed: {e}")
-        return image
+    if config.OCR_PREPROCESS not in ('auto',) + ocr_engine.PREPROCESS_PROFILES:
+        logger.warning(f"Unknown OCR_PREPROCESS '{config.OCR_PREPROCESS}', planning preprocessing per image")
+        config.OCR_PREPROCESS = 'auto'
 
-def extract_text_from_image(image):
-    """Extract text using multiple OCR methods"""
-    extracted_texts = []
-    
-    # Preprocess image
-    processed_image = preprocess_image(image)
+    if config.OCR_POOL_ENABLED:
+        if multiprocessing.parent_process() is not None:
+            return  # an OCR process importing this script as __mp_main__
+        # One pool for the host, started once in the importing process (gunicorn's master with
+        # preload_app); forked web workers inherit its address and send their OCR there
+        if ocr_service is None:
+            ocr_service = start_service(
+                workers=config.OCR_POOL_WORKERS,
+                queue_size=config.OCR_QUEUE_SIZE,
+                timeout=config.OCR_TIMEOUT_SECONDS,
+                tesseract_config=config.TESSERACT_CONFIG,
+                tesseract_cmd=pytesseract.pytesseract.tesseract_cmd,
+                use_easyocr=ocr_engine.EASYOCR_AVAILABLE,
+                min_confidence=config.OCR_MIN_CONFIDENCE,
+                min_chars=config.OCR_MIN_CHARS,
+                preprocess=config.OCR_PREPROCESS
+            )
+        ocr_pool = OcrPoolClient(ocr_service.address, use_easyocr=ocr_engine.EASYOCR_AVAILABLE)
+        logger.info(f"OCR pool enabled: {config.OCR_POOL_WORKERS} workers, queue {config.OCR_QUEUE_SIZE} for the host")
+    else:
+        ocr_reader = ocr_engine.create_easyocr_reader()
+
+def classify_text(text, clean_email_text, run, top_k=0, from_image=False):
+    """Cascade tiers 0 and 1 for one text; returns (prediction, probabilities, explanation, decisive)"""
+    # explain=true asks for the model's reasons, so it skips the rule tier
+    if spam_cascade.rules_apply(from_image) and not top_k:
+        with run.tier('rules'):
+            verdict = spam_cascade.rule_verdict(text, from_image)
+        if verdict is not None:
+            run.decide('rules')
+            return verdict[0], np.array(verdict[1]), None, True
     
-    # Method 1: Tesseract OCR
-    try:
-        tesseract_text = pytesseract.image_to_string(
-            processed_image, 
-            config=config.TESSERACT_CONFIG
-        ).strip()
-        if tesseract_text:
-            extracted_texts.append(("Tesseract", tesseract_text))
-    except Exception as e:
-        logger.error(f"Tesseract OCR failed: {e}")
+    with run.tier('model'):
+        if top_k:
+            prediction, probabilities, explanation = explain_spam(clean_email_text, top_k)
+        else:
+            predictions, probabilities = predict_spam([clean_email_text])
+            prediction, probabilities, explanation = predictions[0], probabilities[0], None
+    run.decide('model')
+    return prediction, probabilities, explanation, spam_cascade.model_is_decisive(probabilities)
+
+def analyze_long_text(text):
+    """Score a text too long to clean in full from sampled windows; returns (prediction, probabilities, coverage)"""
+    # Windows bypass the verdict cache and near-duplicate index: partial texts would only evict real entries
+    is_spam, probabilities, coverage = score_long_document(
+        text,
+        score=predict_spam_uncached,
+        clean=clean_text,
+        window_chars=config.LONG_DOC_WINDOW_CHARS,
+        token_budget=config.LONG_DOC_TOKEN_BUDGET,
+        decisive_margin=config.LONG_DOC_DECISIVE_MARGIN,
+        batch_windows=config.LONG_DOC_BATCH_WINDOWS
+    )
+    return int(is_spam), probabilities, coverage
+
+def check_links(text):
+    """Links found in a raw text and the blocklisted ones among them"""
+    if len(text) > config.URL_SCAN_MAX_CHARS:
+        half = config.URL_SCAN_MAX_CHARS // 2
+        text = text[:half] + '\n' + text[-half:]
+    links = extract_links(text)
+    hits = domain_blocklist.check_links(links) if domain_blocklist is not None else []
+    return {'count': len(links), 'blocklist_hits': hits}
+
+def load_ocr_image(source):
+    """Open an image for OCR: header size check, reduced JPEG decoding, x-height normalization; returns (image, report)"""
+    return ocr_engine.load_image(source, max_pixels=config.OCR_MAX_PIXELS, max_image_pixels=config.OCR_MAX_IMAGE_PIXELS)
+
+def quick_ocr_text(image):
+    """Single Tesseract pass on the grayscale image, without enhancement or denoising; returns (text, ocr report)"""
+    if ocr_pool is not None:
+        return ocr_pool.quick_text(image)
+    return ocr_engine.quick_text(image, config.TESSERACT_CONFIG)
+
+def classify_image(image, run, top_k=0):
+    """OCR and classify an image; full OCR (tier 2) runs only when a quick OCR pass is not decisive
+
+    A near-identical image in the OCR cache skips OCR and reuses its text, which is scored again.
+    Returns (extracted_text, clean_extracted_text, prediction, probabilities, explanation, ocr),
+    where ocr reports the OCR engines behind the text, or None when no readable text was found.
+    """
+    signature = None
+    if ocr_cache is not None:
+        with run.tier('ocr_cache'):
+            cached, signature = ocr_cache.lookup(image)
+        if cached is not None:
+            return classify_cached_image(cached, run, top_k)
     
-    # Method 2: EasyOCR
-    if ocr_reader:
-        try:
-            results = ocr_reader.readtext(np.array(processed_image))
-            easyocr_text = ' '.join([result[1] for result in results if result[2] > 0.5]).strip()
-            if easyocr_text:
-                extracted_texts.append(("EasyOCR", easyocr_text))
-        except Exception as e:
-            logger.error(f"EasyOCR failed: {e}")
+    run_both = False
+    if spam_cascade.enabled:
+        with run.tier('quick_ocr'):
+            quick_text, quick_report = quick_ocr_text(image)
+        if quick_text and len(quick_text) >= 5:
+            clean_quick_text = clean_text(quick_text)
+            prediction, probabilities, explanation, decisive = classify_text(quick_text, clean_quick_text, run, top_k, from_image=True)
+            if decisive:
+                if ocr_cache is not None:
+                    ocr_cache.put(signature, quick_text, quick_report)
+                return quick_text, clean_quick_text, prediction, probabilities, explanation, quick_report
+        # Tesseract already struggled on this image, so full OCR runs both engines at once
+        run_both = quick_report['confidence']['tesseract'] < config.OCR_MIN_CONFIDENCE
     
-    # Return best result (longest text)
-    if extracted_texts:
-        best_result = max(extracted_texts, key=lambda x: len(x[1]))
-        logger.info(f"Best OCR result from {best_result[0]}: {len(best_result[1])} characters")
-        return best_result[1]
-    else:
+    with run.tier('ocr'):
+        extracted_text, ocr = extract_text_from_image(image, run_both)
+        if not extracted_text or len(extracted_text.strip()) < 5:
+            # Remembered too, so resending an image without text skips OCR as well
+            if ocr_cache is not None:
+                ocr_cache.put(signature, extracted_text, ocr)
+            return None
+        
+        clean_extracted_text = clean_text(extracted_text)
+        prediction, probabilities, explanation = score_image_text(clean_extracted_text, top_k)
+    if ocr_cache is not None:
+        ocr_cache.put(signature, extracted_text, ocr)
+    run.decide('ocr')
+    return extracted_text, clean_extracted_text, prediction, probabilities, explanation, ocr
+
+def classify_cached_image(cached, run, top_k=0):
+    """classify_image for an OCR cache hit: the model on the cached text"""
+    extracted_text, ocr = cached['text'], cached_ocr_report(cached)
+    if len(extracted_text.strip()) < 5:
         return None
+    
+    clean_extracted_text = clean_text(extracted_text)
+    with run.tier('model'):
+        prediction, probabilities, explanation = score_image_text(clean_extracted_text, top_k)
+    run.decide('ocr')
+    return extracted_text, clean_extracted_text, prediction, probabilities, explanation, ocr
+
+def cached_ocr_report(cached):
+    """OCR report of a cache hit, noting the hash distance and the tier it came from"""
+    return dict(cached['ocr'] or {}, cache={'tier': cached['tier'], 'distance': cached['distance']})
+
+def score_image_text(clean_extracted_text, top_k=0):
+    """Model verdict on OCR text; returns (prediction, probabilities, explanation)"""
+    if top_k:
+        return explain_spam(clean_extracted_text, top_k)
+    predictions, probabilities = predict_spam([clean_extracted_text])
+    return predictions[0], probabilities[0], None
+
+def read_image_text(image):
+    """extract_text_from_image through the OCR cache; returns (text, ocr report)"""
+    if ocr_cache is None:
+        return extract_text_from_image(image)
+    cached, signature = ocr_cache.lookup(image)
+    if cached is not None:
+        return cached['text'], cached_ocr_report(cached)
+    text, ocr = extract_text_from_image(image)
+    ocr_cache.put(signature, text, ocr)
+    return text, ocr
+
+def extract_text_from_image(image, run_both=False):
+    """Extract text with Tesseract, plus EasyOCR when Tesseract's reading is weak; returns (text, ocr report)
+
+    Runs in the OCR pool when it is enabled.
+    """
+    if ocr_pool is not None:
+        return ocr_pool.extract_text(image, run_both=run_both)
+    return ocr_engine.extract_text(
+        image,
+        config.TESSERACT_CONFIG,
+        ocr_reader,
+        min_confidence=config.OCR_MIN_CONFIDENCE,
+        min_chars=config.OCR_MIN_CHARS,
+        run_both=run_both,
+        preprocess=config.OCR_PREPROCESS
+    )
 
 def clean_text(text):
     """Clean and preprocess text for spam detection"""
@@ -502,17 +1061,11 @@ def clean_text(text):
         return ""
     
     try:
-        # Remove HTML tags if present
-        text = BeautifulSoup(text, 'html.parser').get_text()
-        
-        # Normalize whitespace
-        text = re.sub(r'\s+', ' ', text)
+        # Remove HTML tags if present (BeautifulSoup only for markup the fast path can't handle)
+        text = strip_html(text)
         
-        # Remove excessive punctuation
-        text = re.sub(r'[!]{2,}', '!', text)
-        text = re.sub(r'[?]{2,}', '?', text)
-        
-        return text.strip()
+        # Normalize whitespace and remove excessive punctuation in one pass
+        return normalize_text(text)
         
     except Exception as e:
         logger.error(f"Text cleaning failed: {e}")
@@ -573,13 +1126,31 @@ def health_check():
         'timestamp': datetime.now().isoformat(),
         'version': '2.0.0',
         'components': {
-            'spam_model': spam_model is not None,
+            'spam_model': model_available(),
+            'compiled_scorer': type(spam_scorer).__name__ if spam_scorer else None,
             'ocr_tesseract': True,  # Always assume available
-            'ocr_easyocr': ocr_reader is not None,
+            'ocr_easyocr': ocr_reader is not None or (ocr_pool is not None and ocr_pool.use_easyocr),
+            'ocr_pool': ocr_pool is not None,
             'database': db_manager.use_postgres
         }
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Runtime metrics for performance tuning"""
+    return jsonify({
+        'timestamp': datetime.now().isoformat(),
+        'pid': os.getpid(),
+        'model_version': spam_model_version,
+        'coalescer': spam_coalescer.stats() if spam_coalescer else None,
+        'verdict_cache': verdict_cache.stats() if verdict_cache else None,
+        'near_duplicates': near_duplicates.stats() if near_duplicates else None,
+        'ocr_pool': ocr_pool.stats() if ocr_pool else None,
+        'ocr_cache': ocr_cache.stats() if ocr_cache else None,
+        'html_strip_tiers': html_strip_stats(),
+        'cascade': spam_cascade.stats()
+    })
+
 @app.route('/register', methods=['POST'])
 def register():
     """User registration"""
@@ -663,7 +1234,7 @@ def login():
 def analyze_text():
     """Analyze text for spam detection"""
     try:
-        if not spam_model:
+        if not model_available():
             return jsonify({'error': 'Spam detection model not available'}), 503
         
         data = request.get_json()
@@ -675,16 +1246,32 @@ def analyze_text():
         if len(email_text) < 10:
             return jsonify({'error': 'Text too short for analysis'}), 400
         
-        # Clean text
-        clean_email_text = clean_text(email_text)
-        
-        # Predict
-        prediction = spam_model.predict([clean_email_text])[0]
-        probabilities = spam_model.predict_proba([clean_email_text])[0]
+        # Predict; very long texts are scored from windows instead of being cleaned in full
+        top_k = explain_top_k(data)
+        run = CascadeRun()
+        coverage = None
+        if len(email_text) > config.LONG_DOC_THRESHOLD_CHARS:
+            with run.tier('model'):
+                prediction, probabilities, coverage = analyze_long_text(email_text)
+            run.decide('model')
+            processed_text_length = coverage.pop('processed_text_length')
+            explanation = None
+        else:
+            clean_email_text = clean_text(email_text)
+            processed_text_length = len(clean_email_text)
+            prediction, probabilities, explanation, _ = classify_text(email_text, clean_email_text, run, top_k)
+        spam_cascade.record(run)
         
         is_spam = bool(prediction)
         confidence = float(max(probabilities))
         
+        # A link to a blocklisted domain marks the message spam whatever the text scored
+        links = check_links(email_text)
+        if links['blocklist_hits'] and config.URL_BLOCKLIST_MARKS_SPAM:
+            links['marked_spam'] = not is_spam
+            is_spam = True
+            confidence = max(float(probabilities[1]), config.URL_BLOCKLIST_CONFIDENCE)
+        
         # Save to database
         user_id = request.current_user_id
         client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR'))
@@ -701,26 +1288,130 @@ def analyze_text():
         except Exception as db_error:
             logger.error(f"Database save failed: {db_error}")
         
-        return jsonify({
+        result = {
             'is_spam': is_spam,
             'confidence': confidence,
             'analysis': {
                 'spam_probability': float(probabilities[1]) if len(probabilities) > 1 else confidence,
                 'ham_probability': float(probabilities[0]) if len(probabilities) > 1 else (1 - confidence),
-                'processed_text_length': len(clean_email_text)
+                'processed_text_length': processed_text_length,
+                'cascade': run.summary(),
+                'links': links
             }
-        })
+        }
+        if coverage is not None:
+            coverage['total_chars'] = len(email_text)
+            result['analysis']['long_document'] = coverage
+        if top_k:
+            result['explanation'] = explanation
+        
+        return jsonify(result)
         
     except Exception as e:
         logger.error(f"Text analysis error: {e}")
         return jsonify({'error': 'Analysis failed'}), 500
 
+@app.route('/analyze/batch', methods=['POST'])
+@jwt_required
+def analyze_batch():
+    """Analyze many texts with a single vectorizer/model call"""
+    try:
+        if not model_available():
+            return jsonify({'error': 'Spam detection model not available'}), 503
+        
+        data = request.get_json()
+        if not data or not isinstance(data.get('texts'), list) or not data['texts']:
+            return jsonify({'error': 'A non-empty list of texts is required'}), 400
+        
+        texts = data['texts']
+        if len(texts) > config.BATCH_MAX_ITEMS:
+            return jsonify({'error': f'Too many texts (max {config.BATCH_MAX_ITEMS} per batch)'}), 400
+        
+        # Validate and clean every item, keeping per-item errors in place
+        results = [None] * len(texts)
+        valid_indices = []
+        clean_texts = []
+        for index, item in enumerate(texts):
+            if not isinstance(item, str) or len(item.strip()) < 10:
+                results[index] = {'index': index, 'error': 'Text too short for analysis'}
+                continue
+            valid_indices.append(index)
+            clean_texts.append(clean_text(item.strip()))
+        
+        # Tier 0 per item, then every undecided item through the model in one pass
+        runs = [CascadeRun() for _ in valid_indices]
+        verdicts = [None] * len(valid_indices)
+        if spam_cascade.rules_apply():
+            for position, index in enumerate(valid_indices):
+                with runs[position].tier('rules'):
+                    verdict = spam_cascade.rule_verdict(texts[index])
+                if verdict is not None:
+                    runs[position].decide('rules')
+                    verdicts[position] = verdict
+        
+        pending = [position for position, verdict in enumerate(verdicts) if verdict is None]
+        if pending:
+            start = time.perf_counter()
+            predictions, probabilities = predict_spam([clean_texts[position] for position in pending])
+            model_seconds = (time.perf_counter() - start) / len(pending)
+            for offset, position in enumerate(pending):
+                verdicts[position] = (predictions[offset], probabilities[offset])
+                runs[position].charge('model', model_seconds)
+                runs[position].decide('model')
+        
+        user_id = request.current_user_id
+        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR'))
+        history_rows = []
+        
+        for position, index in enumerate(valid_indices):
+            prediction, item_probabilities = verdicts[position]
+            is_spam = bool(prediction)
+            confidence = float(max(item_probabilities))
+            spam_cascade.record(runs[position])
+            
+            results[index] = {
+                'index': index,
+                'is_spam': is_spam,
+                'confidence': confidence,
+                'analysis': {
+                    'spam_probability': float(item_probabilities[1]) if len(item_probabilities) > 1 else confidence,
+                    'ham_probability': float(item_probabilities[0]) if len(item_probabilities) > 1 else (1 - confidence),
+                    'processed_text_length': len(clean_texts[position]),
+                    'decided_by': runs[position].decided_by
+                }
+            }
+            history_rows.append({
+                'user_id': user_id,
+                'email_text': texts[index].strip()[:1000],  # Truncate for storage
+                'is_spam': is_spam,
+                'confidence': confidence,
+                'analysis_type': 'batch',
+                'ip_address': client_ip
+            })
+        
+        # Save all results with one insert
+        try:
+            db_manager.save_analyses(history_rows)
+        except Exception as db_error:
+            logger.error(f"Database save failed: {db_error}")
+        
+        return jsonify({
+            'results': results,
+            'total': len(texts),
+            'analyzed': len(valid_indices),
+            'spam_count': sum(1 for row in history_rows if row['is_spam'])
+        })
+        
+    except Exception as e:
+        logger.error(f"Batch analysis error: {e}")
+        return jsonify({'error': 'Batch analysis failed'}), 500
+
 @app.route('/analyze-image', methods=['POST'])
 @jwt_required
 def analyze_image():
     """Analyze image with OCR and spam detection"""
     try:
-        if not spam_model:
+        if not model_available():
             return jsonify({'error': 'Spam detection model not available'}), 503
         
         data = request.get_json()
@@ -734,22 +1425,21 @@ def analyze_image():
         
         try:
             image_bytes = base64.b64decode(image_data)
-            image = Image.open(io.BytesIO(image_bytes))
+            image, normalization = load_ocr_image(io.BytesIO(image_bytes))
+        except ImageTooLarge as e:
+            return jsonify({'error': f'Image too large: {e}'}), 413
         except Exception as e:
             return jsonify({'error': 'Invalid image data'}), 400
         
-        # Extract text using OCR
-        extracted_text = extract_text_from_image(image)
+        # Extract text with OCR and analyze it, escalating through the cascade tiers
+        top_k = explain_top_k(data)
+        run = CascadeRun()
+        classified = classify_image(image, run, top_k)
+        spam_cascade.record(run)
         
-        if not extracted_text or len(extracted_text.strip()) < 5:
+        if classified is None:
             return jsonify({'error': 'No readable text found in image'}), 400
-        
-        # Clean extracted text
-        clean_extracted_text = clean_text(extracted_text)
-        
-        # Analyze with spam model
-        prediction = spam_model.predict([clean_extracted_text])[0]
-        probabilities = spam_model.predict_proba([clean_extracted_text])[0]
+        extracted_text, clean_extracted_text, prediction, probabilities, explanation, ocr = classified
         
         is_spam = bool(prediction)
         confidence = float(max(probabilities))
@@ -771,7 +1461,7 @@ def analyze_image():
         except Exception as db_error:
             logger.error(f"Database save failed: {db_error}")
         
-        return jsonify({
+        result = {
             'is_spam': is_spam,
             'confidence': confidence,
             'extracted_text': extracted_text,
@@ -779,14 +1469,182 @@ def analyze_image():
                 'spam_probability': float(probabilities[1]) if len(probabilities) > 1 else confidence,
                 'ham_probability': float(probabilities[0]) if len(probabilities) > 1 else (1 - confidence),
                 'extracted_text_length': len(extracted_text),
-                'processed_text_length': len(clean_extracted_text)
+                'processed_text_length': len(clean_extracted_text),
+                'cascade': run.summary(),
+                'image': normalization,
+                'ocr': ocr
             }
-        })
+        }
+        if top_k:
+            result['explanation'] = explanation
+        
+        return jsonify(result)
         
+    except OcrUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Image analysis error: {e}")
         return jsonify({'error': 'Image analysis failed'}), 500
 
+@app.route('/analyze/raw', methods=['POST'])
+@jwt_required
+def analyze_raw():
+    """Analyze a raw RFC 822 message (.eml body): text parts plus OCR of image attachments"""
+    try:
+        if not model_available():
+            return jsonify({'error': 'Spam detection model not available'}), 503
+        
+        # Parse while the body streams in; only text and image parts are decoded
+        message = parse_message(request.stream, config.RAW_READ_CHUNK_BYTES)
+        
+        parts = extract_parts(
+            message,
+            max_part_bytes=config.RAW_MAX_PART_BYTES,
+            max_images=config.RAW_MAX_IMAGES,
+            max_image_bytes=config.RAW_MAX_IMAGE_BYTES
+        )
+        
+        # The subject and body parts form one document; each readable image is its own item
+        raw_texts = [text for text in [parts['subject']] + [part['text'] for part in parts['text_parts']] if text]
+        body_text = ' '.join(clean_text(text) for text in raw_texts)
+        items = []
+        run = CascadeRun()
+        skip_images = False
+        if len(body_text) >= 10:
+            body = {'type': 'body', 'text': body_text, 'verdict': None}
+            items.append(body)
+            
+            # A body that is decisively spam settles the message, so image OCR (tier 2) can be skipped
+            if spam_cascade.enabled:
+                prediction, body_probabilities, _, decisive = classify_text(' '.join(raw_texts), body_text, run)
+                body['verdict'] = (prediction, body_probabilities)
+                skip_images = decisive and bool(prediction)
+        
+        for image_part in parts['images']:
+            if skip_images:
+                parts['skipped'].append({
+                    'content_type': image_part['content_type'],
+                    'filename': image_part['filename'],
+                    'reason': 'body already decisively spam'
+                })
+                continue
+            
+            try:
+                with run.tier('ocr'):
+                    image, normalization = load_ocr_image(io.BytesIO(image_part['data']))
+                    extracted_text, ocr = read_image_text(image)
+            except ImageTooLarge as e:
+                parts['skipped'].append({
+                    'content_type': image_part['content_type'],
+                    'filename': image_part['filename'],
+                    'reason': f'image too large: {e}'
+                })
+                continue
+            except OcrUnavailable as e:
+                # The message is still scored from its other parts
+                parts['skipped'].append({
+                    'content_type': image_part['content_type'],
+                    'filename': image_part['filename'],
+                    'reason': f'OCR unavailable: {e}'
+                })
+                continue
+            except Exception as e:
+                logger.error(f"Raw message image OCR failed: {e}")
+                extracted_text, ocr, normalization = None, None, None
+            
+            if not extracted_text or len(extracted_text.strip()) < 5:
+                parts['skipped'].append({
+                    'content_type': image_part['content_type'],
+                    'filename': image_part['filename'],
+                    'reason': 'no readable text'
+                })
+                continue
+            items.append({
+                'type': 'image',
+                'filename': image_part['filename'],
+                'extracted_text': extracted_text,
+                'text': clean_text(extracted_text),
+                'image': normalization,
+                'ocr': ocr,
+                'verdict': None
+            })
+        
+        if not items:
+            spam_cascade.record(run)
+            return jsonify({'error': 'No analyzable text found in message'}), 400
+        
+        # Score everything not yet decided (the body and every image) in one model call
+        pending = [item for item in items if item['verdict'] is None]
+        if pending:
+            with run.tier('model'):
+                predictions, probabilities = predict_spam([item['text'] for item in pending])
+            for item, prediction, item_probabilities in zip(pending, predictions, probabilities):
+                item['verdict'] = (prediction, item_probabilities)
+        run.decide('ocr' if any(item['type'] == 'image' for item in items) else run.decided_by or 'model')
+        spam_cascade.record(run)
+        
+        results = []
+        for item in items:
+            prediction, item_probabilities = item['verdict']
+            confidence = float(max(item_probabilities))
+            result = {
+                'type': item['type'],
+                'is_spam': bool(prediction),
+                'confidence': confidence,
+                'spam_probability': float(item_probabilities[1]) if len(item_probabilities) > 1 else confidence,
+                'processed_text_length': len(item['text'])
+            }
+            if item['type'] == 'image':
+                result['filename'] = item['filename']
+                result['extracted_text'] = item['extracted_text']
+                result['image'] = item['image']
+                result['ocr'] = item['ocr']
+            results.append(result)
+        
+        # The message is spam if any of its parts is
+        verdict = max(results, key=lambda result: result['spam_probability'])
+        is_spam = any(result['is_spam'] for result in results)
+        confidence = verdict['confidence'] if is_spam else min(result['confidence'] for result in results)
+        
+        user_id = request.current_user_id
+        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR'))
+        extracted_text = ' '.join(item['extracted_text'] for item in items if item['type'] == 'image')
+        
+        try:
+            db_manager.save_analysis(
+                user_id=user_id,
+                email_text=(body_text or parts['subject'])[:1000],
+                is_spam=is_spam,
+                confidence=confidence,
+                analysis_type='raw',
+                ip_address=client_ip,
+                extracted_text=extracted_text[:2000] or None
+            )
+        except Exception as db_error:
+            logger.error(f"Database save failed: {db_error}")
+        
+        return jsonify({
+            'is_spam': is_spam,
+            'confidence': confidence,
+            'subject': parts['subject'],
+            'from': parts['from'],
+            'analysis': {
+                'spam_probability': verdict['spam_probability'],
+                'cascade': run.summary(),
+                'text_parts': [
+                    {'content_type': part['content_type'], 'truncated': part['truncated']} for part in parts['text_parts']
+                ],
+                'items': results,
+                'skipped': parts['skipped']
+            }
+        })
+        
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        logger.error(f"Raw message analysis error: {e}")
+        return jsonify({'error': 'Raw message analysis failed'}), 500
+
 @app.route('/upload-analyze', methods=['POST'])
 @jwt_required
 def upload_and_analyze():
@@ -809,19 +1667,17 @@ def upload_and_analyze():
         
         try:
             # Open and process image
-            image = Image.open(filepath)
-            
-            # Extract text
-            extracted_text = extract_text_from_image(image)
-            
-            if not extracted_text or len(extracted_text.strip()) < 5:
-                return jsonify({'error': 'No readable text found in uploaded image'}), 400
+            image, normalization = load_ocr_image(filepath)
             
-            # Analyze with spam model
-            if spam_model:
-                clean_extracted_text = clean_text(extracted_text)
-                prediction = spam_model.predict([clean_extracted_text])[0]
-                probabilities = spam_model.predict_proba([clean_extracted_text])[0]
+            # Analyze with spam model, escalating through the cascade tiers
+            if model_available():
+                run = CascadeRun()
+                classified = classify_image(image, run)
+                spam_cascade.record(run)
+                
+                if classified is None:
+                    return jsonify({'error': 'No readable text found in uploaded image'}), 400
+                extracted_text, clean_extracted_text, prediction, probabilities, _, ocr = classified
                 
                 is_spam = bool(prediction)
                 confidence = float(max(probabilities))
@@ -851,12 +1707,21 @@ def upload_and_analyze():
                         'spam_probability': float(probabilities[1]) if len(probabilities) > 1 else confidence,
                         'ham_probability': float(probabilities[0]) if len(probabilities) > 1 else (1 - confidence),
                         'extracted_text_length': len(extracted_text),
-                        'processed_text_length': len(clean_extracted_text)
+                        'processed_text_length': len(clean_extracted_text),
+                        'cascade': run.summary(),
+                        'image': normalization,
+                        'ocr': ocr
                     }
                 }
             else:
+                extracted_text, ocr = read_image_text(image)
+                if not extracted_text or len(extracted_text.strip()) < 5:
+                    return jsonify({'error': 'No readable text found in uploaded image'}), 400
+                
                 result = {
                     'extracted_text': extracted_text,
+                    'image': normalization,
+                    'ocr': ocr,
                     'message': 'Text extracted successfully, but spam analysis unavailable'
                 }
             
@@ -867,6 +1732,10 @@ def upload_and_analyze():
             if os.path.exists(filepath):
                 os.remove(filepath)
                 
+    except ImageTooLarge as e:
+        return jsonify({'error': f'Image too large: {e}'}), 413
+    except OcrUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Upload analysis error: {e}")
         return jsonify({'error': 'Upload analysis failed'}), 500
@@ -883,6 +1752,13 @@ def not_found(error):
 def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
+@app.errorhandler(OcrUnavailable)
+def ocr_unavailable(error):
+    logger.warning(f"OCR unavailable: {error}")
+    response = jsonify({'error': f'OCR is busy, retry later ({error})'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
 # Initialize components
 def initialize_app():
     """Initialize all app components"""
@@ -909,6 +1785,16 @@ def initialize_app():
     except Exception as e:
         logger.error(f"Spam model initialization failed: {e}")
     
+    # Coalesce concurrent single-text predictions
+    if config.COALESCE_ENABLED:
+        initialize_coalescer()
+    
+    # Domain blocklists for link checks
+    try:
+        initialize_blocklist()
+    except Exception as e:
+        logger.error(f"Domain blocklist initialization failed: {e}")
+    
     # Initialize OCR
     try:
         initialize_ocr()
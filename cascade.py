@@ -0,0 +1,132 @@
+"""
+Cascaded spam detection
+Each request climbs the tiers only as far as it needs to:
+
+    tier 0  'rules'  weighted phrases + caps / '!' / '$' heuristics (microseconds)
+    tier 1  'model'  TF-IDF + Naive Bayes on the cleaned text
+    tier 2  'ocr'    full OCR (denoising, every engine) and the model on its text
+
+A tier decides when its verdict clears that tier's threshold; otherwise the
+next tier runs. Images get a quick single-engine OCR pass ('quick_ocr', timed
+but not a deciding tier) so tiers 0 and 1 can try to decide before tier 2. Every request records the tier that decided it and the time
+spent in each tier, so thresholds can be tuned against the cost they save.
+
+Tier 0 runs for image text by default only: there it can save a full OCR pass,
+while on plain text the phrase scan costs about as much as the model it would
+skip and decides too few requests to pay for itself (tests/benchmark_cascade.py).
+"""
+import re
+import time
+import threading
+from contextlib import contextmanager
+
+from keyword_rules import count_uppercase
+
+TIERS = ('rules', 'model', 'ocr')
+
+_DOLLAR_AMOUNT_RE = re.compile(r'\$\d')
+
+
+def rule_score(text, keyword_rules):
+    """Score of the rule-based detector: phrase weights plus the caps, '!' and '$' heuristics"""
+    score = keyword_rules.score(text)
+    if text and count_uppercase(text) / len(text) > 0.3:
+        score += 2
+    if text.count('!') > 3:
+        score += 1
+    if _DOLLAR_AMOUNT_RE.search(text):
+        score += 1
+    return score
+
+
+class CascadeRun:
+    """Tiers run and time spent for one request"""
+
+    def __init__(self):
+        self.tiers_run = []
+        self.seconds = {}
+        self.decided_by = None
+
+    @contextmanager
+    def tier(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.charge(name, time.perf_counter() - start)
+
+    def charge(self, name, seconds):
+        """Record time spent in a tier, e.g. this request's share of a batched model call"""
+        if name not in self.tiers_run:
+            self.tiers_run.append(name)
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def decide(self, name):
+        self.decided_by = name
+
+    def summary(self):
+        return {
+            'decided_by': self.decided_by,
+            'tiers_run': list(self.tiers_run),
+            'tier_ms': {name: round(seconds * 1000, 3) for name, seconds in self.seconds.items()}
+        }
+
+
+class Cascade:
+    """Per-tier thresholds plus counters of which tier decided and what each tier cost"""
+
+    def __init__(self, keyword_rules, rule_spam_score=6.0, rule_ham_score=-1.0, model_confidence=0.9, enabled=True,
+                 text_rules=False):
+        self.keyword_rules = keyword_rules
+        self.rule_spam_score = rule_spam_score
+        self.rule_ham_score = rule_ham_score
+        self.model_confidence = model_confidence
+        self.enabled = enabled
+        self.text_rules = text_rules
+        self._lock = threading.Lock()
+        self.decided = {name: 0 for name in TIERS}
+        self.runs = {name: 0 for name in TIERS}
+        self.seconds = {name: 0.0 for name in TIERS}
+
+    def rules_apply(self, from_image=False):
+        """Whether tier 0 runs: always for OCR text, for submitted text only when text_rules is set"""
+        return self.enabled and (from_image or self.text_rules)
+
+    def rule_verdict(self, text, from_image=False):
+        """(label, [ham, spam] probabilities) when the rules are decisive, else None"""
+        if not self.rules_apply(from_image):
+            return None
+        score = rule_score(text, self.keyword_rules)
+        spam_probability = min(score / 10.0, 1.0)
+        if score >= self.rule_spam_score:
+            return 1, [1.0 - spam_probability, spam_probability]
+        if score <= self.rule_ham_score:
+            return 0, [1.0 - spam_probability, spam_probability]
+        return None
+
+    def model_is_decisive(self, probabilities):
+        """Whether a model verdict stops the cascade before OCR-derived signals"""
+        return not self.enabled or max(probabilities) >= self.model_confidence
+
+    def record(self, run):
+        with self._lock:
+            if run.decided_by is not None:
+                self.decided[run.decided_by] += 1
+            for name in run.tiers_run:
+                self.runs[name] = self.runs.get(name, 0) + 1
+                self.seconds[name] = self.seconds.get(name, 0.0) + run.seconds.get(name, 0.0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'text_rules': self.text_rules,
+                'thresholds': {
+                    'rule_spam_score': self.rule_spam_score,
+                    'rule_ham_score': self.rule_ham_score,
+                    'model_confidence': self.model_confidence
+                },
+                'decided_by': dict(self.decided),
+                'tier_runs': dict(self.runs),
+                'tier_seconds': {name: round(seconds, 6) for name, seconds in self.seconds.items()}
+            }
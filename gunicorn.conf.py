@@ -1,3 +1,4 @@
+import gc
 import multiprocessing
 import os
 
@@ -8,6 +9,8 @@ backlog = 2048
 # Worker processes
 workers = min(multiprocessing.cpu_count() * 2 + 1, 4)  # Max 4 workers for Railway
 worker_class = "sync"
+# Threads > 1 switches sync workers to gthread, which lets COALESCE_ENABLED batch concurrent requests
+threads = int(os.getenv('GUNICORN_THREADS', 1))
 worker_connections = 1000
 timeout = 60
 keepalive = 2
@@ -49,4 +52,12 @@ def worker_int(worker):
     worker.log.info("Worker received INT or QUIT signal")
 
 def pre_fork(server, worker):
+    # Move the preloaded app's objects out of GC passes so workers don't dirty those pages
+    gc.freeze()
     server.log.info("Worker spawned (pid: %s)", worker.pid)
+
+def on_exit(server):
+    # The shared OCR pool was started by the preloaded app in this (master) process
+    from app_production import ocr_service
+    if ocr_service is not None:
+        ocr_service.shutdown()
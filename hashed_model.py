@@ -0,0 +1,190 @@
+"""
+Feature-hashing spam model
+TF-IDF + Multinomial Naive Bayes over a fixed number of hashed n-gram buckets.
+Training streams the corpus twice (document frequencies, then class counts), so
+memory is O(buckets) whatever the corpus size, and scoring needs no vocabulary.
+"""
+import csv
+import logging
+
+import numpy as np
+
+from mapped_arrays import write_mapped_arrays, open_mapped_arrays
+from spam_scorer import CompiledSpamScorer, token_hash, ngram_hashes, ngrams_at
+from text_analyzer import SpamTextAnalyzer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = 2 ** 18
+
+
+def iter_training_csv(path):
+    """Stream (text, label) pairs from a CSV with 'text' and 'label' columns"""
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row.get('text'):
+                yield row['text'], int(row['label'])
+
+
+class CsvCorpus:
+    """Re-iterable view of a training CSV, so fit() can make two passes without loading it"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        return iter_training_csv(self.path)
+
+
+class HashedSpamModel(CompiledSpamScorer):
+    """Hashed-feature TF-IDF + Multinomial NB with streaming fit"""
+
+    def __init__(self, n_buckets=DEFAULT_BUCKETS, ngram_range=(1, 3), stop_words='english',
+                 lowercase=True, token_pattern=r"(?u)\b\w\w+\b", sublinear_tf=True, norm='l2', alpha=1.0,
+                 fold_unicode=True):
+        if n_buckets & (n_buckets - 1):
+            raise ValueError("n_buckets must be a power of two")
+        analyzer = SpamTextAnalyzer(stop_words, ngram_range, lowercase, token_pattern, fold_unicode)
+
+        self.n_buckets = n_buckets
+        self.vocabulary = None
+        self.idf = np.ones(n_buckets, dtype=np.float64)
+        self.feature_log_prob = None
+        self.class_log_prior = None
+        self.classes = None
+        self.stop_words = analyzer.stop_words
+        self.ngram_range = analyzer.ngram_range
+        self.lowercase = lowercase
+        self.token_pattern = token_pattern
+        self.sublinear_tf = sublinear_tf
+        self.binary = False
+        self.norm = norm
+        self.alpha = alpha
+        self.fold_unicode = fold_unicode
+        self.analyzer = analyzer
+        self._log_odds = None
+
+    def buckets(self, text):
+        """Bucket index of every n-gram in a text"""
+        return self.position_features(self.tokenize(text))
+
+    def position_features(self, tokens):
+        """Bucket index of every n-gram position"""
+        if not tokens:
+            return np.empty(0, dtype=np.intp)
+        hashes = ngram_hashes(
+            np.fromiter((token_hash(token) for token in tokens), dtype=np.uint64, count=len(tokens)),
+            self.ngram_range
+        )
+        return (hashes & np.uint64(self.n_buckets - 1)).astype(np.intp)
+
+    def explained_vector(self, tokens):
+        buckets = self.position_features(tokens)
+        indices, weights = self._bucket_vector(buckets)
+        return indices, weights, (tokens, buckets)
+
+    def feature_names(self, indices, source):
+        """Buckets have no names, so each is named by the first n-gram of the text hashed into it"""
+        tokens, buckets = source
+        first = (buckets[:, np.newaxis] == indices).argmax(axis=0)
+        return ngrams_at(tokens, first.tolist(), self.ngram_range)
+
+    def transform_one(self, text):
+        """Return (bucket indices, tf-idf weights) for a single text"""
+        return self._bucket_vector(self.buckets(text))
+
+    def transform_tokens(self, tokens):
+        return self._bucket_vector(self.position_features(tokens))
+
+    def _bucket_vector(self, buckets):
+        indices, counts = np.unique(buckets, return_counts=True)
+        if indices.size == 0:
+            return indices, np.empty(0, dtype=np.float64)
+        return indices, self._weigh(indices, counts.astype(np.float64))
+
+    def fit(self, corpus):
+        """Train from a re-iterable of (text, label) pairs in two streaming passes"""
+        # Pass 1: document frequencies and class counts
+        document_frequency = np.zeros(self.n_buckets, dtype=np.int64)
+        class_counts = {}
+        n_documents = 0
+        for text, label in corpus:
+            document_frequency[np.unique(self.buckets(text))] += 1
+            class_counts[label] = class_counts.get(label, 0) + 1
+            n_documents += 1
+        if n_documents == 0:
+            raise ValueError("Cannot fit on an empty corpus")
+
+        # Same smoothed idf as TfidfVectorizer(smooth_idf=True)
+        self.idf = np.log((1.0 + n_documents) / (1.0 + document_frequency)) + 1.0
+        self.classes = np.array(sorted(class_counts))
+        class_index = {label: row for row, label in enumerate(self.classes)}
+
+        # Pass 2: tf-idf weighted feature counts per class
+        feature_counts = np.zeros((len(self.classes), self.n_buckets), dtype=np.float64)
+        for text, label in corpus:
+            indices, weights = self.transform_one(text)
+            feature_counts[class_index[label], indices] += weights
+
+        self._set_log_probabilities(feature_counts, np.array([class_counts[label] for label in self.classes], dtype=np.float64))
+        logger.info(f"Hashed model trained on {n_documents} documents, {self.n_buckets} buckets")
+        return self
+
+    def _set_log_probabilities(self, feature_counts, class_counts):
+        """Multinomial NB parameters from accumulated counts (Laplace/Lidstone smoothing)"""
+        smoothed = feature_counts + self.alpha
+        self.feature_log_prob = np.ascontiguousarray(
+            (np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))).T
+        )
+        self.class_log_prior = np.log(class_counts) - np.log(class_counts.sum())
+        self._log_odds = None
+
+    def save_mapped(self, path):
+        """Write the hashed model as a memory-mappable artifact"""
+        write_mapped_arrays(path, {
+            'idf': self.idf,
+            'feature_log_prob': self.feature_log_prob,
+            'class_log_prior': self.class_log_prior,
+            'log_odds': self.log_odds,
+        }, metadata={
+            'format': 'hashed-spam-scorer',
+            'n_buckets': self.n_buckets,
+            'classes': self.classes.tolist(),
+            'stop_words': sorted(self.stop_words or ()),
+            'ngram_range': list(self.ngram_range),
+            'lowercase': self.lowercase,
+            'token_pattern': self.token_pattern,
+            'sublinear_tf': self.sublinear_tf,
+            'norm': self.norm,
+            'alpha': self.alpha,
+            'fold_unicode': self.fold_unicode,
+        })
+
+    @classmethod
+    def open(cls, path):
+        """Open a hashed model artifact with its arrays memory-mapped read-only"""
+        metadata, arrays = open_mapped_arrays(path)
+        if metadata.get('format') != 'hashed-spam-scorer':
+            raise ValueError(f"{path} is not a hashed spam model artifact")
+
+        model = cls(
+            n_buckets=metadata['n_buckets'],
+            ngram_range=metadata['ngram_range'],
+            stop_words=metadata['stop_words'] or None,
+            lowercase=metadata['lowercase'],
+            token_pattern=metadata['token_pattern'],
+            sublinear_tf=metadata['sublinear_tf'],
+            norm=metadata['norm'],
+            alpha=metadata['alpha'],
+            fold_unicode=metadata.get('fold_unicode', False),
+        )
+        model.path = path
+        model.idf = arrays['idf']
+        model.feature_log_prob = arrays['feature_log_prob']
+        model.class_log_prior = arrays['class_log_prior']
+        model.classes = np.asarray(metadata['classes'])
+        model._log_odds = arrays.get('log_odds')
+        return model
+
+    # The mapped artifact is the only format a hashed model has; reopen it with HashedSpamModel.open
+    save = save_mapped
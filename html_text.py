@@ -0,0 +1,103 @@
+"""
+Tiered HTML-to-text stripping for clean_text()
+Produces the same text as BeautifulSoup(text, 'html.parser').get_text() (up to
+runs of whitespace, which clean_text() collapses anyway), but only builds a parse
+tree when it has to:
+
+1. plain text (no '<' or '&') is returned untouched;
+2. ordinary HTML mail goes through a regex pass that drops comments, tags,
+   declarations and script/style bodies, then decodes well-formed entities;
+3. anything the regex pass cannot handle exactly the way BeautifulSoup does
+   (stray '<', CDATA, ruby/template text, unusual entities) falls back to it.
+"""
+import re
+import html
+from html.entities import html5
+
+from bs4 import BeautifulSoup
+
+# Quoted attribute values may contain '>'; a bare '<' inside a tag is left to the fallback
+_TAG_BODY = r'''(?:[^<>"']|"[^"]*"|'[^']*')*'''
+
+# One left-to-right pass, so a <script> inside a comment or attribute is not mistaken for one
+_MARKUP_RE = re.compile(
+    r'<(script|style)(?:\s' + _TAG_BODY + r')?(?<!/)>.*?</\1\s*>'   # dropped with their text, like get_text()
+    r'|<!--.*?-->'                                                   # comments
+    r'|<![a-zA-Z]' + _TAG_BODY + r'>'                                # <!DOCTYPE ...>
+    r'|<\?[^>]*>'                                                    # processing instructions
+    r'|</?(?!(?:script|style|template|rt|rp)[\s/>])[a-zA-Z][^\s/<>]*(?:[\s/]' + _TAG_BODY + r')?>',  # other tags
+    re.IGNORECASE | re.DOTALL
+)
+# Anything left unmatched (CDATA, stray or unclosed script/style, ruby and template
+# tags whose text get_text() treats specially) keeps its '<' and goes to the fallback
+
+_REFERENCE_RE = re.compile(r'&(?:(#[0-9]{1,7}|#[xX][0-9a-fA-F]{1,6}|[A-Za-z][A-Za-z0-9]{0,31});)?')
+
+tier_counts = {'plain': 0, 'fast': 0, 'fallback': 0}
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _safe_codepoint(codepoint):
+    """Code points html.unescape and BeautifulSoup decode identically"""
+    if codepoint == 10 or 32 <= codepoint < 127:
+        return True
+    if 160 <= codepoint < 0xD800 or 0xE000 <= codepoint < 0xFDD0 or 0xFDF0 <= codepoint <= 0xFFFD:
+        return True
+    return 0x10000 <= codepoint <= 0x10FFFF and codepoint & 0xFFFE != 0xFFFE
+
+
+def _decode_reference(match):
+    reference = match.group(1)
+    if reference is None:
+        # A bare '&' stays literal only when nothing that looks like a name follows it
+        end = match.end()
+        if end == len(match.string) or match.string[end] in ' \t\r\n&':
+            return '&'
+        raise _Unsupported()
+
+    if reference[0] == '#':
+        codepoint = int(reference[2:], 16) if reference[1] in 'xX' else int(reference[1:])
+        if not _safe_codepoint(codepoint):
+            raise _Unsupported()
+        return chr(codepoint)
+
+    if reference + ';' not in html5:
+        raise _Unsupported()
+    return html.unescape(match.group(0))
+
+
+def _fast_strip(text):
+    """Regex stripper; returns None when the text needs a real parser"""
+    if '<' in text:
+        text = _MARKUP_RE.sub('', text)
+        if '<' in text:
+            return None
+
+    if '&' in text:
+        try:
+            text = _REFERENCE_RE.sub(_decode_reference, text)
+        except _Unsupported:
+            return None
+    return text
+
+
+def strip_html(text):
+    """Text content of an HTML fragment, as BeautifulSoup(text, 'html.parser').get_text() would return it"""
+    if '<' not in text and '&' not in text:
+        tier_counts['plain'] += 1
+        return text
+
+    stripped = _fast_strip(text)
+    if stripped is not None:
+        tier_counts['fast'] += 1
+        return stripped
+
+    tier_counts['fallback'] += 1
+    return BeautifulSoup(text, 'html.parser').get_text()
+
+
+def stats():
+    return dict(tier_counts)
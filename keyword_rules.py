@@ -0,0 +1,181 @@
+"""
+Weighted spam phrase matching for rule_based_spam_detection()
+Phrases come from a plain-text file, one per line, optionally followed by a
+tab and a weight (default 1); blank lines and '#' comments are ignored:
+
+    click here	1
+    wire transfer fee	2.5
+
+All phrases are folded into a single prefix-trie regex, so scoring is one scan
+over the text whatever the size of the list. Phrases match at the start of a
+word and may end inside one, like the substring rules they replaced ('winner'
+also catches 'winners', 'casino' 'casinos'; 'prince' still fires on 'princess'
+but 'act now' no longer on 'react now'), case-insensitively, across any run of
+whitespace, and each distinct phrase counts once. The file is re-read when its mtime or size changes (checked at
+most every check_interval seconds), so lists can be edited without a restart.
+"""
+import os
+import re
+import time
+import string
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PHRASES = {
+    'urgent': 1.0, 'winner': 1.0, 'congratulations': 1.0, 'free money': 1.0, 'click here': 1.0,
+    'limited time': 1.0, 'act now': 1.0, 'guaranteed': 1.0, 'no risk': 1.0, 'call now': 1.0,
+    'make money fast': 1.0, 'work from home': 1.0, 'lose weight': 1.0, 'viagra': 1.0,
+    'casino': 1.0, 'lottery': 1.0, 'inheritance': 1.0, 'prince': 1.0, 'millions': 1.0
+}
+
+# The phrase list every app reads unless SPAM_PHRASES_PATH points elsewhere
+DEFAULT_PHRASES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spam_phrases.txt')
+
+_ASCII_UPPERCASE = string.ascii_uppercase.encode('ascii')
+
+
+def count_uppercase(text):
+    """Number of uppercase characters, without a Python-level loop for ASCII text"""
+    if text.isascii():
+        data = text.encode('ascii')
+        return len(data) - len(data.translate(None, _ASCII_UPPERCASE))
+    return sum(map(str.isupper, text))
+
+
+def normalize_phrase(phrase):
+    return ' '.join(phrase.lower().split())
+
+
+def parse_phrases(lines):
+    """{phrase: weight} from 'phrase[<TAB>weight]' lines"""
+    phrases = {}
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        phrase, _, weight = line.partition('\t')
+        phrase = normalize_phrase(phrase)
+        try:
+            phrases[phrase] = float(weight) if weight.strip() else 1.0
+        except ValueError:
+            logger.warning(f"Ignoring phrase on line {line_number} with invalid weight {weight!r}")
+    phrases.pop('', None)
+    return phrases
+
+
+def _trie_pattern(node):
+    """Regex for a character trie node; longer phrases are tried first"""
+    terminal = '' in node
+    branches = []
+    for char in sorted(key for key in node if key):
+        token = r'\s+' if char == ' ' else re.escape(char)
+        branches.append(token + _trie_pattern(node[char]))
+
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if terminal:
+        return '(?:' + body + ')?'
+    return body
+
+
+def compile_phrases(phrases):
+    """Return (pattern, {phrase: [(phrase or shorter phrase it starts with, weight), ...]})"""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    # A match reports the longest phrase at a position; the shorter phrases it starts with
+    # matched there too
+    expansions = {}
+    for phrase in phrases:
+        expansions[phrase] = [
+            (phrase[:end], phrases[phrase[:end]])
+            for end in range(1, len(phrase) + 1)
+            if phrase[:end] in phrases
+        ]
+
+    if not phrases:
+        return None, expansions
+    body = _trie_pattern(trie)
+    pattern = re.compile(r'(?<!\w)(?=(' + body + r'))')
+    return pattern, expansions
+
+
+class KeywordRules:
+    """Hot-reloadable weighted phrase list compiled into one regex"""
+
+    def __init__(self, path=None, check_interval=2.0, default_phrases=DEFAULT_PHRASES):
+        self.path = path
+        self.check_interval = check_interval
+        self.default_phrases = default_phrases
+        self._lock = threading.Lock()
+        self._file_identity = None
+        self._checked_at = 0.0
+        self._compiled = (None, {})
+        self.phrase_count = 0
+        self.reload()
+
+    def _identity(self):
+        try:
+            stat = os.stat(self.path)
+        except (OSError, TypeError):
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self):
+        """(Re)build the matcher from the phrase file; the defaults only if it never existed"""
+        identity = self._identity()
+        phrases = self.default_phrases
+        if identity is not None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    phrases = parse_phrases(f)
+            except (OSError, UnicodeDecodeError) as e:
+                logger.error(f"Could not read spam phrases from {self.path}: {e}")
+                return
+        elif self._file_identity is not None:
+            logger.warning(f"Spam phrase file {self.path} disappeared, keeping the last loaded phrases")
+            self._file_identity = None
+            return
+        elif self.path:
+            logger.warning(f"Spam phrase file {self.path} not found, using {len(phrases)} built-in phrases")
+
+        self._compiled = compile_phrases({normalize_phrase(phrase): weight for phrase, weight in phrases.items()})
+        self._file_identity = identity
+        self.phrase_count = len(phrases)
+        logger.info(f"Loaded {self.phrase_count} spam phrases")
+
+    def reload_if_changed(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            if self._identity() != self._file_identity:
+                self.reload()
+
+    def match(self, text):
+        """{phrase: weight} of every listed phrase found in text, from one scan"""
+        self.reload_if_changed()
+        pattern, expansions = self._compiled
+        found = {}
+        if pattern is None:
+            return found
+
+        for match in pattern.finditer(text.lower()):
+            for phrase, weight in expansions[' '.join(match.group(1).split())]:
+                found[phrase] = weight
+        return found
+
+    def score(self, text):
+        """Sum of the weights of the distinct phrases found in text"""
+        return sum(self.match(text).values())
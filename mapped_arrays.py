@@ -0,0 +1,77 @@
+"""
+Single-file container of NumPy arrays that can be memory-mapped read-only
+Layout: 8-byte magic, 8-byte little-endian header length, JSON header, then
+every array at a 64-byte aligned offset. Workers that open the same file share
+one physical copy of the array pages through the OS page cache.
+"""
+import os
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b'SPAMMAP1'
+ALIGNMENT = 64
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_mapped_arrays(path, arrays, metadata=None):
+    """Write arrays plus JSON metadata atomically (write to a temp file, then rename)"""
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    # Offsets depend on the header size, so lay out twice until stable
+    layout = {}
+    header_size = 0
+    while True:
+        offset = _align(16 + header_size)
+        for name, array in arrays.items():
+            layout[name] = {
+                'offset': offset,
+                'dtype': array.dtype.str,
+                'shape': list(array.shape),
+            }
+            offset = _align(offset + array.nbytes)
+        header = json.dumps({'metadata': metadata or {}, 'arrays': layout}).encode('utf-8')
+        if len(header) == header_size:
+            break
+        header_size = len(header)
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(layout[name]['offset'])
+            f.write(array.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_mapped_header(path):
+    """Return the parsed JSON header of a mapped array file"""
+    with open(path, 'rb') as f:
+        if f.read(8) != MAGIC:
+            raise ValueError(f"{path} is not a mapped array file")
+        (header_size,) = struct.unpack('<Q', f.read(8))
+        return json.loads(f.read(header_size).decode('utf-8'))
+
+
+def open_mapped_arrays(path):
+    """Return (metadata, {name: read-only array backed by the file mapping}) for a mapped array file"""
+    header = read_mapped_header(path)
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        shape = tuple(spec['shape'])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.empty(shape, dtype=np.dtype(spec['dtype']))
+            continue
+        mapped = np.memmap(path, dtype=np.dtype(spec['dtype']), mode='r', offset=spec['offset'], shape=shape)
+        # Plain ndarray view of the same pages: np.memmap's Python-level __getitem__
+        # and __array_finalize__ cost microseconds on every fancy index
+        arrays[name] = mapped.view(np.ndarray)
+    return header['metadata'], arrays
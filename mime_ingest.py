@@ -0,0 +1,138 @@
+"""
+Raw RFC 822 message ingestion for /analyze/raw
+The request body is fed to email.parser.BytesFeedParser in chunks as it arrives.
+With the compat32 policy every part keeps its transfer-encoded payload as a
+string, so nothing is decoded up front: only text/plain and text/html parts are
+decoded (and only their first max_part_bytes), images are decoded for OCR, and
+all other attachments are never touched.
+"""
+import binascii
+import quopri
+import email.policy
+from email.parser import BytesFeedParser
+from email.header import decode_header, make_header
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+TEXT_TYPES = ('text/plain', 'text/html')
+
+
+def parse_message(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Parse a message from a binary stream without buffering the whole body first"""
+    parser = BytesFeedParser(policy=email.policy.compat32)
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        parser.feed(chunk)
+    return parser.close()
+
+
+def header_text(message, name):
+    """Decoded value of a header, '' when missing or undecodable"""
+    value = message.get(name)
+    if value is None:
+        return ''
+    try:
+        return str(make_header(decode_header(value)))
+    except (UnicodeError, LookupError, binascii.Error, ValueError):
+        return str(value)
+
+
+def encoded_size(part):
+    """Approximate decoded size of a part from its encoded payload length"""
+    payload = part.get_payload()
+    if part.get('Content-Transfer-Encoding', '').strip().lower() == 'base64':
+        return len(payload) * 3 // 4
+    return len(payload)
+
+
+def _payload_bytes(payload):
+    # BytesFeedParser keeps 8bit payloads as ASCII with surrogate escapes
+    try:
+        return payload.encode('ascii', 'surrogateescape')
+    except UnicodeError:
+        return payload.encode('utf-8', 'replace')
+
+
+def decode_payload(part, max_bytes=None):
+    """Transfer-decode a non-multipart part, reading only enough encoded input for max_bytes"""
+    payload = part.get_payload()
+    encoding = part.get('Content-Transfer-Encoding', '').strip().lower()
+
+    if encoding == 'base64':
+        if max_bytes is not None:
+            # 4 encoded chars per 3 bytes, plus room for a line break every 76 chars
+            payload = payload[:(max_bytes + 2) // 3 * 4 * 78 // 76 + 4]
+        data = ''.join(payload.split())
+        data = data[:len(data) - len(data) % 4]
+        try:
+            decoded = binascii.a2b_base64(data)
+        except binascii.Error:
+            decoded = b''
+    elif encoding == 'quoted-printable':
+        if max_bytes is not None:
+            payload = payload[:max_bytes * 3]
+        decoded = quopri.decodestring(_payload_bytes(payload))
+    else:
+        if max_bytes is not None:
+            payload = payload[:max_bytes]
+        decoded = _payload_bytes(payload)
+
+    return decoded if max_bytes is None else decoded[:max_bytes]
+
+
+def decode_text_part(part, max_bytes):
+    """Return (text, truncated) for a text/plain or text/html part"""
+    decoded = decode_payload(part, max_bytes + 1)
+    truncated = len(decoded) > max_bytes
+    charset = part.get_content_charset() or 'utf-8'
+    try:
+        return decoded[:max_bytes].decode(charset, 'replace'), truncated
+    except LookupError:
+        return decoded[:max_bytes].decode('utf-8', 'replace'), truncated
+
+
+def _body_parts(part):
+    """Text and image leaves, taking the displayed representation of each multipart/alternative"""
+    if part.is_multipart():
+        children = part.get_payload()
+        if part.get_content_type() == 'multipart/alternative':
+            # Mail clients show the last alternative they can render (normally text/html, or a
+            # multipart/related around it); scoring that one means a harmless text/plain
+            # sibling cannot hide the payload the reader actually sees
+            shown = [child for child in children if child.is_multipart() or child.get_content_type() in TEXT_TYPES]
+            if shown:
+                children = [shown[-1]] + [child for child in children if child not in shown]
+        for child in children:
+            yield from _body_parts(child)
+    elif part.get_content_type() in TEXT_TYPES or part.get_content_maintype() == 'image':
+        yield part
+
+
+def extract_parts(message, max_part_bytes, max_images, max_image_bytes):
+    """Split a parsed message into decoded text parts and image attachments to OCR"""
+    text_parts = []
+    images = []
+    skipped = []
+
+    for part in _body_parts(message):
+        content_type = part.get_content_type()
+        filename = part.get_filename()
+
+        if content_type in TEXT_TYPES:
+            if filename and part.get_content_disposition() == 'attachment':
+                skipped.append({'content_type': content_type, 'filename': filename, 'reason': 'text attachment'})
+                continue
+            text, truncated = decode_text_part(part, max_part_bytes)
+            text_parts.append({'content_type': content_type, 'text': text, 'truncated': truncated})
+        elif len(images) >= max_images:
+            skipped.append({'content_type': content_type, 'filename': filename, 'reason': 'too many images'})
+        elif encoded_size(part) > max_image_bytes:
+            skipped.append({'content_type': content_type, 'filename': filename, 'reason': 'image too large'})
+        else:
+            images.append({'content_type': content_type, 'filename': filename, 'data': decode_payload(part)})
+
+    return {
+        'subject': header_text(message, 'Subject'),
+        'from': header_text(message, 'From'),
+        'text_parts': text_parts,
+        'images': images,
+        'skipped': skipped
+    }
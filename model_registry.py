@@ -0,0 +1,236 @@
+"""
+Model registry
+Immutable, content-addressed model versions plus an "active" pointer per model mode:
+
+    <root>/versions/<version>/model.mmap      memory-mappable artifact (see mapped_arrays)
+    <root>/versions/<version>/manifest.json   sha256, format, metrics, training set hash, created_at
+    <root>/active-<channel>.json              {"version": ...}, swapped atomically
+
+The version is the start of the artifact's sha256, so registering the same model
+twice is a no-op and a version never changes under a running worker. Loading
+verifies the checksum once per artifact (a stamp keyed on inode, size and mtime
+records the result) and then maps the arrays, so startup is a few stat() calls.
+"""
+import os
+import sys
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+from datetime import datetime, timezone
+
+from mapped_arrays import read_mapped_header
+from spam_scorer import MappedSpamScorer
+from hashed_model import HashedSpamModel
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_NAME = 'model.mmap'
+MANIFEST_NAME = 'manifest.json'
+VERIFIED_STAMP_NAME = '.verified'
+
+OPENERS = {
+    'spam-scorer': MappedSpamScorer.open,
+    'hashed-spam-scorer': HashedSpamModel.open,
+}
+
+
+class ModelRegistryError(Exception):
+    """A registry artifact is missing, corrupt, or the requested change is unsafe"""
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def training_set_hash(pairs):
+    """Order-sensitive sha256 of (text, label) training pairs"""
+    digest = hashlib.sha256()
+    for text, label in pairs:
+        digest.update(f"{int(label)}\t{text}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _write_json(path, data):
+    """Write JSON atomically (temp file, fsync, rename)"""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+class ModelRegistry:
+    """Directory of immutable model versions with an active pointer per channel"""
+
+    def __init__(self, root, openers=None):
+        self.root = root
+        self.openers = dict(OPENERS, **(openers or {}))
+        self.versions_dir = os.path.join(root, 'versions')
+        os.makedirs(self.versions_dir, exist_ok=True)
+
+    def version_dir(self, version):
+        return os.path.join(self.versions_dir, version)
+
+    def artifact_path(self, version):
+        return os.path.join(self.version_dir(version), ARTIFACT_NAME)
+
+    def pointer_path(self, channel):
+        return os.path.join(self.root, f"active-{channel}.json")
+
+    def manifest(self, version):
+        try:
+            return _read_json(os.path.join(self.version_dir(version), MANIFEST_NAME))
+        except FileNotFoundError:
+            raise ModelRegistryError(f"Model version {version} is not registered")
+
+    def versions(self):
+        """Manifests of every registered version, oldest first"""
+        manifests = []
+        for version in os.listdir(self.versions_dir):
+            if os.path.exists(os.path.join(self.version_dir(version), MANIFEST_NAME)):
+                manifests.append(self.manifest(version))
+        return sorted(manifests, key=lambda manifest: manifest['created_at'])
+
+    def register(self, write_artifact, metrics=None, training_set_hash=None, **extra):
+        """Store the artifact written by write_artifact(path) as a new immutable version"""
+        staging_path = os.path.join(self.versions_dir, f".staging-{uuid.uuid4().hex}.mmap")
+        try:
+            write_artifact(staging_path)
+            sha256 = file_sha256(staging_path)
+            version = sha256[:16]
+            if os.path.exists(self.version_dir(version)):
+                logger.info(f"Model version {version} is already registered")
+                return self.manifest(version)
+
+            manifest = {
+                'version': version,
+                'sha256': sha256,
+                'format': read_mapped_header(staging_path)['metadata'].get('format'),
+                'size_bytes': os.path.getsize(staging_path),
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'metrics': metrics or {},
+                'training_set_hash': training_set_hash,
+                **extra
+            }
+
+            # Assemble the version in a private directory, then publish it with one rename
+            build_dir = os.path.join(self.versions_dir, f".build-{version}-{uuid.uuid4().hex[:8]}")
+            os.makedirs(build_dir)
+            os.replace(staging_path, os.path.join(build_dir, ARTIFACT_NAME))
+            os.chmod(os.path.join(build_dir, ARTIFACT_NAME), 0o444)
+            _write_json(os.path.join(build_dir, MANIFEST_NAME), manifest)
+            try:
+                os.rename(build_dir, self.version_dir(version))
+            except OSError:
+                # Another process registered the same content first
+                shutil.rmtree(build_dir, ignore_errors=True)
+                return self.manifest(version)
+
+            logger.info(f"Registered model version {version} ({manifest['format']}, {manifest['size_bytes']} bytes)")
+            return manifest
+        finally:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+
+    def register_file(self, path, **kwargs):
+        """Register a copy of an existing mapped artifact"""
+        return self.register(lambda target: shutil.copyfile(path, target), **kwargs)
+
+    def active_version(self, channel):
+        try:
+            return _read_json(self.pointer_path(channel))['version']
+        except FileNotFoundError:
+            return None
+
+    def pointer_mtime(self, channel):
+        """Modification time of the channel's active pointer (ns), for cheap change polling"""
+        try:
+            return os.stat(self.pointer_path(channel)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def activate(self, channel, version, force=False):
+        """Point a channel at a version; moving to an older version needs force=True"""
+        manifest = self.manifest(version)
+        self.verify(version)
+
+        current = self.active_version(channel)
+        if current and current != version and not force:
+            current_manifest = self.manifest(current)
+            if manifest['created_at'] < current_manifest['created_at']:
+                raise ModelRegistryError(
+                    f"Refusing to downgrade {channel} from {current} to older version {version} (use force)"
+                )
+
+        _write_json(self.pointer_path(channel), {
+            'version': version,
+            'previous_version': current,
+            'activated_at': datetime.now(timezone.utc).isoformat()
+        })
+        logger.info(f"Activated model version {version} for {channel}")
+        return manifest
+
+    def verify(self, version):
+        """Check the artifact against its manifest checksum, once per file"""
+        manifest = self.manifest(version)
+        path = self.artifact_path(version)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            raise ModelRegistryError(f"Artifact for model version {version} is missing")
+
+        identity = {'inode': stat.st_ino, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': manifest['sha256']}
+        stamp_path = os.path.join(self.version_dir(version), VERIFIED_STAMP_NAME)
+        try:
+            if _read_json(stamp_path) == identity:
+                return manifest
+        except (FileNotFoundError, ValueError):
+            pass
+
+        if stat.st_size != manifest['size_bytes'] or file_sha256(path) != manifest['sha256']:
+            raise ModelRegistryError(f"Checksum mismatch for model version {version}")
+
+        try:
+            _write_json(stamp_path, identity)
+        except OSError as e:
+            logger.warning(f"Could not record verification of model version {version}: {e}")
+        return manifest
+
+    def open(self, version):
+        """Verify a version and open its arrays memory-mapped"""
+        manifest = self.verify(version)
+        opener = self.openers.get(manifest['format'])
+        if opener is None:
+            raise ModelRegistryError(f"Unknown model format {manifest['format']!r} for version {version}")
+        return manifest, opener(self.artifact_path(version))
+
+    def load_active(self, channel):
+        """Return (manifest, scorer) for the channel's active version, or None if none is set"""
+        version = self.active_version(channel)
+        if version is None:
+            return None
+        return self.open(version)
+
+
+if __name__ == '__main__':
+    # python model_registry.py <root> list | activate <channel> <version> [--force]
+    logging.basicConfig(level=logging.INFO)
+    registry = ModelRegistry(sys.argv[1] if len(sys.argv) > 1 else 'model_registry')
+    command = sys.argv[2] if len(sys.argv) > 2 else 'list'
+    if command == 'activate':
+        registry.activate(sys.argv[3], sys.argv[4], force='--force' in sys.argv)
+    else:
+        for manifest in registry.versions():
+            print(json.dumps(manifest))
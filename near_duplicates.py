@@ -0,0 +1,193 @@
+"""
+Near-duplicate verdict index
+Spam campaigns change a few words per recipient (names, amounts, links), which
+defeats the exact-text verdict cache. This index keeps a MinHash signature of
+each recently decided text and returns a stored verdict when a new text is
+similar enough, so mutated copies of a campaign skip the model.
+
+Signatures are num_perm minimums of multiply-shift hashes over the text's
+distinct word unigrams and bigrams; the fraction of equal positions estimates
+the Jaccard similarity of two texts. For lookup the signature is cut into
+bands of rows; texts that agree on every row of some band share a bucket
+(LSH), so only those candidates are compared.
+
+Memory is bounded by capacity: entries live in a ring of preallocated arrays and
+the oldest one is overwritten, and bucket chains are linked by insertion
+sequence numbers, so an overwritten or expired entry simply ends a chain and
+nothing needs unlinking. With the defaults (32 permutations, 8 bands) an
+entry takes ~180 bytes: 64 for the 16-bit signature, ~85 for chain links and
+bucket heads, the rest for verdict, sequence number and timestamp.
+"""
+import time
+import threading
+from array import array
+
+import numpy as np
+
+from spam_scorer import token_hash, ngram_hashes
+
+
+class NearDuplicateIndex:
+    """Bounded MinHash LSH index from recently decided texts to their verdicts"""
+
+    def __init__(self, capacity=100000, num_perm=32, bands=8, min_similarity=0.75, min_confidence=0.9,
+                 min_shingles=8, ttl_seconds=3600, max_candidates=64, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.capacity = capacity
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.min_similarity = min_similarity
+        self.min_confidence = min_confidence
+        self.min_shingles = min_shingles
+        self.ttl = ttl_seconds
+        self.max_candidates = max_candidates
+
+        rng = np.random.default_rng(seed)
+        self._multipliers = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._offsets = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+
+        self._n_buckets = 1 << max(10, (capacity // 4).bit_length())
+        self._heads = [array('q', [-1]) * self._n_buckets for _ in range(bands)]
+        self._links = [array('q', [-1]) * capacity for _ in range(bands)]
+        self._seqs = array('q', [-1]) * capacity
+        self._times = array('d', [0.0]) * capacity
+        self._labels = [None] * capacity
+        self._probabilities = None
+        self._signatures = np.zeros((capacity, num_perm), dtype=np.uint16)
+        self._next_seq = 0
+        self._valid_from = 0
+        self._lock = threading.Lock()
+
+        self.model_version = None
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.inserts = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def signature(self, text):
+        """MinHash signature of a cleaned text, or None if it is too short to compare"""
+        tokens = text.split()
+        if not tokens:
+            return None
+        hashes = np.fromiter(map(token_hash, tokens), dtype=np.uint64, count=len(tokens))
+        shingles = np.unique(ngram_hashes(hashes, (1, 2)))
+        if len(shingles) < self.min_shingles:
+            return None
+        values = (shingles[:, np.newaxis] * self._multipliers + self._offsets) >> np.uint64(32)
+        return values.min(axis=0).astype(np.uint32)
+
+    def _buckets(self, signature):
+        data = signature.tobytes()
+        width = self.rows * 4
+        mask = self._n_buckets - 1
+        return [hash(data[start:start + width]) & mask for start in range(0, len(data), width)]
+
+    def set_model_version(self, model_version):
+        """Switch model version; verdicts from the old model are no longer returned"""
+        with self._lock:
+            if model_version == self.model_version:
+                return
+            self.model_version = model_version
+            self._valid_from = self._next_seq
+            self.invalidations += 1
+
+    def query(self, signature):
+        """(label, probabilities, similarity) of the most similar live entry, or None"""
+        expired_before = time.monotonic() - self.ttl
+        candidates = []
+        with self._lock:
+            for band, bucket in enumerate(self._buckets(signature)):
+                links = self._links[band]
+                seq = self._heads[band][bucket]
+                # Chains run newest to oldest, so the first dead entry ends the chain
+                while seq >= self._valid_from and len(candidates) < self.max_candidates:
+                    slot = seq % self.capacity
+                    if self._seqs[slot] != seq or self._times[slot] < expired_before:
+                        break
+                    candidates.append(slot)
+                    seq = links[slot]
+            if not candidates:
+                return None
+
+            similarities = np.count_nonzero(
+                self._signatures[candidates] == signature.astype(np.uint16), axis=1
+            ) / self.num_perm
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.min_similarity:
+                return None
+            slot = candidates[best]
+            return self._labels[slot], self._probabilities[slot].astype(np.float64), float(similarities[best])
+
+    def add(self, signature, label, probabilities):
+        """Remember a decided verdict; low-confidence verdicts are not worth reusing"""
+        probabilities = np.asarray(probabilities, dtype=np.float32)
+        if probabilities.max() < self.min_confidence:
+            return
+
+        buckets = self._buckets(signature)
+        with self._lock:
+            if self._probabilities is None:
+                self._probabilities = np.zeros((self.capacity, len(probabilities)), dtype=np.float32)
+            seq = self._next_seq
+            self._next_seq += 1
+            slot = seq % self.capacity
+            if self._seqs[slot] >= self._valid_from:
+                self.evictions += 1
+
+            self._seqs[slot] = seq
+            self._times[slot] = time.monotonic()
+            self._labels[slot] = label
+            self._probabilities[slot] = probabilities
+            self._signatures[slot] = signature
+            for band, bucket in enumerate(buckets):
+                self._links[band][slot] = self._heads[band][bucket]
+                self._heads[band][bucket] = seq
+            self.inserts += 1
+
+    def lookup(self, text):
+        """Return (verdict, signature) for a cleaned text
+
+        verdict is (label, probabilities) of a near-duplicate, or None; pass the
+        signature to add() once the text has been scored.
+        """
+        signature = self.signature(text)
+        if signature is None:
+            with self._lock:
+                self.skipped += 1
+            return None, None
+
+        found = self.query(signature)
+        with self._lock:
+            if found is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if found is None:
+            return None, signature
+        return (found[0], found[1]), signature
+
+    def __len__(self):
+        with self._lock:
+            return min(self._next_seq - self._valid_from, self.capacity)
+
+    def stats(self):
+        entries = len(self)
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'model_version': self.model_version,
+                'entries': entries,
+                'capacity': self.capacity,
+                'min_similarity': self.min_similarity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'skipped_short': self.skipped,
+                'inserts': self.inserts,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
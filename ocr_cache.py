@@ -0,0 +1,331 @@
+"""
+OCR result cache
+Image spam is repetitive: the same promo image arrives re-encoded, resized or
+inside a different border. This cache keys OCR results by a perceptual hash of
+the normalized grayscale image, so a near-identical image reuses the extracted
+text and its OCR report, skipping preprocessing and every OCR engine. Verdicts
+are not cached: the text is always scored again, under the current model.
+
+The hash is a 256-bit difference hash (dHash): uniform margins, borders and bars
+of any colour are trimmed, the rest is shrunk to 17x16 cells and each bit
+records whether a cell is brighter than its left neighbour. Screenshots sharing
+one layout differ in few cells, so a 64-bit hash (8x8 dHash or DCT pHash)
+cannot tell their messages apart. At 16x16, different messages on one template
+are 48 or more bits apart, while re-encoded, rescaled and re-bordered copies
+are ~8 bits apart (95% within ~19, a few up to ~35). A screenshot with only one
+line of text changed can be as close as a copy, so the default max_distance of
+16 trades ~10% of copies missing for ~2% of such edits reusing the old text
+(at 40, over half of them did; tests/benchmark_ocr_cache.py).
+
+Lookup is LSH over Hamming space: the hash is cut into 16 bands of 16 bits,
+entries sharing any band with the query are candidates, and the nearest one
+within max_distance bits is returned. A copy 16 bits away shares a band
+>99.9% of the time. The in-process tier is an LRU of at most
+max_entries; the optional SQLite tier, with the same band index as a table, is
+shared by all gunicorn workers on the host.
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 16                # cells per side; the hash has HASH_SIZE ** 2 bits
+BANDS = 16                    # LSH bands of 16 bits each
+TRIM_SIZE = 1024              # longest side (at most) of the reduced copy that margins are found on
+TRIM_TOLERANCE = 32           # gray levels a margin pixel may differ from its line's median
+TRIM_BUSY_FRACTION = 0.005    # fraction of differing pixels that makes a line content
+
+
+def _busy_span(lines):
+    """(first, last + 1) of the lines that are not uniform, or None"""
+    # The median of every 8th pixel is close enough to tell a uniform line, at an eighth of the cost
+    median = np.median(lines[:, ::8], axis=1)[:, np.newaxis]
+    differing = np.count_nonzero((lines > median + TRIM_TOLERANCE) | (lines < median - TRIM_TOLERANCE), axis=1)
+    busy = np.flatnonzero(differing > TRIM_BUSY_FRACTION * lines.shape[1])
+    if not len(busy):
+        return None
+    return int(busy[0]), int(busy[-1]) + 1
+
+
+def trim_margins(gray):
+    """Crop uniform rows and columns off the edges of a small copy of a grayscale PIL image
+
+    Rows and columns are trimmed alternately until nothing changes, since a
+    border keeps every row busy until its columns are gone. Returns None for a
+    blank image.
+    """
+    factor = -(-max(gray.size) // TRIM_SIZE)
+    if factor > 1:
+        gray = gray.reduce(factor)
+    pixels = np.asarray(gray, dtype=np.int16)
+    top, bottom, left, right = 0, pixels.shape[0], 0, pixels.shape[1]
+    for _ in range(4):
+        rows = _busy_span(pixels[top:bottom, left:right])
+        columns = _busy_span(pixels[top:bottom, left:right].T)
+        if rows is None or columns is None:
+            return None
+        box = (top + rows[0], top + rows[1], left + columns[0], left + columns[1])
+        if box == (top, bottom, left, right):
+            break
+        top, bottom, left, right = box
+    return gray.crop((left, top, right, bottom))
+
+
+def fingerprint(gray):
+    """256-bit dHash of a grayscale PIL image as 32 bytes, or None when the image is blank"""
+    trimmed = trim_margins(gray)
+    if trimmed is None:
+        return None
+    cells = np.asarray(trimmed.resize((HASH_SIZE + 1, HASH_SIZE), Image.BOX), dtype=np.int16)
+    return np.packbits(cells[:, 1:] > cells[:, :-1]).tobytes()
+
+
+def hamming(signatures, signature):
+    """Bit distances from each of a list of signatures to one signature"""
+    stacked = np.frombuffer(b''.join(signatures), dtype=np.uint8).reshape(len(signatures), -1)
+    return np.unpackbits(stacked ^ np.frombuffer(signature, dtype=np.uint8), axis=1).sum(axis=1)
+
+
+def band_values(signature):
+    return np.frombuffer(signature, dtype='>u2').tolist()
+
+
+class SharedOcrStore:
+    """SQLite-backed OCR result tier shared across worker processes"""
+
+    def __init__(self, path, max_entries=100000, prune_every=500):
+        self.path = path
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._writes = 0
+        self._init_schema()
+
+    def _connect(self):
+        """One connection per thread per process (connections must not cross a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_results (
+                signature BLOB PRIMARY KEY,
+                text TEXT NOT NULL,
+                ocr TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        # bucket = band << 16 | band value; the primary key doubles as the bucket index
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_bands (
+                bucket INTEGER NOT NULL,
+                signature BLOB NOT NULL,
+                PRIMARY KEY (bucket, signature)
+            ) WITHOUT ROWID
+        """)
+
+    def candidates(self, bands, limit):
+        """Live rows sharing a band with the query: (signature, text, ocr)"""
+        buckets = [band << 16 | value for band, value in enumerate(bands)]
+        rows = self._connect().execute(f"""
+            SELECT signature, text, ocr FROM ocr_results
+            WHERE signature IN (SELECT signature FROM ocr_bands WHERE bucket IN ({','.join('?' * len(buckets))}))
+            AND expires_at > ? LIMIT ?
+        """, (*buckets, time.time(), limit)).fetchall()
+        return [(bytes(row[0]), row[1], json.loads(row[2])) for row in rows]
+
+    def put(self, signature, text, ocr, expires_at):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO ocr_results (signature, text, ocr, expires_at) VALUES (?, ?, ?, ?)",
+            (signature, text, json.dumps(ocr), expires_at)
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO ocr_bands (bucket, signature) VALUES (?, ?)",
+            [(band << 16 | value, signature) for band, value in enumerate(band_values(signature))]
+        )
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune(conn)
+
+    def prune(self, conn=None):
+        """Drop expired rows, then the oldest rows beyond max_entries, then their bands"""
+        conn = conn or self._connect()
+        conn.execute("DELETE FROM ocr_results WHERE expires_at <= ?", (time.time(),))
+        conn.execute("""
+            DELETE FROM ocr_results WHERE signature IN (
+                SELECT signature FROM ocr_results ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+        conn.execute("DELETE FROM ocr_bands WHERE signature NOT IN (SELECT signature FROM ocr_results)")
+
+
+class OcrCache:
+    """LRU + TTL cache of OCR results keyed by perceptual hash, with hit/miss/eviction counters"""
+
+    def __init__(self, max_entries=10000, max_distance=16, ttl_seconds=86400, shared_path=None,
+                 shared_max_entries=100000, max_candidates=64):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.ttl = ttl_seconds
+        self.max_candidates = max_candidates
+        self._entries = OrderedDict()
+        self._bands = [{} for _ in range(BANDS)]
+        self._lock = threading.Lock()
+
+        self.shared = None
+        if shared_path:
+            try:
+                self.shared = SharedOcrStore(shared_path, max_entries=shared_max_entries)
+                logger.info(f"Shared OCR cache at {shared_path}")
+            except Exception as e:
+                logger.warning(f"Shared OCR cache unavailable, using in-process cache only: {e}")
+
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.skipped = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.seconds = 0.0
+
+    def lookup(self, image):
+        """Return (entry, signature) for a normalized grayscale image
+
+        entry is a dict with the cached 'text', 'ocr' report, 'distance' in
+        bits, 'tier' ('local' or 'shared') and 'signature', or None on a miss. Pass signature to put() once the image has been read; it is None
+        for a blank image, which is not cached.
+        """
+        start = time.perf_counter()
+        signature = fingerprint(image)
+        if signature is None:
+            with self._lock:
+                self.skipped += 1
+                self.seconds += time.perf_counter() - start
+            return None, None
+
+        bands = band_values(signature)
+        entry = self._lookup_local(signature, bands)
+        if entry is None and self.shared is not None:
+            entry = self._lookup_shared(signature, bands)
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.shared_hits += entry['tier'] == 'shared'
+            self.seconds += time.perf_counter() - start
+        return entry, signature
+
+    def _lookup_local(self, signature, bands):
+        now = time.time()
+        with self._lock:
+            candidates = set()
+            for band, value in enumerate(bands):
+                candidates.update(self._bands[band].get(value, ()))
+                if len(candidates) >= self.max_candidates:
+                    break
+            if not candidates:
+                return None
+
+            candidates = list(candidates)
+            distances = hamming(candidates, signature)
+            for index in np.argsort(distances, kind='stable'):
+                if distances[index] > self.max_distance:
+                    return None
+                key = candidates[index]
+                expires_at, text, ocr = self._entries[key]
+                if expires_at <= now:
+                    self._remove(key)
+                    self.expirations += 1
+                    continue
+                self._entries.move_to_end(key)
+                return {'signature': key, 'text': text, 'ocr': ocr,
+                        'distance': int(distances[index]), 'tier': 'local'}
+        return None
+
+    def _lookup_shared(self, signature, bands):
+        try:
+            rows = self.shared.candidates(bands, self.max_candidates)
+        except Exception as e:
+            logger.warning(f"Shared OCR cache read failed: {e}")
+            return None
+        if not rows:
+            return None
+
+        distances = hamming([row[0] for row in rows], signature)
+        best = int(np.argmin(distances))
+        if distances[best] > self.max_distance:
+            return None
+        key, text, ocr = rows[best]
+        self._store_local(key, text, ocr, time.time() + self.ttl)
+        return {'signature': key, 'text': text, 'ocr': ocr,
+                'distance': int(distances[best]), 'tier': 'shared'}
+
+    def put(self, signature, text, ocr):
+        """Cache what OCR read from an image (text may be empty)"""
+        if signature is None:
+            return
+        text = text or ''
+        expires_at = time.time() + self.ttl
+        self._store_local(signature, text, ocr, expires_at)
+
+        if self.shared is not None:
+            try:
+                self.shared.put(signature, text, ocr, expires_at)
+            except Exception as e:
+                logger.warning(f"Shared OCR cache write failed: {e}")
+
+    def _store_local(self, signature, text, ocr, expires_at):
+        with self._lock:
+            if signature not in self._entries:
+                for band, value in enumerate(band_values(signature)):
+                    self._bands[band].setdefault(value, set()).add(signature)
+            self._entries[signature] = (expires_at, text, ocr)
+            self._entries.move_to_end(signature)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, signature):
+        del self._entries[signature]
+        for band, value in enumerate(band_values(signature)):
+            bucket = self._bands[band][value]
+            bucket.discard(signature)
+            if not bucket:
+                del self._bands[band][value]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'max_distance': self.max_distance,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'skipped_blank': self.skipped,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'avg_lookup_ms': (self.seconds / (lookups + self.skipped) * 1000) if lookups + self.skipped else 0.0,
+                'shared_tier': self.shared.path if self.shared else None,
+                'shared_hits': self.shared_hits,
+            }
@@ -0,0 +1,366 @@
+"""
+OCR engines
+Image preprocessing plus the Tesseract and EasyOCR passes, with no Flask or app
+state, so the same code runs inline in a web worker or inside the OCR worker
+processes (see ocr_pool). Tesseract is the cheap engine and runs first;
+EasyOCR, several times slower on CPU, runs only when Tesseract's word
+confidences or text yield say its reading is weak.
+"""
+import math
+import time
+import logging
+import threading
+
+import numpy as np
+from PIL import Image
+import pytesseract
+
+logger = logging.getLogger(__name__)
+
+# Optional OCR dependencies
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    logger.warning("OpenCV not available - using basic image processing")
+    CV2_AVAILABLE = False
+
+try:
+    import easyocr
+    EASYOCR_AVAILABLE = True
+except ImportError:
+    logger.warning("EasyOCR not available - OCR will use Tesseract only")
+    EASYOCR_AVAILABLE = False
+
+
+def create_easyocr_reader(languages=('en',)):
+    """EasyOCR reader, or None when EasyOCR is unavailable or fails to load"""
+    if not EASYOCR_AVAILABLE:
+        return None
+    try:
+        reader = easyocr.Reader(list(languages), gpu=False)
+        logger.info("EasyOCR initialized successfully")
+        return reader
+    except Exception as e:
+        logger.warning(f"EasyOCR initialization failed: {e}")
+        return None
+
+
+class ImageTooLarge(ValueError):
+    """Image dimensions exceed the decode limit (decompression bomb protection)"""
+
+
+# Resolution normalization
+TARGET_X_HEIGHT = 24          # x-height (px) at which Tesseract reads best (capitals ~33 px)
+MAX_UPSCALE = 3.0             # small text is enlarged at most this much
+RESCALE_TOLERANCE = 0.25      # scales within this of 1.0 are not worth a resize
+ESTIMATE_MAX_PIXELS = 1500000 # glyph heights are measured on a copy reduced to about this size
+
+
+def estimate_x_height(gray):
+    """Text x-height in pixels of a single-channel uint8 array, or None without enough text
+
+    Estimated as the median height of glyphs, most of which are x-height lowercase
+    letters: connected components of the Otsu-binarized minority (ink) class, excluding
+    specks, solid blocks and anything wider or taller than a quarter of the image.
+    """
+    if not CV2_AVAILABLE:
+        return None
+    height, width = gray.shape
+    factor = min(1.0, (ESTIMATE_MAX_PIXELS / (height * width)) ** 0.5)
+    if factor < 1.0:
+        gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    ink = cv2.threshold(cv2.medianBlur(gray, 3), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    if np.count_nonzero(ink) > ink.size // 2:
+        ink = cv2.bitwise_not(ink)
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    widths, heights, areas = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT], stats[1:, cv2.CC_STAT_AREA]
+    fill = areas / np.maximum(widths * heights, 1)
+    glyphs = heights[(heights >= 3) & (heights <= ink.shape[0] // 4) & (widths <= ink.shape[1] // 4)
+                     & (fill >= 0.1) & (fill <= 0.9)]
+    if len(glyphs) < 10:
+        return None
+    return float(np.median(glyphs)) / factor
+
+
+def _estimate_reduced(gray):
+    """estimate_x_height of a PIL image, measured on a box-reduced copy when it is large"""
+    factor = math.ceil((gray.width * gray.height / ESTIMATE_MAX_PIXELS) ** 0.5)
+    if factor > 1:
+        x_height = estimate_x_height(np.asarray(gray.reduce(factor)))
+        return x_height and x_height * gray.width / (gray.width // factor)
+    return estimate_x_height(np.asarray(gray))
+
+
+def normalized_scale(width, height, x_height, max_pixels):
+    """Scale that brings text to TARGET_X_HEIGHT, capped by the pixel budget"""
+    scale = min(TARGET_X_HEIGHT / x_height, MAX_UPSCALE) if x_height else 1.0
+    if abs(scale - 1.0) <= RESCALE_TOLERANCE:
+        scale = 1.0
+    scale = min(scale, (max_pixels / (width * height)) ** 0.5)
+    # An enlargement the budget cut down to almost nothing is not worth a resize either
+    return 1.0 if 1.0 < scale <= 1.0 + RESCALE_TOLERANCE else scale
+
+
+def load_image(source, max_pixels=4000000, max_image_pixels=50000000):
+    """Open an image for OCR as grayscale, at the resolution its text needs
+
+    The dimensions are checked from the header before anything is decoded, so a
+    decompression bomb costs nothing (ImageTooLarge). For JPEGs, a 1/8-scale decode
+    estimates the x-height of large text, then libjpeg decodes straight to grayscale at
+    the smallest DCT scale (Image.draft) that still roughly covers the size the text and
+    the max_pixels budget call for, so full-size buffers are not materialized; other formats
+    are decoded in full. The result is resized once so the text x-height is near
+    TARGET_X_HEIGHT, never above max_pixels. source is a path or a seekable file object.
+    Returns (image, report).
+    """
+    start = time.perf_counter()
+    try:
+        image = Image.open(source)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e)) from e
+    width, height = image.size
+    if width * height > max_image_pixels:
+        raise ImageTooLarge(f"{width}x{height} image exceeds the {max_image_pixels} pixel limit")
+
+    image_format = image.format
+    if image_format == 'JPEG':
+        image.draft('L', (math.ceil(width / 8), math.ceil(height / 8)))
+        probe_x_height = _estimate_reduced(image.convert('L'))
+        # Text too small to see at 1/8 scale needs the full budget
+        scale = normalized_scale(width, height, probe_x_height and probe_x_height * width / image.width, max_pixels)
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        image = Image.open(source)
+        # Text within RESCALE_TOLERANCE of the target x-height reads as well, so the decode may undershoot
+        scale = min(scale * (1.0 - RESCALE_TOLERANCE), 1.0)
+        image.draft('L', (math.ceil(width * scale), math.ceil(height * scale)))
+    if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+        # Transparent screenshots: text drawn on nothing would turn black on black
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image)
+    gray = image if image.mode == 'L' else image.convert('L')
+    gray.load()
+    decoded_size = gray.size
+
+    x_height = _estimate_reduced(gray)
+    scale = normalized_scale(gray.width, gray.height, x_height, max_pixels)
+    if scale != 1.0:
+        size = (max(1, int(gray.width * scale)), max(1, int(gray.height * scale)))
+        gray = gray.resize(size, Image.BICUBIC if scale > 1 else Image.BOX)
+
+    return gray, {
+        'format': image_format,
+        'original_size': [width, height],
+        'decoded_size': list(decoded_size),
+        'size': list(gray.size),
+        'x_height': round(x_height * gray.width / decoded_size[0], 1) if x_height else None,
+        'ms': round((time.perf_counter() - start) * 1000, 3)
+    }
+
+
+# Preprocessing planner thresholds (8-bit gray levels)
+NOISE_SIGMA = 2.0             # flat-tile noise at which fastNlMeansDenoising pays off
+ILLUMINATION_SPREAD = 12      # background brightness spread across the image that needs a local threshold
+MIN_CONTRAST = 96             # 2nd-98th percentile spread below which the image is binarized with Otsu
+STATS_SAMPLE_PIXELS = 250000  # statistics are computed on a strided sample of about this many pixels
+PREPROCESS_PROFILES = ('none', 'otsu', 'adaptive', 'denoise')
+
+
+def image_stats(gray):
+    """Cheap statistics of a single-channel uint8 array that decide its preprocessing
+
+    noise: standard deviation of the flattest 8x8 tiles (10th percentile), which is 0
+    on rendered screenshots and survives the JPEG smoothing of photographed ones.
+    contrast: spread between the 2nd and 98th brightness percentiles.
+    illumination_spread: interquartile range of the background level (90th or, on dark
+    backgrounds, 10th percentile) over an 8x8 grid of blocks; shadows and lighting
+    gradients widen it, while a header bar or other solid UI covering under a quarter
+    of the image does not.
+    """
+    height, width = gray.shape
+    step = max(1, int((height * width / STATS_SAMPLE_PIXELS) ** 0.5))
+    sample = gray[::step, ::step]
+
+    histogram = np.bincount(sample.ravel(), minlength=256)
+    cdf = np.cumsum(histogram) / sample.size
+    low, median, high = np.searchsorted(cdf, [0.02, 0.5, 0.98])
+
+    noise = 0.0
+    tiles_h, tiles_w = sample.shape[0] // 8, sample.shape[1] // 8
+    if tiles_h and tiles_w:
+        tiles = sample[:tiles_h * 8, :tiles_w * 8].reshape(tiles_h, 8, tiles_w, 8).swapaxes(1, 2)
+        noise = float(np.percentile(tiles.reshape(-1, 64).std(axis=1, dtype=np.float32), 10))
+
+    spread = 0
+    block_h, block_w = sample.shape[0] // 8, sample.shape[1] // 8
+    if block_h >= 4 and block_w >= 4:
+        blocks = sample[:block_h * 8, :block_w * 8].reshape(8, block_h, 8, block_w).swapaxes(1, 2).reshape(64, -1)
+        k = int((0.9 if median >= 128 else 0.1) * (blocks.shape[1] - 1))
+        background = np.partition(blocks, k, axis=1)[:, k]
+        quartiles = np.percentile(background, [25, 75])
+        spread = int(quartiles[1] - quartiles[0])
+
+    return {
+        'width': width,
+        'height': height,
+        'noise': round(noise, 2),
+        'contrast': int(high - low),
+        'illumination_spread': spread
+    }
+
+
+def plan_preprocessing(stats):
+    """Cheapest preprocessing profile that the image statistics call for"""
+    if not CV2_AVAILABLE:
+        return 'none'
+    if stats['noise'] >= NOISE_SIGMA:
+        return 'denoise'
+    if stats['illumination_spread'] >= ILLUMINATION_SPREAD:
+        return 'adaptive'
+    if 0 < stats['contrast'] < MIN_CONTRAST:
+        return 'otsu'
+    return 'none'
+
+
+def _adaptive_threshold(gray):
+    block_size = max(15, min(gray.shape) // 20) | 1
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block_size, 10)
+
+
+def _otsu_threshold(gray):
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+def preprocess_image(image, profile='auto'):
+    """Prepare an image for OCR with the profile its statistics call for (or the given one)
+
+    Profiles, cheapest first: none (grayscale only; clean screenshots, which Tesseract
+    binarizes well itself), otsu (global threshold for low contrast), adaptive (local
+    threshold for uneven lighting) and denoise (fastNlMeansDenoising, by far the slowest
+    step, then a global or local threshold). Everything stays a single-channel uint8
+    array. Returns (array, plan) where plan records the profile, statistics and time.
+    """
+    start = time.perf_counter()
+    gray = np.asarray(image if image.mode == 'L' else image.convert('L'))
+    stats = image_stats(gray)
+    if profile == 'auto':
+        profile = plan_preprocessing(stats)
+
+    try:
+        if profile == 'otsu':
+            gray = _otsu_threshold(gray)
+        elif profile == 'adaptive':
+            gray = _adaptive_threshold(gray)
+        elif profile == 'denoise':
+            gray = cv2.fastNlMeansDenoising(gray, h=max(3.0, 2.0 * stats['noise']))
+            uneven = stats['illumination_spread'] >= ILLUMINATION_SPREAD
+            gray = _adaptive_threshold(gray) if uneven else _otsu_threshold(gray)
+    except Exception as e:
+        logger.error(f"Image preprocessing ({profile}) failed: {e}")
+        profile = 'none'
+
+    plan = dict(stats, profile=profile, ms=round((time.perf_counter() - start) * 1000, 3))
+    return gray, plan
+
+
+def tesseract_read(image, tesseract_config):
+    """Tesseract text with line breaks kept, and the mean confidence (0-100) of its words"""
+    data = pytesseract.image_to_data(image, config=tesseract_config, output_type=pytesseract.Output.DICT)
+    lines = {}
+    confidences = []
+    for word, confidence, block, paragraph, line in zip(
+        data['text'], data['conf'], data['block_num'], data['par_num'], data['line_num']
+    ):
+        word = word.strip()
+        confidence = float(confidence)
+        if not word or confidence < 0:
+            continue
+        lines.setdefault((block, paragraph, line), []).append(word)
+        confidences.append(confidence)
+    text = '\n'.join(' '.join(words) for words in lines.values())
+    return text, (sum(confidences) / len(confidences)) if confidences else 0.0
+
+
+def easyocr_read(reader, image):
+    """EasyOCR text from detections above 0.5 confidence, and their mean confidence (0-100)"""
+    results = [result for result in reader.readtext(np.asarray(image)) if result[2] > 0.5]
+    text = ' '.join(result[1] for result in results).strip()
+    return text, (100.0 * sum(result[2] for result in results) / len(results)) if results else 0.0
+
+
+def _timed_read(name, read, *args):
+    """Run one engine; returns (text, confidence, seconds), with no text when it fails"""
+    start = time.perf_counter()
+    try:
+        text, confidence = read(*args)
+    except Exception as e:
+        logger.error(f"{name} OCR failed: {e}")
+        text, confidence = '', 0.0
+    return text.strip(), confidence, time.perf_counter() - start
+
+
+def _report(readings, selected, escalated=False, concurrent=False, preprocess=None):
+    return {
+        'preprocess': preprocess,
+        'engines_run': list(readings),
+        'engine_ms': {name: round(reading[2] * 1000, 3) for name, reading in readings.items()},
+        'confidence': {name: round(reading[1], 1) for name, reading in readings.items()},
+        'selected': selected,
+        'escalated': escalated,
+        'concurrent': concurrent
+    }
+
+
+def quick_text(image, tesseract_config):
+    """Single Tesseract pass on the grayscale image, without enhancement or denoising
+
+    Returns (text or None, report); the report has the same shape as extract_text's.
+    """
+    text, confidence, seconds = _timed_read('Quick', tesseract_read, image.convert('L'), tesseract_config)
+    return text or None, _report({'tesseract': (text, confidence, seconds)}, 'tesseract' if text else None)
+
+
+def extract_text(image, tesseract_config, reader=None, min_confidence=60.0, min_chars=20, run_both=False,
+                 preprocess='auto'):
+    """Extract text with Tesseract, escalating to EasyOCR only when Tesseract's result is weak
+
+    EasyOCR runs when Tesseract's mean word confidence is below min_confidence or it
+    reads fewer than min_chars characters. With run_both (Tesseract is already known
+    to struggle on this image), both engines run concurrently instead of in turn.
+    The longest text is kept, preferring readings that reach min_confidence.
+    Returns (text or None, report) where the report names the engines that ran, their
+    time and confidence, the one whose text was kept, and the preprocessing plan.
+    """
+    processed_image, plan = preprocess_image(image, preprocess)
+    readings = {}
+    escalated = concurrent = False
+
+    if reader and run_both:
+        # Tesseract runs as a subprocess, so its thread overlaps EasyOCR's work
+        tesseract_reading = []
+        thread = threading.Thread(target=lambda: tesseract_reading.append(
+            _timed_read('Tesseract', tesseract_read, processed_image, tesseract_config)
+        ))
+        thread.start()
+        easyocr_reading = _timed_read('EasyOCR', easyocr_read, reader, processed_image)
+        thread.join()
+        readings['tesseract'], readings['easyocr'] = tesseract_reading[0], easyocr_reading
+        escalated = concurrent = True
+    else:
+        readings['tesseract'] = _timed_read('Tesseract', tesseract_read, processed_image, tesseract_config)
+        text, confidence, _ = readings['tesseract']
+        if reader and (confidence < min_confidence or len(text) < min_chars):
+            readings['easyocr'] = _timed_read('EasyOCR', easyocr_read, reader, processed_image)
+            escalated = True
+
+    # Return best result: the longest text, among the confident readings when there are any
+    candidates = [(name, reading) for name, reading in readings.items() if reading[0]]
+    if not candidates:
+        return None, _report(readings, None, escalated, concurrent, plan)
+    confident = [candidate for candidate in candidates if candidate[1][1] >= min_confidence]
+    selected, (text, _, _) = max(confident or candidates, key=lambda candidate: len(candidate[1][0]))
+    logger.info(f"Best OCR result from {selected}: {len(text)} characters")
+    return text, _report(readings, selected, escalated, concurrent, plan)
@@ -0,0 +1,303 @@
+"""
+OCR worker pool
+OCR is CPU-heavy and EasyOCR holds a large model, so running it in every web
+worker multiplies memory and lets a burst of image uploads starve text
+requests. This pool keeps a fixed number of long-lived OCR processes, each with
+its own EasyOCR reader loaded once, and bounds the work waiting for them: a
+submission beyond workers + queue_size is rejected immediately (OcrQueueFull)
+instead of piling up, and a caller waits at most `timeout` seconds
+(OcrTimeout). Both map to 503 so clients back off and retry.
+
+One pool serves the whole host. start_service() runs it in a server process
+of its own (gunicorn's master does this once, with preload_app, before it forks
+the web workers), so OCR_POOL_WORKERS readers are loaded in total and the
+workers + queue_size bound is decided for every web worker together. Web
+workers reach it through an OcrPoolClient at the service's local socket; an
+unreachable service is reported as OcrUnavailable. OCR processes start from
+the forkserver (spawn where unavailable) and import ocr_engine, plus the main
+script as __mp_main__, so that script must guard its entry point.
+"""
+import os
+import time
+import logging
+import threading
+import multiprocessing
+import multiprocessing.connection
+from multiprocessing.managers import BaseManager
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+class OcrUnavailable(Exception):
+    """OCR could not be run for this request; the client should retry later"""
+
+
+class OcrQueueFull(OcrUnavailable):
+    """Every OCR worker is busy and the queue is full"""
+
+
+class OcrTimeout(OcrUnavailable):
+    """OCR did not finish within the deadline"""
+
+
+# Per-process state of the OCR worker processes
+_reader = None
+
+
+def _exit_with_parent():
+    multiprocessing.connection.wait([multiprocessing.parent_process().sentinel])
+    os._exit(0)
+
+
+def _init_worker(tesseract_cmd, use_easyocr, languages):
+    global _reader
+    import pytesseract
+    import ocr_engine
+
+    # The OcrService process ends with os._exit (or a signal), skipping the executor's
+    # shutdown, so each worker watches it and exits with it
+    threading.Thread(target=_exit_with_parent, daemon=True).start()
+
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    if use_easyocr:
+        _reader = ocr_engine.create_easyocr_reader(languages)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _run_extract(image, tesseract_config, min_confidence, min_chars, run_both, preprocess):
+    import ocr_engine
+    return ocr_engine.extract_text(image, tesseract_config, _reader, min_confidence, min_chars, run_both, preprocess)
+
+
+def _run_quick(image, tesseract_config):
+    import ocr_engine
+    return ocr_engine.quick_text(image, tesseract_config)
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    if 'forkserver' in methods:
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['ocr_engine'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+class OcrPool:
+    """Bounded pool of OCR worker processes with deadlines and backpressure"""
+
+    def __init__(self, workers=2, queue_size=8, timeout=45.0, tesseract_config='', tesseract_cmd=None,
+                 use_easyocr=True, languages=('en',), min_confidence=60.0, min_chars=20, preprocess='auto'):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        self.tesseract_config = tesseract_config
+        self.tesseract_cmd = tesseract_cmd
+        self.use_easyocr = use_easyocr
+        self.languages = tuple(languages)
+        self.min_confidence = min_confidence
+        self.min_chars = min_chars
+        self.preprocess = preprocess
+
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers + self.queue_size)
+        self._in_flight = 0
+
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.restarts = 0
+        self.seconds = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=_mp_context(),
+                    initializer=_init_worker,
+                    initargs=(self.tesseract_cmd, self.use_easyocr, self.languages),
+                )
+                self._pid = os.getpid()
+                logger.info(f"OCR pool started: {self.workers} workers, queue {self.queue_size}")
+            return self._executor
+
+    def start(self):
+        """Start the worker processes now, so the first requests don't pay for their startup"""
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(_ping)
+
+    def _restart(self, broken):
+        """Replace an executor whose worker process died"""
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        logger.error("OCR worker process died; pool restarted")
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _run(self, function, args, timeout=None):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise OcrQueueFull("OCR queue is full")
+
+        start = time.perf_counter()
+        executor = self._get_executor()
+        try:
+            future = executor.submit(function, *args)
+        except BrokenProcessPool as e:
+            self._slots.release()
+            self._restart(executor)
+            raise OcrUnavailable("OCR worker process died") from e
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_flight += 1
+        future.add_done_callback(self._release)
+
+        try:
+            result = future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeout:
+            # A job already running keeps its worker busy until it finishes; its slot is
+            # released then, so the bound on outstanding work still holds
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise OcrTimeout("OCR did not finish in time")
+        except BrokenProcessPool as e:
+            with self._lock:
+                self.failures += 1
+            self._restart(executor)
+            raise OcrUnavailable("OCR worker process died") from e
+
+        with self._lock:
+            self.completed += 1
+            self.seconds += time.perf_counter() - start
+        return result
+
+    def extract_text(self, image, timeout=None, run_both=False):
+        """Full OCR (preprocessing, Tesseract, EasyOCR when needed) in a worker process; see ocr_engine"""
+        args = (image, self.tesseract_config, self.min_confidence, self.min_chars, run_both, self.preprocess)
+        return self._run(_run_extract, args, timeout)
+
+    def quick_text(self, image, timeout=None):
+        """Single Tesseract pass in a worker process"""
+        return self._run(_run_quick, (image, self.tesseract_config), timeout)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'started': self._executor is not None and self._pid == os.getpid(),
+                'in_flight': self._in_flight,
+                'running': min(self._in_flight, self.workers),
+                'queued': max(0, self._in_flight - self.workers),
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'failures': self.failures,
+                'restarts': self.restarts,
+                'avg_seconds': (self.seconds / self.completed) if self.completed else 0.0,
+            }
+
+
+class OcrService(BaseManager):
+    """Server process holding the host's one OcrPool, reached over a local socket"""
+
+
+# The pool inside the OcrService process
+_shared_pool = None
+
+
+def _start_shared_pool(options):
+    global _shared_pool
+    _shared_pool = OcrPool(**options)
+    _shared_pool.start()
+
+
+def _get_shared_pool():
+    return _shared_pool
+
+
+OcrService.register('pool', callable=_get_shared_pool, exposed=('extract_text', 'quick_text', 'stats'))
+
+
+def start_service(**options):
+    """Start an OcrPool(**options) in a server process; returns the OcrService (address, shutdown())
+
+    Processes forked from the caller share its authkey, so they can connect to
+    service.address with an OcrPoolClient.
+    """
+    service = OcrService(ctx=_mp_context())
+    service.start(_start_shared_pool, (options,))
+    logger.info(f"OCR service started at {service.address}")
+    return service
+
+
+class OcrPoolClient:
+    """The shared pool as seen from a web worker: OcrPool's calls, run by the OcrService at `address`"""
+
+    def __init__(self, address, use_easyocr=True):
+        self.address = address
+        self.use_easyocr = use_easyocr
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                if self.address is None:
+                    raise OcrUnavailable("OCR service is not running")
+                service = OcrService(address=self.address)
+                service.connect()
+                self._pool = service.pool()
+                self._pid = os.getpid()
+            return self._pool
+
+    def _call(self, method, *args):
+        try:
+            return getattr(self._get_pool(), method)(*args)
+        except (OSError, EOFError) as e:
+            with self._lock:
+                self._pool = None
+            raise OcrUnavailable("OCR service is unreachable") from e
+
+    def extract_text(self, image, timeout=None, run_both=False):
+        return self._call('extract_text', image, timeout, run_both)
+
+    def quick_text(self, image, timeout=None):
+        return self._call('quick_text', image, timeout)
+
+    def stats(self):
+        """The shared pool's counters, for every web worker together"""
+        try:
+            return dict(self._call('stats'), reachable=True)
+        except OcrUnavailable:
+            return {'reachable': False}
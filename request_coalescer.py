@@ -0,0 +1,140 @@
+"""
+Request micro-batching coalescer
+Gathers single-text scoring calls that arrive within a short window and runs them
+through one vectorized model call. Only useful with threaded gunicorn workers
+(GUNICORN_THREADS > 1); with plain sync workers every batch has size 1.
+"""
+import os
+import queue
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Batch size histogram buckets (upper bounds, inclusive)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class RequestCoalescer:
+    """Coalesce concurrent single-text predictions into batched model calls"""
+
+    def __init__(self, predict_batch, window_ms=3.0, max_batch_size=32, result_timeout=5.0):
+        self.predict_batch = predict_batch
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.result_timeout = result_timeout
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+
+        # Metrics
+        self._submitted = 0
+        self._batches = 0
+        self._items = 0
+        self._failures = 0
+        self._max_queue_depth = 0
+        self._max_batch_seen = 0
+        self._histogram = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._wait_samples = deque(maxlen=1000)
+
+    def _ensure_worker(self):
+        """Start the batching thread lazily, once per process (gunicorn forks after preload)"""
+        pid = os.getpid()
+        if self._thread is not None and self._thread_pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == pid and self._thread.is_alive():
+                return
+            if self._thread_pid != pid:
+                # Queue and lock inherited from the parent are not safe to reuse
+                self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, name='spam-coalescer', daemon=True)
+            self._thread_pid = pid
+            self._thread.start()
+
+    def submit(self, text):
+        """Score one text, returning (label, probabilities) once its batch has run"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+
+        depth = self._queue.qsize()
+        with self._lock:
+            self._submitted += 1
+            if depth > self._max_queue_depth:
+                self._max_queue_depth = depth
+
+        return future.result(timeout=self.result_timeout)
+
+    def _collect_batch(self):
+        """Block for the first item, then gather more until the window closes or the batch is full"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+            texts = [item[0] for item in batch]
+
+            try:
+                labels, probabilities = self.predict_batch(texts)
+            except Exception as e:
+                logger.error(f"Coalesced prediction failed for batch of {len(batch)}: {e}")
+                with self._lock:
+                    self._failures += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for position, (_, future, _) in enumerate(batch):
+                future.set_result((labels[position], probabilities[position]))
+
+            self._record_batch(batch, started)
+
+    def _record_batch(self, batch, started):
+        size = len(batch)
+        bucket = next((i for i, bound in enumerate(BATCH_SIZE_BUCKETS) if size <= bound), len(BATCH_SIZE_BUCKETS))
+        with self._lock:
+            self._batches += 1
+            self._items += size
+            self._histogram[bucket] += 1
+            self._max_batch_seen = max(self._max_batch_seen, size)
+            for _, _, enqueued in batch:
+                self._wait_samples.append(started - enqueued)
+
+    def stats(self):
+        """Queue-depth and batch-size metrics for tuning the window"""
+        with self._lock:
+            waits = sorted(self._wait_samples)
+            labels = [f"<={bound}" for bound in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+            return {
+                'window_ms': self.window * 1000.0,
+                'max_batch_size': self.max_batch_size,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'submitted': self._submitted,
+                'batches': self._batches,
+                'failed_batches': self._failures,
+                'avg_batch_size': (self._items / self._batches) if self._batches else 0.0,
+                'max_batch_seen': self._max_batch_seen,
+                'batch_size_histogram': dict(zip(labels, self._histogram)),
+                'queue_wait_ms': {
+                    'p50': waits[len(waits) // 2] * 1000.0 if waits else 0.0,
+                    'p99': waits[min(len(waits) - 1, int(len(waits) * 0.99))] * 1000.0 if waits else 0.0,
+                },
+            }
@@ -0,0 +1,150 @@
+"""
+Vectorized hand-crafted spam features
+A batch of texts is encoded once into a single UTF-8 buffer (messages separated
+by NUL bytes) and every byte-level signal is computed with NumPy over the whole
+buffer; per-message totals are segment sums (np.add.reduceat) at the message
+offsets. Only the phrase score runs per message, and that is one
+regex scan each (see keyword_rules).
+
+The output is a dense, non-negative float matrix, so it can be stacked with the
+TF-IDF matrix for MultinomialNB, e.g. make_union(vectorizer, HandcraftedFeatures()).
+Without explicit keyword_rules the phrase score uses the same list as the apps:
+SPAM_PHRASES_PATH, else keyword_rules' spam_phrases.txt. On the synthetic
+corpus of tests/benchmark_features.py the stacked features lower accuracy, so
+they are not part of the trained models.
+"""
+import os
+
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from keyword_rules import KeywordRules, DEFAULT_PHRASES_PATH
+
+FEATURE_NAMES = (
+    'length_log',           # log1p of the length in characters
+    'caps_ratio',           # ASCII uppercase letters / characters
+    'digit_ratio',          # ASCII digits / characters
+    'exclamation_count',
+    'dollar_amount_count',  # '$' followed by a digit
+    'url_count',            # http://, https:// and bare www.
+    'html_tag_count',       # '<' followed by a letter, '/' or '!'
+    'html_ratio',           # bytes between '<' and '>' / bytes
+    'confusable_ratio',     # Greek, Cyrillic, fullwidth and math-alphanumeric characters / characters
+    'keyword_score',        # summed weights of the spam phrases found
+)
+
+_SEPARATOR = b'\x00'
+
+SPAM_PHRASES_PATH = os.environ.get('SPAM_PHRASES_PATH', DEFAULT_PHRASES_PATH)
+
+_rules = None
+
+
+def _default_rules():
+    global _rules
+    if _rules is None:
+        _rules = KeywordRules(SPAM_PHRASES_PATH)
+    return _rules
+
+
+def _segment_sums(mask, starts):
+    """Per-message count of True values in a mask over the whole buffer"""
+    return np.add.reduceat(mask.view(np.uint8), starts, dtype=np.int32)
+
+
+def _starts_with(data, pattern):
+    """Mask of buffer positions where the byte pattern begins"""
+    mask = np.zeros(data.shape[0], dtype=bool)
+    n = data.shape[0] - len(pattern) + 1
+    if n <= 0:
+        return mask
+    match = data[:n] == pattern[0]
+    for offset, byte in enumerate(pattern[1:], 1):
+        match &= data[offset:offset + n] == byte
+    mask[:n] = match
+    return mask
+
+
+def _followed_by(data, first, following):
+    """Mask of positions holding first whose next byte satisfies following (a mask)"""
+    mask = np.zeros(data.shape[0], dtype=bool)
+    mask[:-1] = (data[:-1] == first) & following[1:]
+    return mask
+
+
+def extract_features(texts, keyword_rules=None):
+    """Dense (len(texts), len(FEATURE_NAMES)) feature matrix for a batch of texts"""
+    features = np.zeros((len(texts), len(FEATURE_NAMES)), dtype=np.float64)
+    if not texts:
+        return features
+
+    # Every message, including the last, is followed by a separator, so each start is in range
+    encoded = [text.encode('utf-8', 'surrogatepass') for text in texts]
+    data = np.frombuffer(_SEPARATOR.join(encoded) + _SEPARATOR, dtype=np.uint8)
+    n_bytes = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    starts = np.zeros(len(encoded), dtype=np.int64)
+    np.cumsum(n_bytes[:-1] + 1, out=starts[1:])
+    separators = starts + n_bytes
+
+    def count(mask):
+        # Each segment also covers the message's separator, which no mask below is True at
+        return _segment_sums(mask, starts)
+
+    # Characters are the bytes that do not continue a multi-byte sequence (minus the separator)
+    n_chars = count((data & 0xC0) != 0x80) - 1
+    per_char = 1.0 / np.maximum(n_chars, 1)
+
+    is_upper = (data >= 65) & (data <= 90)
+    is_lower = (data >= 97) & (data <= 122)
+    is_digit = (data >= 48) & (data <= 57)
+    is_tag_start = is_upper | is_lower | (data == 47) | (data == 33)
+
+    url_count = count(_starts_with(data, b'http://')) + count(_starts_with(data, b'https://'))
+    www = _starts_with(data, b'www.')
+    www[1:] &= data[:-1] != 47  # 'http://www.' is already counted
+    url_count += count(www)
+
+    # Tag depth: +1 from a '<' on, -1 after a '>'; the depth entering each message is subtracted
+    step = (data == 60).astype(np.int8)
+    step[1:] -= data[:-1] == 62
+    depth = np.cumsum(step, dtype=np.int32)
+    depth -= np.repeat(depth[starts] - step[starts], n_bytes + 1)
+    in_tag = depth > 0
+    in_tag[separators] = False
+
+    # Lead bytes of U+0380-04FF (Greek, Cyrillic), U+FF00-FF7F (fullwidth) and U+1D400-1D7FF (math letters)
+    confusable = (data >= 0xCE) & (data <= 0xD3)
+    confusable |= _followed_by(data, 0xEF, (data == 0xBC) | (data == 0xBD))
+    math_lead = _starts_with(data, b'\xf0\x9d')
+    math_lead[:-2] &= (data[2:] >= 0x90) & (data[2:] <= 0x9F)
+    confusable |= math_lead
+
+    rules = keyword_rules or _default_rules()
+
+    features[:, 0] = np.log1p(n_chars)
+    features[:, 1] = count(is_upper) * per_char
+    features[:, 2] = count(is_digit) * per_char
+    features[:, 3] = count(data == 33)
+    features[:, 4] = count(_followed_by(data, 36, is_digit))
+    features[:, 5] = url_count
+    features[:, 6] = count(_followed_by(data, 60, is_tag_start))
+    features[:, 7] = count(in_tag) / np.maximum(n_bytes, 1)
+    features[:, 8] = count(confusable) * per_char
+    features[:, 9] = [rules.score(text) for text in texts]
+    return features
+
+
+class HandcraftedFeatures(TransformerMixin, BaseEstimator):
+    """Stateless sklearn transformer wrapping extract_features()"""
+
+    def __init__(self, keyword_rules=None):
+        self.keyword_rules = keyword_rules
+
+    def fit(self, texts, y=None):
+        return self
+
+    def transform(self, texts):
+        return extract_features(list(texts), self.keyword_rules)
+
+    def get_feature_names_out(self, input_features=None):
+        return np.array(FEATURE_NAMES, dtype=object)
@@ -0,0 +1,475 @@
+"""
+Compiled spam scorer
+Flattens a fitted TfidfVectorizer + MultinomialNB pipeline into plain NumPy arrays
+so a request does one tokenize -> lookup -> sparse dot pass instead of going
+through sklearn's validation and two separate inference calls.
+
+The scorer can also be written as a memory-mapped artifact (see MappedSpamScorer)
+whose vocabulary is a sorted table of 64-bit term hashes instead of a Python
+dict, so every gunicorn worker shares one physical copy of the model.
+"""
+import sys
+import shutil
+import hashlib
+import logging
+from functools import lru_cache
+
+import numpy as np
+
+from mapped_arrays import write_mapped_arrays, open_mapped_arrays
+from text_analyzer import SpamTextAnalyzer
+
+logger = logging.getLogger(__name__)
+
+# Decoded n-grams a mapped scorer keeps for explanations; the cache is emptied when full
+TERM_CACHE_SIZE = 1 << 14
+
+_HASH_MASK = (1 << 64) - 1
+_HASH_PRIME = 0x100000001B3
+
+
+@lru_cache(maxsize=1 << 16)
+def token_hash(token):
+    """Stable 64-bit hash of one token (identical in every process)"""
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def term_hash(term):
+    """Hash of a space-joined n-gram, folded from its token hashes"""
+    tokens = term.split(' ')
+    value = token_hash(tokens[0])
+    for token in tokens[1:]:
+        value = ((value * _HASH_PRIME) & _HASH_MASK) ^ token_hash(token)
+    return value
+
+
+def ngrams_at(tokens, positions, ngram_range):
+    """The n-grams at positions of the analyzer's output order (all unigrams, then bigrams, ...)"""
+    min_n, max_n = ngram_range
+    windows = []
+    start = 0
+    for n in range(min_n, min(max_n, len(tokens)) + 1):
+        windows.append((start, n))
+        start += len(tokens) - n + 1
+
+    windows.reverse()
+
+    terms = []
+    for position in positions:
+        for window_start, n in windows:
+            if position >= window_start:
+                offset = position - window_start
+                terms.append(' '.join(tokens[offset:offset + n]))
+                break
+    return terms
+
+
+def ngram_hashes(token_hashes, ngram_range):
+    """Hashes of every n-gram window, folded from unigram hashes exactly like term_hash()"""
+    min_n, max_n = ngram_range
+    total = token_hashes.shape[0]
+    windows = []
+    prime = np.uint64(_HASH_PRIME)
+    for n in range(min_n, min(max_n, total) + 1):
+        count = total - n + 1
+        folded = token_hashes[:count].copy()
+        for offset in range(1, n):
+            folded = (folded * prime) ^ token_hashes[offset:offset + count]
+        windows.append(folded)
+    if not windows:
+        return np.empty(0, dtype=np.uint64)
+    return np.concatenate(windows)
+
+
+class CompiledSpamScorer:
+    """TF-IDF + Multinomial Naive Bayes scorer held in contiguous arrays"""
+
+    def __init__(self, vocabulary, idf, feature_log_prob, class_log_prior, classes,
+                 stop_words=None, ngram_range=(1, 1), lowercase=True,
+                 token_pattern=r"(?u)\b\w\w+\b", sublinear_tf=False, binary=False, norm='l2', fold_unicode=True):
+        self.vocabulary = vocabulary
+        self.idf = np.ascontiguousarray(idf, dtype=np.float64)
+        # Stored as (n_features, n_classes) so a lookup gathers whole rows
+        self.feature_log_prob = np.ascontiguousarray(np.asarray(feature_log_prob, dtype=np.float64).T)
+        self.class_log_prior = np.ascontiguousarray(class_log_prior, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self.stop_words = frozenset(stop_words) if stop_words else None
+        self.ngram_range = tuple(ngram_range)
+        self.lowercase = lowercase
+        self.token_pattern = token_pattern
+        self.sublinear_tf = sublinear_tf
+        self.binary = binary
+        self.norm = norm
+        self.fold_unicode = fold_unicode
+        self.analyzer = SpamTextAnalyzer(self.stop_words, self.ngram_range, lowercase, token_pattern, fold_unicode)
+        self._log_odds = None
+        self._terms = None
+
+    @property
+    def n_features(self):
+        return self.idf.shape[0]
+
+    @property
+    def log_odds(self):
+        """Per-feature log P(t|spam) - log P(t|ham), computed once"""
+        if self._log_odds is None:
+            classes = self.classes.tolist()
+            spam = classes.index(1) if 1 in classes else len(classes) - 1
+            ham = classes.index(0) if 0 in classes else 0
+            self._log_odds = np.ascontiguousarray(self.feature_log_prob[:, spam] - self.feature_log_prob[:, ham])
+        return self._log_odds
+
+    def tokenize(self, text):
+        """Lowercase, split on the token pattern and drop stop words"""
+        return self.analyzer.tokens(text)
+
+    def analyze(self, text):
+        """Tokenize and emit n-grams exactly like the training vectorizer"""
+        return self.analyzer(text)
+
+    def ngrams(self, tokens):
+        return self.analyzer.ngrams(tokens)
+
+    def transform_one(self, text):
+        """Return (feature indices, tf-idf weights) for a single text"""
+        return self._count_terms(self.analyze(text))
+
+    def transform_tokens(self, tokens):
+        """transform_one() for an already tokenized text"""
+        return self._count_terms(self.ngrams(tokens))
+
+    def _count_terms(self, terms):
+        counts = {}
+        vocabulary = self.vocabulary
+        for term in terms:
+            index = vocabulary.get(term)
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+
+        if not counts:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+
+        indices = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        return indices, self._weigh(indices, weights)
+
+    def _weigh(self, indices, weights):
+        """Apply tf scaling, idf and normalisation to raw term counts"""
+        if self.binary:
+            weights[:] = 1.0
+        elif self.sublinear_tf:
+            weights = np.log(weights) + 1.0
+        weights *= self.idf[indices]
+
+        if self.norm == 'l2':
+            length = np.sqrt(np.dot(weights, weights))
+        elif self.norm == 'l1':
+            length = np.abs(weights).sum()
+        else:
+            length = 0.0
+        if length > 0:
+            weights /= length
+        return weights
+
+    def position_features(self, tokens):
+        """Feature index of every n-gram position (-1 when out of vocabulary)"""
+        vocabulary = self.vocabulary
+        terms = self.ngrams(tokens)
+        return np.fromiter((vocabulary.get(term, -1) for term in terms), dtype=np.intp, count=len(terms))
+
+    def explained_vector(self, tokens):
+        """transform_tokens() plus what feature_names() needs to name the features"""
+        indices, weights = self.transform_tokens(tokens)
+        return indices, weights, tokens
+
+    def feature_names(self, indices, source):
+        """The n-gram of each feature index, from the vocabulary inverted once"""
+        if self._terms is None:
+            self._terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        return [self._terms[index] for index in indices.tolist()]
+
+    def joint_log_likelihood(self, indices, weights):
+        """Unnormalized class log-likelihoods for one sparse tf-idf vector"""
+        if indices.size == 0:
+            return self.class_log_prior.copy()
+        return self.class_log_prior + weights @ self.feature_log_prob[indices]
+
+    def predict_with_proba(self, texts):
+        """Return (labels, probabilities) for a list of texts in one pass"""
+        jll = np.empty((len(texts), self.class_log_prior.shape[0]), dtype=np.float64)
+        for row, text in enumerate(texts):
+            jll[row] = self.joint_log_likelihood(*self.transform_one(text))
+
+        # Log-sum-exp normalisation, same as MultinomialNB.predict_proba
+        shifted = jll - jll.max(axis=1, keepdims=True)
+        probabilities = np.exp(shifted)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        return self.classes[np.argmax(jll, axis=1)], probabilities
+
+    def predict_with_explanation(self, text, top_k=10):
+        """Return (label, probabilities, top-k contributing n-grams) from one sparse vector
+
+        Naive Bayes is linear in log space, so each n-gram adds
+        weight * log_odds to the spam-vs-ham score.
+        """
+        # The sparse vector plain scoring builds; only the top-k features are named afterwards
+        indices, weights, source = self.explained_vector(self.tokenize(text))
+
+        jll = self.joint_log_likelihood(indices, weights)
+        probabilities = np.exp(jll - jll.max())
+        probabilities /= probabilities.sum()
+        label = self.classes[np.argmax(jll)]
+
+        if indices.size == 0 or top_k <= 0:
+            return label, probabilities, []
+
+        contributions = weights * self.log_odds[indices]
+        magnitude = np.abs(contributions)
+        if indices.size > top_k:
+            # Select the k largest without sorting the rest, then order only those
+            top = np.argpartition(magnitude, indices.size - top_k)[indices.size - top_k:]
+            top = top[np.argsort(magnitude[top])[::-1]]
+        else:
+            top = np.argsort(magnitude)[::-1]
+        names = self.feature_names(indices[top], source)
+        return label, probabilities, [
+            {'term': name, 'weight': weight, 'contribution': contribution}
+            for name, weight, contribution in zip(names, weights[top].tolist(), contributions[top].tolist())
+        ]
+
+    def save(self, path):
+        """Write the scorer arrays to an uncompressed .npz file"""
+        terms = np.array(sorted(self.vocabulary, key=self.vocabulary.get))
+        np.savez(
+            path,
+            terms=terms,
+            idf=self.idf,
+            feature_log_prob=self.feature_log_prob.T,
+            class_log_prior=self.class_log_prior,
+            classes=self.classes,
+            stop_words=np.array(sorted(self.stop_words or ())),
+            ngram_range=np.array(self.ngram_range),
+            token_pattern=np.array(self.token_pattern),
+            flags=np.array([self.lowercase, self.sublinear_tf, self.binary, self.fold_unicode]),
+            norm=np.array(self.norm or ''),
+        )
+
+    def save_mapped(self, path):
+        """Write the scorer as a memory-mappable artifact with a hashed vocabulary"""
+        n_features = self.n_features
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        hashes = np.fromiter((term_hash(term) for term in terms), dtype=np.uint64, count=n_features)
+
+        order = np.argsort(hashes, kind='stable')
+        sorted_hashes = hashes[order]
+        if n_features > 1 and np.any(sorted_hashes[1:] == sorted_hashes[:-1]):
+            raise ValueError("Vocabulary hash collision, cannot build mapped artifact")
+
+        encoded = [term.encode('utf-8') for term in terms]
+        term_offsets = np.zeros(n_features + 1, dtype=np.int64)
+        np.cumsum([len(term) for term in encoded], out=term_offsets[1:])
+
+        write_mapped_arrays(path, {
+            'term_hashes': sorted_hashes,
+            'term_features': order.astype(np.int32),
+            'term_offsets': term_offsets,
+            'term_bytes': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            'idf': self.idf,
+            'feature_log_prob': self.feature_log_prob,
+            'class_log_prior': self.class_log_prior,
+            'log_odds': self.log_odds,
+        }, metadata={
+            'format': 'spam-scorer',
+            'classes': self.classes.tolist(),
+            'stop_words': sorted(self.stop_words or ()),
+            'ngram_range': list(self.ngram_range),
+            'lowercase': self.lowercase,
+            'token_pattern': self.token_pattern,
+            'sublinear_tf': self.sublinear_tf,
+            'binary': self.binary,
+            'norm': self.norm,
+            'fold_unicode': self.fold_unicode,
+        })
+
+    @classmethod
+    def load(cls, path):
+        """Load a scorer previously written with save()"""
+        with np.load(path, allow_pickle=False) as data:
+            terms = data['terms'].tolist()
+            # Scorers saved before folding existed have three flags and were trained without it
+            lowercase, sublinear_tf, binary, fold_unicode = (bool(flag) for flag in [*data['flags'], False][:4])
+            return cls(
+                vocabulary={term: index for index, term in enumerate(terms)},
+                idf=data['idf'],
+                feature_log_prob=data['feature_log_prob'],
+                class_log_prior=data['class_log_prior'],
+                classes=data['classes'],
+                stop_words=data['stop_words'].tolist() or None,
+                ngram_range=tuple(int(n) for n in data['ngram_range']),
+                lowercase=lowercase,
+                token_pattern=str(data['token_pattern']),
+                sublinear_tf=sublinear_tf,
+                binary=binary,
+                norm=str(data['norm']) or None,
+                fold_unicode=fold_unicode,
+            )
+
+
+class MappedSpamScorer(CompiledSpamScorer):
+    """CompiledSpamScorer backed by read-only memory-mapped arrays, with no vocabulary dict"""
+
+    def __init__(self, path):
+        metadata, arrays = open_mapped_arrays(path)
+        if metadata.get('format') != 'spam-scorer':
+            raise ValueError(f"{path} is not a spam scorer artifact")
+
+        self.path = path
+        self.term_hashes = arrays['term_hashes']
+        self.term_features = arrays['term_features']
+        self.term_offsets = arrays['term_offsets']
+        self.term_bytes = arrays['term_bytes']
+        self.vocabulary = None
+        self.idf = arrays['idf']
+        self.feature_log_prob = arrays['feature_log_prob']
+        self.class_log_prior = arrays['class_log_prior']
+        self.classes = np.asarray(metadata['classes'])
+        self.stop_words = frozenset(metadata['stop_words']) or None
+        self.ngram_range = tuple(metadata['ngram_range'])
+        self.lowercase = metadata['lowercase']
+        self.token_pattern = metadata['token_pattern']
+        self.sublinear_tf = metadata['sublinear_tf']
+        self.binary = metadata['binary']
+        self.norm = metadata['norm']
+        self.fold_unicode = metadata.get('fold_unicode', False)
+        self.analyzer = SpamTextAnalyzer(self.stop_words, self.ngram_range, self.lowercase, self.token_pattern,
+                                         self.fold_unicode)
+        self._term_cache = {}
+        # Older artifacts have no log-odds array; it is then computed on first use
+        self._log_odds = arrays.get('log_odds')
+
+    @classmethod
+    def open(cls, path):
+        return cls(path)
+
+    def term(self, index):
+        """Decode the n-gram string of one feature index"""
+        start, end = self.term_offsets[index], self.term_offsets[index + 1]
+        return bytes(self.term_bytes[start:end]).decode('utf-8')
+
+    def position_features(self, tokens):
+        if not tokens:
+            return np.empty(0, dtype=np.intp)
+        hashes = ngram_hashes(
+            np.fromiter((token_hash(token) for token in tokens), dtype=np.uint64, count=len(tokens)),
+            self.ngram_range
+        )
+        positions = np.searchsorted(self.term_hashes, hashes)
+        positions[positions == self.term_hashes.shape[0]] = 0
+        found = self.term_hashes[positions] == hashes
+        features = np.full(hashes.shape[0], -1, dtype=np.intp)
+        features[found] = self.term_features[positions[found]]
+        return features
+
+    def feature_names(self, indices, source):
+        """Decode the n-grams of the features, reusing those explained before (the strongest features recur)"""
+        cache = self._term_cache
+        names = []
+        for index in indices.tolist():
+            name = cache.get(index)
+            if name is None:
+                if len(cache) >= TERM_CACHE_SIZE:
+                    cache.clear()
+                name = cache[index] = self.term(index)
+            names.append(name)
+        return names
+
+    def transform_one(self, text):
+        """Return (feature indices, tf-idf weights) via a binary search of the hashed vocabulary"""
+        return self.transform_tokens(self.tokenize(text))
+
+    def transform_tokens(self, tokens):
+        if not tokens:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+
+        hashes = ngram_hashes(
+            np.fromiter((token_hash(token) for token in tokens), dtype=np.uint64, count=len(tokens)),
+            self.ngram_range
+        )
+        positions = np.searchsorted(self.term_hashes, hashes)
+        positions[positions == self.term_hashes.shape[0]] = 0
+        found = self.term_hashes[positions] == hashes
+        if not found.any():
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+
+        indices, counts = np.unique(self.term_features[positions[found]], return_counts=True)
+        indices = indices.astype(np.intp)
+        return indices, self._weigh(indices, counts.astype(np.float64))
+
+    def save_mapped(self, path):
+        """Copy the mapped artifact (there is no vocabulary dict to rebuild it from)"""
+        shutil.copyfile(self.path, path)
+
+    # Saving a mapped scorer keeps its format; reopen the copy with MappedSpamScorer.open
+    save = save_mapped
+
+
+def compile_pipeline(pipeline):
+    """Compile a fitted make_pipeline(TfidfVectorizer, MultinomialNB) into a CompiledSpamScorer"""
+    vectorizer, classifier = pipeline.steps[0][1], pipeline.steps[-1][1]
+
+    if isinstance(vectorizer.analyzer, SpamTextAnalyzer):
+        analyzer = vectorizer.analyzer
+    elif vectorizer.analyzer != 'word' or vectorizer.tokenizer is not None or vectorizer.preprocessor is not None:
+        raise ValueError("Only SpamTextAnalyzer or the default word analyzer can be compiled")
+    elif vectorizer.strip_accents is not None:
+        raise ValueError("strip_accents is not supported by the compiled scorer")
+    else:
+        analyzer = SpamTextAnalyzer(vectorizer.get_stop_words(), vectorizer.ngram_range,
+                                    vectorizer.lowercase, vectorizer.token_pattern, fold_unicode=False)
+
+    n_features = len(vectorizer.vocabulary_)
+    idf = vectorizer.idf_ if vectorizer.use_idf else np.ones(n_features)
+
+    return CompiledSpamScorer(
+        vocabulary=dict(vectorizer.vocabulary_),
+        idf=idf,
+        feature_log_prob=classifier.feature_log_prob_,
+        class_log_prior=classifier.class_log_prior_,
+        classes=classifier.classes_,
+        stop_words=analyzer.stop_words,
+        ngram_range=analyzer.ngram_range,
+        lowercase=analyzer.lowercase,
+        token_pattern=analyzer.token_pattern,
+        sublinear_tf=vectorizer.sublinear_tf,
+        binary=vectorizer.binary,
+        norm=vectorizer.norm,
+        fold_unicode=analyzer.fold_unicode,
+    )
+
+
+def export_scorer(model_path, scorer_path):
+    """Compile a joblib pipeline on disk and write the scorer arrays next to it"""
+    import joblib
+    scorer = compile_pipeline(joblib.load(model_path))
+    scorer.save(scorer_path)
+    logger.info(f"Compiled scorer with {scorer.n_features} features written to {scorer_path}")
+    return scorer
+
+
+def export_mapped_scorer(model_path, mapped_path):
+    """Compile a joblib pipeline on disk into a memory-mappable artifact"""
+    import joblib
+    scorer = compile_pipeline(joblib.load(model_path))
+    scorer.save_mapped(mapped_path)
+    logger.info(f"Mapped scorer with {scorer.n_features} features written to {mapped_path}")
+    return MappedSpamScorer.open(mapped_path)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    source = sys.argv[1] if len(sys.argv) > 1 else 'spam_model.joblib'
+    target = sys.argv[2] if len(sys.argv) > 2 else 'spam_model.scorer.npz'
+    if target.endswith('.mmap'):
+        export_mapped_scorer(source, target)
+    else:
+        export_scorer(source, target)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Parity check and benchmark for the fused text normalizer and analyzer
+Usage: python tests/benchmark_analyzer.py
+"""
+import io
+import re
+
+import joblib
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from bench_corpus import make_corpus, build_pipeline, time_per_call
+from spam_scorer import compile_pipeline
+from text_analyzer import SpamTextAnalyzer, normalize_text
+
+EDGE_CASES = [
+    "", "   ", "WIN!!! money??? now!!", "tabs\tand\nnewlines\r\n  here", "non\xa0breaking spaces",
+    "the and of", "Ünïcödé wörds ÀND CAPS", "a b c d e", "single", "x1 y22 z333 don't won't",
+]
+
+
+def three_pass_normalize(text):
+    """clean_text()'s normalization before normalize_text()"""
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[!]{2,}', '!', text)
+    text = re.sub(r'[?]{2,}', '?', text)
+    return text.strip()
+
+
+def main():
+    print("🔤 Fused normalizer/analyzer parity + benchmark")
+    print("=" * 50)
+
+    texts, labels = make_corpus(3000, seed=4)
+    texts = [text.replace(' ', '  \n', 2) + ' Act now!!! Really???' for text in texts] + EDGE_CASES
+
+    for text in texts:
+        assert normalize_text(text) == three_pass_normalize(text), f"normalize mismatch for {text!r}"
+    print(f"✅ normalize_text matches the three re.sub passes on {len(texts)} texts")
+
+    sklearn_analyzer = TfidfVectorizer(stop_words='english', ngram_range=(1, 3)).build_analyzer()
+    fused_analyzer = SpamTextAnalyzer(stop_words='english', ngram_range=(1, 3), fold_unicode=False)
+    for text in texts:
+        assert fused_analyzer(text) == sklearn_analyzer(text), f"analyzer mismatch for {text!r}"
+    print("✅ SpamTextAnalyzer emits the same n-grams as sklearn's word analyzer")
+
+    # The training pipeline pickles with its analyzer and compiles to the same terms
+    buffer = io.BytesIO()
+    joblib.dump(build_pipeline().fit(texts, labels + [0] * len(EDGE_CASES)), buffer)
+    buffer.seek(0)
+    scorer = compile_pipeline(joblib.load(buffer))
+    assert all(scorer.analyze(text) == fused_analyzer(text) for text in texts[:200])
+    print("✅ Pickled pipeline and compiled scorer share the analyzer")
+
+    sample = texts[:1000]
+    before = time_per_call(three_pass_normalize, sample)
+    after = time_per_call(normalize_text, sample)
+    print(f"normalize : three passes {before * 1e6:6.1f} µs, fused {after * 1e6:6.1f} µs ({before / after:4.1f}x)")
+    before = time_per_call(sklearn_analyzer, sample)
+    after = time_per_call(fused_analyzer, sample)
+    print(f"analyzer  : sklearn      {before * 1e6:6.1f} µs, fused {after * 1e6:6.1f} µs ({before / after:4.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Threshold sweep for the detector cascade: share decided by the rule tier, cost and accuracy
+Usage: python tests/benchmark_cascade.py
+"""
+from bench_corpus import make_corpus, build_pipeline, time_per_call
+from cascade import Cascade, CascadeRun, rule_score
+from html_text import strip_html
+from keyword_rules import KeywordRules
+from spam_scorer import compile_pipeline
+from text_analyzer import normalize_text
+
+
+def classify(cascade, scorer, text):
+    """Tiers 0 and 1 as classify_text() runs them in the app"""
+    run = CascadeRun()
+    with run.tier('rules'):
+        verdict = cascade.rule_verdict(text)
+    if verdict is not None:
+        run.decide('rules')
+        cascade.record(run)
+        return verdict[0]
+    with run.tier('model'):
+        labels, _ = scorer.predict_with_proba([normalize_text(strip_html(text))])
+    run.decide('model')
+    cascade.record(run)
+    return labels[0]
+
+
+def main():
+    print("🪜 Detector cascade threshold sweep")
+    print("=" * 50)
+
+    train_texts, train_labels = make_corpus(3000, seed=1, crossover=0.1)
+    test_texts, test_labels = make_corpus(3000, seed=2, crossover=0.1)
+    scorer = compile_pipeline(build_pipeline().fit(train_texts, train_labels))
+    rules = KeywordRules()
+
+    # The rule scan and the model on their own: tier 0 pays off only if it decides enough
+    # requests to cover its scan on every request
+    scan = time_per_call(lambda text: rule_score(text, rules), test_texts, repeat=5)
+    model = time_per_call(lambda text: scorer.predict_with_proba([normalize_text(strip_html(text))]), test_texts, repeat=5)
+    print(f"Rule scan {scan * 1e6:.1f} µs, model {model * 1e6:.1f} µs per text: "
+          f"tier 0 breaks even when it decides {scan / model:.0%} of requests")
+
+    thresholds = (float('inf'), 8, 6, 4, 3)
+    cascades = {threshold: Cascade(rules, rule_spam_score=threshold, text_rules=True,
+                                   enabled=threshold != float('inf'))
+                for threshold in thresholds}
+    # Rounds alternate between thresholds so a noisy host skews them alike
+    elapsed = {threshold: float('inf') for threshold in thresholds}
+    for _ in range(5):
+        for threshold, cascade in cascades.items():
+            elapsed[threshold] = min(elapsed[threshold], time_per_call(
+                lambda text: classify(cascade, scorer, text), test_texts, repeat=1))
+
+    print(f"{'rule spam score':>15} | {'rules decide':>12} | {'accuracy':>8} | {'µs/request':>10}")
+    for threshold in thresholds:
+        cascade = Cascade(rules, rule_spam_score=threshold, text_rules=True, enabled=threshold != float('inf'))
+        predictions = [classify(cascade, scorer, text) for text in test_texts]
+        accuracy = sum(int(p) == label for p, label in zip(predictions, test_labels)) / len(test_labels)
+        share = cascade.stats()['decided_by']['rules'] / len(test_texts)
+        label = 'off' if threshold == float('inf') else f"{threshold:g}"
+        print(f"{label:>15} | {share:11.1%} | {accuracy:8.3f} | {elapsed[threshold] * 1e6:10.1f}")
+
+    # The default: tier 0 is skipped for submitted text even with the cascade enabled
+    default = Cascade(rules)
+    assert all(default.rule_verdict(text) is None for text in test_texts[:100])
+    assert not default.rules_apply() and default.rules_apply(from_image=True)
+    print("✅ Default cascade: rules skipped for submitted text, kept for OCR text")
+
+if __name__ == '__main__':
+    main()
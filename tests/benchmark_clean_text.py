@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Golden-output parity check and benchmark for the tiered HTML stripper in clean_text()
+Usage: python tests/benchmark_clean_text.py
+"""
+import random
+import re
+
+from bs4 import BeautifulSoup
+
+from bench_corpus import make_html_corpus, time_per_call
+from html_text import strip_html, stats
+from text_analyzer import normalize_text
+
+# (input, clean_text() output), captured from the BeautifulSoup implementation
+GOLDEN = [
+    ('Plain text, no markup at all!!!', 'Plain text, no markup at all!'),
+    ('Terms & Conditions apply', 'Terms & Conditions apply'),
+    ('AT&T called', 'AT&T called'),
+    ('<p>Hello <b>World</b></p>', 'Hello World'),
+    ('<a href="https://x.test/?a=1&amp;b=2" title=\'a > b\'>Click &amp; win</a>', 'Click & win'),
+    ('Fish &amp; chips &mdash; &#36;5 &#x20AC;3 &nbsp;today', 'Fish & chips — $5 €3 today'),
+    ("<html><head><style>p { color: red; }</style><script>var x = '<b>';</script></head><body>Visible</body></html>", 'Visible'),
+    ('<!--[if mso]><table><tr><td><![endif]-->Outlook<!--[if mso]></td></tr></table><![endif]-->', 'Outlook'),
+    ('<!DOCTYPE html><title>Subject</title>Body<?xml version="1.0"?>', 'SubjectBody'),
+    ('if a < b and c > d then win', 'if a < b and c > d then win'),
+    ('<<URGENT>> act now??', '<> act now?'),
+    ('x<3 you', 'x<3 you'),
+    ('<div\nclass="a"\n>multi\nline</div>', 'multi line'),
+    ('<![CDATA[raw & <b>data</b>]]> tail', 'raw & <b>data</b> tail'),
+    ('<ruby>漢<rp>(</rp><rt>kan</rt><rp>)</rp></ruby>', '漢'),
+    ('<script>unclosed', ''),
+    ('<textarea><b>x</b></textarea>', 'x'),
+    ('&eacute without semicolon', 'é without semicolon'),
+    ('&#128; &#0; &#9;tab', '€ � tab'),
+    ('Q&A session', 'Q&A session'),
+    ('&unknown; entity', '&unknown entity'),
+    ('<o:p>Office</o:p> <v:shape>tag</v:shape>', 'Office tag'),
+    ('<img src=a.png alt="An &quot;image&quot;">caption', 'caption'),
+    ('<br/>line<br />break<br>', 'linebreak'),
+]
+
+FUZZ_PIECES = [
+    '<', '>', '</', '/>', '<p>', '</p>', '<a href="x>y">', "<a title='q'>", '<b', 'b>', '<!--', '-->',
+    '<!DOCTYPE html>', '<?x?>', '<script>', '</script>', '<style>', '</style >', '<script/>', '<SCRIPT type="t">',
+    '<![CDATA[x]]>', '<rt>', '<TEMPLATE>', '<br/>', '<img src=a.png>', '<div\nclass="a">', '<a b=\'>\'>', '<a"b>',
+    '&amp;', '&', '&nbsp;', '&#65;', '&#x41;', '&foo;', '&amp', '&#128;', '&copy;', '&lt;', '&#10;', 'AT&T',
+    ' ', '\n', 'text', '"', "'", '=', '<1', '< b',
+]
+
+
+def normalize(text):
+    """The rest of clean_text() after HTML stripping, as it was before normalize_text()"""
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[!]{2,}', '!', text)
+    text = re.sub(r'[?]{2,}', '?', text)
+    return text.strip()
+
+
+def reference_clean_text(text):
+    return normalize(BeautifulSoup(text, 'html.parser').get_text())
+
+
+def tiered_clean_text(text):
+    return normalize_text(strip_html(text))
+
+
+def check_parity(texts):
+    mismatches = [text for text in texts if tiered_clean_text(text) != reference_clean_text(text)]
+    assert not mismatches, f"{len(mismatches)} mismatches, first: {mismatches[0]!r}"
+
+
+def main():
+    print("🧹 clean_text HTML stripping parity + benchmark")
+    print("=" * 50)
+
+    for text, expected in GOLDEN:
+        assert tiered_clean_text(text) == expected, f"golden mismatch for {text!r}"
+        assert reference_clean_text(text) == expected, f"BeautifulSoup output changed for {text!r}"
+    print(f"✅ Golden outputs match ({len(GOLDEN)} cases)")
+
+    corpus = make_html_corpus(2000)
+    rng = random.Random(0)
+    fuzz = [''.join(rng.choice(FUZZ_PIECES) for _ in range(rng.randint(1, 8))) for _ in range(20000)]
+    check_parity(corpus)
+    check_parity(fuzz)
+    print(f"✅ Parity with BeautifulSoup on {len(corpus)} emails and {len(fuzz)} fuzzed fragments")
+
+    for name, texts in (('plain text', [text for text in corpus if '<' not in text]),
+                        ('HTML mail', [text for text in corpus if '<' in text]),
+                        ('mixed 50/50', corpus)):
+        before = time_per_call(reference_clean_text, texts)
+        after = time_per_call(tiered_clean_text, texts)
+        print(f"{name:<12}: BeautifulSoup {before * 1e6:7.1f} µs, tiered {after * 1e6:6.1f} µs ({before / after:5.1f}x)")
+    print(f"tiers used: {stats()}")
+
+
+if __name__ == '__main__':
+    main()
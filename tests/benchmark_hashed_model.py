@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Vocabulary TF-IDF pipeline vs feature-hashing model: accuracy, fit time, peak RSS
+Each fit runs in a fresh subprocess so peak RSS is not polluted by the other.
+Usage: python tests/benchmark_hashed_model.py [train_size]
+"""
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+
+import numpy as np
+
+from bench_corpus import make_large_corpus, build_pipeline
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def fit_and_score(mode, train_size):
+    train_texts, train_labels = make_large_corpus(train_size, seed=11, crossover=0.35)
+    test_texts, test_labels = make_large_corpus(5000, seed=12, crossover=0.35)
+    # Import both libraries up front so only the fit itself shows up in the peak
+    pipeline = build_pipeline()
+    from hashed_model import HashedSpamModel
+    hashed = HashedSpamModel()
+    baseline = peak_rss_mb()
+
+    start = time.perf_counter()
+    if mode == 'tfidf':
+        model = pipeline.fit(train_texts, train_labels)
+        fit_seconds = time.perf_counter() - start
+        predictions = model.predict(test_texts)
+        features = len(model[0].vocabulary_)
+    else:
+        model = hashed.fit(list(zip(train_texts, train_labels)))
+        fit_seconds = time.perf_counter() - start
+        predictions = model.predict_with_proba(test_texts)[0]
+        features = model.n_buckets
+
+    return {
+        'fit_seconds': fit_seconds,
+        'fit_peak_mb': peak_rss_mb() - baseline,
+        'accuracy': float(np.mean(np.asarray(predictions) == np.asarray(test_labels))),
+        'features': features,
+    }
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--run':
+        print(json.dumps(fit_and_score(sys.argv[2], int(sys.argv[3]))))
+        return
+
+    train_size = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print(f"📊 TF-IDF vocabulary vs hashing model, {train_size} training emails")
+    print("=" * 60)
+    print(f"{'model':<18} {'accuracy':>9} {'fit s':>8} {'fit peak MB':>12} {'features':>10}")
+    for mode in ('tfidf', 'hashed'):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run', mode, str(train_size)],
+            capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        print(f"{mode:<18} {result['accuracy']:9.4f} {result['fit_seconds']:8.2f} "
+              f"{result['fit_peak_mb']:12.1f} {result['features']:10d}")
+    print("\nfit peak MB is the growth of peak RSS during fit, on top of the loaded corpus")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Latency and agreement check for long-document (windowed, early-exit) scoring
+Usage: python tests/benchmark_long_document.py
+"""
+import random
+
+from bench_corpus import make_corpus, build_pipeline, time_per_call
+from spam_scorer import compile_pipeline
+from html_text import strip_html
+from text_analyzer import normalize_text
+from long_document import score_long_document, window_slots
+
+
+def clean(text):
+    return normalize_text(strip_html(text))
+
+
+def make_long_document(size_chars, spam_share, rng):
+    """Concatenate emails until size_chars, spam_share of them spam"""
+    texts, labels = make_corpus(4000, seed=rng.randint(0, 10 ** 6))
+    spam = [text for text, label in zip(texts, labels) if label]
+    ham = [text for text, label in zip(texts, labels) if not label]
+    pieces, length = [], 0
+    while length < size_chars:
+        piece = rng.choice(spam if rng.random() < spam_share else ham)
+        pieces.append(piece)
+        length += len(piece) + 1
+    return ' '.join(pieces)
+
+
+def main():
+    print("📜 Long-document scoring check + benchmark")
+    print("=" * 50)
+
+    for n_slots in (1, 2, 3, 10, 33, 1000):
+        assert sorted(window_slots(n_slots)) == list(range(n_slots)), f"bad schedule for {n_slots} slots"
+    print("✅ Window schedule visits every slot exactly once")
+
+    train_texts, train_labels = make_corpus(3000, seed=1)
+    scorer = compile_pipeline(build_pipeline().fit(train_texts, train_labels))
+
+    def full(text):
+        labels, probabilities = scorer.predict_with_proba([clean(text)])
+        return labels[0], probabilities[0]
+
+    def windowed(text):
+        return score_long_document(text, scorer.predict_with_proba, clean)
+
+    rng = random.Random(5)
+    documents = [(make_long_document(200_000, share, rng), share > 0.5) for share in (0.1, 0.3, 0.7, 0.9) * 5]
+    agree = sum(bool(windowed(text)[0]) == bool(full(text)[0]) for text, _ in documents)
+    correct = sum(bool(windowed(text)[0]) == expected for text, expected in documents)
+    print(f"✅ Windowed verdict matches full scoring on {agree}/{len(documents)} documents, "
+          f"majority label on {correct}/{len(documents)}")
+
+    print(f"{'size':>10} | {'full':>10} | {'windowed':>10} | examined | windows | early exit")
+    for size, spam_share in ((50_000, 0.9), (500_000, 0.9), (5_000_000, 0.9), (5_000_000, 0.5)):
+        text = make_long_document(size, spam_share, rng)
+        full_cost = time_per_call(full, [text], repeat=3)
+        windowed_cost = time_per_call(windowed, [text], repeat=3)
+        _, _, coverage = windowed(text)
+        print(f"{size:>10,} | {full_cost * 1e3:7.1f} ms | {windowed_cost * 1e3:7.1f} ms | "
+              f"{coverage['fraction_examined']:7.1%} | {coverage['windows_scored']:7} | {coverage['early_exit']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Recall check and benchmark for the near-duplicate verdict index
+Usage: python tests/benchmark_near_duplicates.py [entries]
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from bench_corpus import make_corpus, time_per_call
+from text_analyzer import normalize_text
+from near_duplicates import NearDuplicateIndex
+
+
+def mutate(text, words, rng):
+    """Campaign-style copy: a few words replaced by per-recipient tokens"""
+    tokens = text.split()
+    for _ in range(words):
+        tokens[rng.randrange(len(tokens))] = f"name{rng.randrange(10 ** 6)}"
+    return ' '.join(tokens)
+
+
+def campaign_recall(templates, labels, words, rng, copies=20):
+    """Fraction of campaign copies answered from the index, and false matches of unrelated texts"""
+    index = NearDuplicateIndex(min_confidence=0.0)
+    hits = wrong = 0
+    for template, label in zip(templates[:50], labels):
+        for _ in range(copies):
+            verdict, signature = index.lookup(normalize_text(mutate(template, words, rng)))
+            if verdict is None:
+                index.add(signature, label, [1.0 - label, float(label)])
+            else:
+                hits += 1
+                wrong += verdict[0] != label
+    unrelated = sum(index.lookup(normalize_text(text))[0] is not None for text in templates[50:])
+    return hits / (50 * copies), wrong, unrelated, len(templates) - 50
+
+
+def main():
+    capacity = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print("🧬 Near-duplicate index check + benchmark")
+    print("=" * 50)
+
+    rng = random.Random(4)
+    templates, labels = make_corpus(250, seed=6, min_phrases=5, max_phrases=9)
+    for words in (1, 2, 3):
+        recall, wrong, unrelated, n_unrelated = campaign_recall(templates, labels, words, rng)
+        assert wrong == 0
+        print(f"✅ {words} word(s) changed per copy: {recall:.0%} of copies reuse a verdict, "
+              f"{unrelated}/{n_unrelated} unrelated texts matched")
+
+    texts = [normalize_text(text) for text in make_corpus(2000, seed=9, min_phrases=5, max_phrases=9)[0]]
+    signer = NearDuplicateIndex(capacity=16)
+    signature_cost = time_per_call(signer.signature, texts)
+    print(f"✅ Signature: {signature_cost * 1e6:.1f} µs per text (~{np.mean([len(t.split()) for t in texts]):.0f} words)")
+
+    # Fill to capacity with random signatures; the last quarter goes in twice to exercise eviction
+    # Storage is preallocated, so the memory is what the constructor and the first insert allocate
+    generator = np.random.default_rng(1)
+    signatures = generator.integers(0, 2 ** 32, (capacity + capacity // 4, 32), dtype=np.uint32)
+    tracemalloc.start()
+    index = NearDuplicateIndex(capacity=capacity)
+    index.add(signatures[0], 1, [0.02, 0.98])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for signature in signatures[1:]:
+        index.add(signature, 1, [0.02, 0.98])
+    insert_seconds = (time.perf_counter() - start) / len(signatures)
+    assert len(index) == capacity and index.evictions == capacity // 4
+
+    recent = signatures[-1000:].copy()
+    recent[:, :3] ^= 1  # 3 of 32 positions differ: estimated similarity 0.91
+    evicted = signatures[:1000]
+    misses = generator.integers(0, 2 ** 32, (1000, index.num_perm), dtype=np.uint32)
+    assert all(index.query(signature) is not None for signature in recent)
+    assert not any(index.query(signature) for signature in evicted)
+    assert not any(index.query(signature) for signature in misses)
+    hit_cost = time_per_call(index.query, recent)
+    miss_cost = time_per_call(index.query, misses)
+
+    index.set_model_version('next')
+    assert index.query(recent[0]) is None and len(index) == 0
+    print(f"✅ {capacity} entries: insert {insert_seconds * 1e6:.1f} µs, query hit {hit_cost * 1e6:.1f} µs, "
+          f"miss {miss_cost * 1e6:.1f} µs")
+    print(f"   Memory {peak / 1024 / 1024:.0f} MB, {peak / capacity:.0f} bytes per entry")
+
+
+if __name__ == '__main__':
+    main()
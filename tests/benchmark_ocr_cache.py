@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Check and benchmark of the perceptual-hash OCR cache on a stream of repeated screenshots
+A few campaign images arrive again and again, re-encoded as JPEG, resized or inside a
+new border, mixed with one-off images. Reports hash distances between copies, between
+different messages on one template and after a one-line edit, hit rate, false hits,
+lookup time against the OCR time a hit saves (preprocessing only when Tesseract is not
+installed), eviction at capacity and hits through the shared SQLite tier.
+Usage: python tests/benchmark_ocr_cache.py [requests]
+"""
+import io
+import os
+import sys
+import time
+import random
+import tempfile
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageOps
+
+from bench_corpus import SPAM_PHRASES, FILLER_WORDS
+from benchmark_ocr_preprocess import load_font, screenshot, tesseract_available
+from ocr_cache import OcrCache, fingerprint, hamming
+from ocr_engine import extract_text, load_image, preprocess_image
+
+
+def variant(image, rng):
+    """A copy of an image as spam campaigns resend it"""
+    kind = rng.choice(['jpeg', 'resize', 'border', 'jpeg+border'])
+    if 'border' in kind:
+        colour = rng.choice([(255, 255, 255), (0, 0, 0), (230, 190, 40), (40, 90, 200)])
+        image = ImageOps.expand(image, rng.randint(5, 60), fill=colour)
+    if kind == 'resize':
+        scale = rng.uniform(0.6, 1.7)
+        image = image.resize((int(image.width * scale), int(image.height * scale)), Image.BICUBIC)
+    buffer = io.BytesIO()
+    if 'jpeg' in kind:
+        image.save(buffer, 'JPEG', quality=rng.randint(50, 90))
+    else:
+        image.save(buffer, 'PNG')
+    buffer.seek(0)
+    return buffer
+
+
+def normalized(buffer):
+    return load_image(buffer)[0]
+
+
+def filler_line(rng):
+    return ' '.join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(5, 8))).capitalize()
+
+
+def render(lines, font_size):
+    """A message on the fixed screenshot template: same size, colours, header bar and font"""
+    image = Image.new('RGB', (900, 60 + 40 * len(lines)), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 900, 30), fill=(66, 103, 178))
+    font = load_font(font_size)
+    for i, line in enumerate(lines):
+        draw.text((20, 45 + 40 * i), line, fill=(20, 20, 20), font=font)
+    return image
+
+
+def template_distances(rng, cache, pairs=200):
+    """Bit distances of copies, of different messages and of one-line edits on one template"""
+    copies, different, edited = [], [], []
+    for _ in range(pairs):
+        font_size = rng.choice([18, 20, 22])
+        lines = [rng.choice(SPAM_PHRASES)] + [filler_line(rng) for _ in range(3)]
+        other = [rng.choice(SPAM_PHRASES)] + [filler_line(rng) for _ in range(3)]
+        edit = list(lines)
+        edit[rng.randrange(1, len(lines))] = filler_line(rng)
+        signature = fingerprint(normalized(variant(render(lines, font_size), rng)))
+        for distances, shown in ((copies, lines), (different, other), (edited, edit)):
+            distances.append(int(hamming([fingerprint(normalized(variant(render(shown, font_size), rng)))], signature)[0]))
+    return np.array(copies), np.array(different), np.array(edited)
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    print("🗂️  OCR cache check + benchmark")
+    print("=" * 50)
+    rng = random.Random(25)
+    campaigns = [screenshot(rng, dark=i % 4 == 3)[0] for i in range(12)]
+    cache = OcrCache(max_entries=1000)
+
+    # Distances on one template: a hit on another message would reuse its text for this image
+    copies, different, edited = template_distances(rng, cache)
+    assert min(different) > cache.max_distance, "different text on the same template must miss"
+    copy_hits = np.mean(copies <= cache.max_distance)
+    edit_hits = np.mean(edited <= cache.max_distance)
+    assert copy_hits > 0.85 and edit_hits < 0.05
+    print(f"✅ Hash distance on one template: copies {np.median(copies):.0f} median / "
+          f"{np.percentile(copies, 95):.0f} p95 / {max(copies)} max, different messages {min(different)} min "
+          f"(threshold {cache.max_distance} of 256 bits)")
+    print(f"   at {cache.max_distance} bits {copy_hits:.0%} of copies hit, different messages never do, "
+          f"{edit_hits:.1%} of one-line edits reuse the old text")
+
+    # A stream where 80% of images are copies of a campaign image
+    with_ocr = tesseract_available()
+    lookup_ms, miss_ms = [], []
+    false_hits = 0
+    for _ in range(requests):
+        if rng.random() < 0.8:
+            source = rng.randrange(len(campaigns))
+            image = normalized(variant(campaigns[source], rng))
+        else:
+            source, image = None, normalized(variant(screenshot(rng)[0], rng))
+        start = time.perf_counter()
+        entry, signature = cache.lookup(image)
+        lookup_ms.append((time.perf_counter() - start) * 1000)
+        if entry is not None:
+            false_hits += entry['text'] != str(source)
+            continue
+        start = time.perf_counter()
+        if with_ocr:
+            extract_text(image, '--oem 3 --psm 6')
+        else:
+            preprocess_image(image)
+        miss_ms.append((time.perf_counter() - start) * 1000)
+        cache.put(signature, str(source), {'engines_run': []})
+
+    stats = cache.stats()
+    assert false_hits == 0, f"{false_hits} hits returned another image's text"
+    assert stats['hit_rate'] > 0.6
+    work = 'full OCR' if with_ocr else 'preprocessing (Tesseract not installed)'
+    print(f"✅ {requests} requests: hit rate {stats['hit_rate']:.1%}, {false_hits} false hits, "
+          f"{stats['entries']} entries")
+    print(f"   lookup {np.mean(lookup_ms):.1f} ms average vs {work} {np.mean(miss_ms):.0f} ms per miss")
+
+    # Size bound: the least recently used entries go first
+    small = OcrCache(max_entries=5)
+    for image in campaigns:
+        small.put(fingerprint(normalized(variant(image, rng))), 'text', {})
+    assert small.stats()['entries'] == 5 and small.stats()['evictions'] == len(campaigns) - 5
+    assert small.lookup(normalized(variant(campaigns[-1], rng)))[0] is not None
+    assert small.lookup(normalized(variant(campaigns[0], rng)))[0] is None
+    print(f"✅ Capacity 5: {small.stats()['evictions']} evicted, oldest image misses, newest hits")
+
+    # Shared tier: a second worker hits what the first one read
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'ocr.sqlite')
+        first, second = OcrCache(shared_path=path), OcrCache(shared_path=path)
+        copies = [normalized(variant(image, rng)) for image in campaigns]
+        for index, image in enumerate(copies):
+            _, signature = first.lookup(image)
+            first.put(signature, f'campaign {index}', {})
+        found = [second.lookup(image)[0] for image in copies]
+        assert [entry['text'] for entry in found] == [f'campaign {index}' for index in range(len(campaigns))]
+        print(f"✅ Shared tier: {second.stats()['shared_hits']}/{len(campaigns)} served to another worker")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark of resolution normalization before OCR on large screenshots and photos
+Each case runs in a fresh process whose peak RSS (VmHWM, which includes PIL's and
+OpenCV's buffers; Linux only) is reset before the case, so the peak is attributable to it. Compares opening at full resolution with
+load_image (header check, reduced JPEG decoding, x-height rescaling).
+Usage: python tests/benchmark_ocr_normalize.py
+"""
+import io
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import struct
+import tempfile
+import subprocess
+
+from PIL import Image, ImageDraw
+
+from bench_corpus import FILLER_WORDS
+from benchmark_ocr_preprocess import load_font, photograph
+from ocr_engine import ImageTooLarge, load_image, preprocess_image, tesseract_read
+
+
+def text_page(width, height, font_size, rng):
+    """White page filled with lines of text"""
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    font = load_font(font_size)
+    for top in range(font_size, height - 2 * font_size, int(font_size * 1.6)):
+        draw.text((font_size, top), ' '.join(rng.choice(FILLER_WORDS) for _ in range(width // (font_size * 4))),
+                  fill='black', font=font)
+    return image
+
+
+def png_header_only(width, height):
+    """PNG declaring the given size whose pixel data is a few bytes: a decompression bomb's header"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    header = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(b'\0' * 64)) + chunk(b'IEND', b'')
+
+
+def _status_kb(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+
+
+def run_case(path, mode):
+    """Child process: open and preprocess one image; prints time and peak memory as JSON"""
+    with open(path, 'rb') as handle:
+        data = handle.read()
+    # Reset the peak RSS to the current RSS (a forked child otherwise inherits its parent's)
+    with open('/proc/self/clear_refs', 'w') as clear_refs:
+        clear_refs.write('5')
+    baseline = _status_kb('VmRSS')
+    start = time.perf_counter()
+    if mode == 'full':
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        report = {'size': list(image.size)}
+    else:
+        image, report = load_image(io.BytesIO(data))
+    opened = time.perf_counter()
+    processed, plan = preprocess_image(image)
+    done = time.perf_counter()
+    result = {
+        'open_ms': (opened - start) * 1000,
+        'preprocess_ms': (done - opened) * 1000,
+        'profile': plan['profile'],
+        'size': report['size'],
+        'x_height': report.get('x_height'),
+        'peak_mb': (_status_kb('VmHWM') - baseline) / 1024,
+    }
+    try:
+        start = time.perf_counter()
+        tesseract_read(processed, '--oem 3 --psm 6')
+        result['ocr_ms'] = (time.perf_counter() - start) * 1000
+    except Exception:
+        pass
+    print(json.dumps(result))
+
+
+def measure(path, mode):
+    output = subprocess.run([sys.executable, __file__, '--case', path, mode],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    print("📐 OCR resolution normalization benchmark")
+    print("=" * 50)
+    rng = random.Random(24)
+
+    warm_up = io.BytesIO()
+    Image.new('L', (64, 64), 255).save(warm_up, 'PNG')
+    load_image(warm_up)  # PIL's format plugins load on first use
+    for side in (10000, 60000):
+        bomb = png_header_only(side, side)
+        start = time.perf_counter()
+        try:
+            load_image(io.BytesIO(bomb))
+            raise AssertionError("decompression bomb was decoded")
+        except ImageTooLarge:
+            pass
+        print(f"✅ {side}x{side} PNG header ({len(bomb)} bytes) refused in "
+              f"{(time.perf_counter() - start) * 1e6:.0f} µs")
+
+    cases = [
+        ('4K screenshot PNG', 'png', lambda: text_page(2160, 3840, 54, rng)),
+        ('12 MP photo JPEG', 'jpg', lambda: photograph(text_page(4000, 3000, 72, rng), rng)),
+        ('24 MP photo JPEG', 'jpg', lambda: photograph(text_page(6000, 4000, 96, rng), rng)),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        for name, extension, make in cases:
+            path = os.path.join(directory, f"case.{extension}")
+            make().save(path, quality=90) if extension == 'jpg' else make().save(path)
+            full, normalized = measure(path, 'full'), measure(path, 'normalized')
+            for label, result in (('full', full), ('normalized', normalized)):
+                line = (f"   {label:>10}: {result['size'][0]}x{result['size'][1]} "
+                        f"open {result['open_ms']:6.1f} ms + {result['profile']} preprocessing "
+                        f"{result['preprocess_ms']:7.1f} ms, peak +{result['peak_mb']:5.0f} MB")
+                if 'ocr_ms' in result:
+                    line += f", Tesseract {result['ocr_ms']:6.0f} ms"
+                if label == 'full':
+                    print(f"✅ {name}")
+                else:
+                    line += f" (x-height {result['x_height']} px)"
+                print(line)
+            assert normalized['size'][0] * normalized['size'][1] <= 4000000
+            if extension == 'jpg':
+                assert normalized['peak_mb'] < full['peak_mb']
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--case':
+        run_case(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Backpressure check and benchmark for the shared OCR worker pool
+The burst comes from separate processes, one request each, as sync gunicorn workers send it.
+Usage: python tests/benchmark_ocr_pool.py [workers] [queue_size]
+"""
+import os
+import sys
+import time
+import multiprocessing
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Make the root-level app modules importable when run as `python tests/benchmark_ocr_pool.py`
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from ocr_pool import OcrPoolClient, OcrQueueFull, start_service  # noqa: E402
+
+
+def make_image(text, seed=0):
+    """Noisy, photo-like text image, so every job pays for the full preprocessing"""
+    image = Image.new('L', (900, 120), 'white')
+    ImageDraw.Draw(image).text((10, 50), text, fill='black')
+    noise = np.random.default_rng(seed).normal(0, 10, (120, 900))
+    return Image.fromarray(np.clip(np.asarray(image) + noise, 0, 255).astype(np.uint8))
+
+
+def submit(address, image, results):
+    """One web worker's request through its own client"""
+    start = time.perf_counter()
+    try:
+        text, _ = OcrPoolClient(address).extract_text(image)
+    except OcrQueueFull:
+        results.put(None)
+        return
+    results.put((text, time.perf_counter() - start))
+
+
+def burst(address, images):
+    """Submit every image at once from its own forked process; returns (texts, rejected, latencies)"""
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=submit, args=(address, image, results)) for image in images]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    served = [outcome for outcome in outcomes if outcome is not None]
+    return [text for text, _ in served], len(outcomes) - len(served), sorted(seconds for _, seconds in served)
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    queue_size = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    print("🖼️  OCR pool check + benchmark")
+    print("=" * 50)
+
+    service = start_service(workers=workers, queue_size=queue_size, timeout=120, tesseract_config='--oem 3 --psm 6')
+    pool = OcrPoolClient(service.address)
+    start = time.perf_counter()
+    warm, _ = pool.extract_text(make_image("WIN A FREE PRIZE CLICK HERE NOW"), timeout=120)
+    print(f"✅ Workers started, first OCR in {time.perf_counter() - start:.1f} s: {warm!r}")
+
+    capacity = workers + queue_size
+    images = [make_image(f"Claim your reward number {i} before midnight", i) for i in range(capacity * 2)]
+    start = time.perf_counter()
+    texts, rejected, latencies = burst(service.address, images)
+    elapsed = time.perf_counter() - start
+    stats = pool.stats()
+    assert len(texts) + rejected == len(images)
+    assert rejected >= len(images) - capacity, "submissions beyond workers + queue_size must be rejected across processes"
+    assert stats['in_flight'] == 0
+    print(f"✅ Burst of {len(images)} from {len(images)} processes: {len(texts)} served, {rejected} rejected at once (capacity {capacity})")
+    print(f"   {elapsed:.1f} s total, latency p50 {latencies[len(latencies) // 2]:.2f} s, "
+          f"max {latencies[-1]:.2f} s, {stats['avg_seconds']:.2f} s average per OCR")
+    service.shutdown()
+
+
+if __name__ == '__main__':
+    main()
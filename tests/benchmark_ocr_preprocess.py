@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the OCR preprocessing planner on clean and photographed screenshots
+Reports preprocessing time per image and, when Tesseract is installed, OCR character
+accuracy, for the planner and for the previous always-denoise pipeline.
+Usage: python tests/benchmark_ocr_preprocess.py [images_per_group]
+"""
+import io
+import re
+import sys
+import time
+import random
+import difflib
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageFont
+
+from bench_corpus import SPAM_PHRASES, FILLER_WORDS
+import ocr_engine
+from ocr_engine import cv2, preprocess_image, tesseract_read
+
+FONT_PATH = 'DejaVuSans.ttf'
+
+
+def load_font(size):
+    try:
+        return ImageFont.truetype(FONT_PATH, size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+
+def screenshot(rng, dark=False, low_contrast=False):
+    """Rendered message screenshot: a header bar and a few lines of text; returns (image, text)"""
+    lines = [rng.choice(SPAM_PHRASES)] + [
+        ' '.join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(5, 8))).capitalize() for _ in range(3)
+    ]
+    background, ink, header = (255, 255, 255), (20, 20, 20), (66, 103, 178)
+    if dark:
+        background, ink, header = (30, 30, 30), (225, 225, 225), (50, 50, 60)
+    elif low_contrast:
+        background, ink, header = (240, 240, 240), (180, 180, 180), (225, 225, 230)
+    font = load_font(rng.choice([18, 20, 22]))
+    image = Image.new('RGB', (900, 60 + 40 * len(lines)), background)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 900, 30), fill=header)
+    for i, line in enumerate(lines):
+        draw.text((20, 45 + 40 * i), line, fill=ink, font=font)
+    return image, '\n'.join(lines)
+
+
+def shade(image, rng):
+    """Screenshot lit unevenly, as from a scanner lid shadow or a screen at an angle"""
+    pixels = np.asarray(image).astype(np.float32)
+    height, width = pixels.shape[:2]
+    x = np.linspace(0, 1, width)[np.newaxis, :, np.newaxis]
+    y = np.linspace(0, 1, height)[:, np.newaxis, np.newaxis]
+    lighting = 1.0 - rng.uniform(0.3, 0.5) * (x * rng.uniform(0.5, 1) + y * rng.uniform(0.5, 1))
+    return Image.fromarray(np.clip(pixels * lighting, 0, 255).astype(np.uint8))
+
+
+def photograph(image, rng):
+    """Phone photo of a screen: tilt, blur, uneven lighting, sensor noise and JPEG"""
+    image = image.rotate(rng.uniform(-2, 2), resample=Image.BICUBIC, expand=True, fillcolor=(200, 200, 200))
+    image = image.filter(ImageFilter.GaussianBlur(rng.uniform(0.6, 1.0)))
+    pixels = np.asarray(image).astype(np.float32)
+    height, width = pixels.shape[:2]
+    x = np.linspace(0, 1, width)[np.newaxis, :, np.newaxis]
+    y = np.linspace(0, 1, height)[:, np.newaxis, np.newaxis]
+    lighting = 1.0 - rng.uniform(0.25, 0.45) * (x * rng.random() + y * rng.random())
+    noise = np.random.default_rng(rng.randrange(2 ** 32)).normal(0, rng.uniform(8, 14), pixels.shape)
+    pixels = np.clip(pixels * lighting + noise, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=rng.randint(55, 75))
+    return Image.open(io.BytesIO(buffer.getvalue())).convert('RGB')
+
+
+def legacy_preprocess(image):
+    """The previous pipeline: enhancement, BGR round trip and denoising on every image"""
+    image = ImageEnhance.Sharpness(ImageEnhance.Contrast(image.convert('L')).enhance(2.0)).enhance(1.5)
+    cv_image = cv2.fastNlMeansDenoising(cv2.cvtColor(np.array(image), cv2.COLOR_GRAY2BGR))
+    gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+def accuracy(expected, actual):
+    normalize = lambda text: re.sub(r'\s+', ' ', text).strip().lower()
+    return difflib.SequenceMatcher(None, normalize(expected), normalize(actual)).ratio()
+
+
+def tesseract_available():
+    try:
+        tesseract_read(Image.new('L', (60, 30), 255), '--psm 6')
+        return True
+    except Exception:
+        return False
+
+
+def main():
+    per_group = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    print("🧾 OCR preprocessing planner benchmark")
+    print("=" * 50)
+    if not ocr_engine.CV2_AVAILABLE:
+        print("OpenCV is not installed: every image is planned as 'none'")
+        return
+
+    rng = random.Random(23)
+    groups = {
+        'clean screenshot': [screenshot(rng) for _ in range(per_group)],
+        'dark mode': [screenshot(rng, dark=True) for _ in range(per_group)],
+        'low contrast': [screenshot(rng, low_contrast=True) for _ in range(per_group)],
+    }
+    groups['uneven lighting'] = [(shade(image, rng), text) for image, text in
+                                 [screenshot(rng) for _ in range(per_group)]]
+    groups['photographed'] = [(photograph(image, rng), text) for image, text in
+                              [screenshot(rng, dark=rng.random() < 0.25) for _ in range(per_group)]]
+    expected_profiles = {
+        'clean screenshot': {'none'}, 'dark mode': {'none'}, 'low contrast': {'otsu'},
+        'uneven lighting': {'adaptive'}, 'photographed': {'denoise'}
+    }
+
+    with_ocr = tesseract_available()
+    if not with_ocr:
+        print("Tesseract is not installed: reporting preprocessing time and plans only")
+
+    for name, samples in groups.items():
+        profiles, planned_ms, legacy_ms = {}, [], []
+        planned_accuracy, legacy_accuracy = [], []
+        for image, text in samples:
+            start = time.perf_counter()
+            planned, plan = preprocess_image(image)
+            planned_ms.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            legacy = legacy_preprocess(image)
+            legacy_ms.append((time.perf_counter() - start) * 1000)
+            profiles[plan['profile']] = profiles.get(plan['profile'], 0) + 1
+            if with_ocr:
+                planned_accuracy.append(accuracy(text, tesseract_read(planned, '--oem 3 --psm 6')[0]))
+                legacy_accuracy.append(accuracy(text, tesseract_read(legacy, '--oem 3 --psm 6')[0]))
+
+        assert set(profiles) <= expected_profiles[name], f"{name}: planned {profiles}"
+        line = (f"✅ {name:>16}: {profiles}, preprocessing {np.mean(planned_ms):6.1f} ms "
+                f"(always-denoise {np.mean(legacy_ms):6.1f} ms)")
+        if with_ocr:
+            line += f", accuracy {np.mean(planned_accuracy):.1%} (always-denoise {np.mean(legacy_accuracy):.1%})"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Parity check and microbenchmark for the compiled spam scorer
+Usage: python tests/benchmark_scorer.py
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from bench_corpus import make_corpus, build_pipeline, time_per_call
+from spam_scorer import CompiledSpamScorer, compile_pipeline
+
+
+def check_parity(pipeline, scorer, texts):
+    """Compiled scorer must return the same labels and probabilities as sklearn"""
+    expected_labels = pipeline.predict(texts)
+    expected_probabilities = pipeline.predict_proba(texts)
+    labels, probabilities = scorer.predict_with_proba(texts)
+
+    assert np.array_equal(labels, expected_labels), "label mismatch"
+    assert np.allclose(probabilities, expected_probabilities, rtol=1e-9, atol=1e-12), \
+        f"max probability error {np.abs(probabilities - expected_probabilities).max()}"
+
+
+def main():
+    print("⚙️  Compiled scorer parity + benchmark")
+    print("=" * 50)
+
+    train_texts, train_labels = make_corpus(3000, seed=1)
+    test_texts, _ = make_corpus(2000, seed=2)
+    # Edge cases: empty, all stop words, unseen vocabulary, markup
+    test_texts += ["", "the and of", "zzzz qqqq xxxx", "<b>FREE</b> money!!! click"]
+
+    pipeline = build_pipeline().fit(train_texts, train_labels)
+    scorer = compile_pipeline(pipeline)
+
+    check_parity(pipeline, scorer, test_texts)
+    print(f"✅ Parity OK on {len(test_texts)} texts ({scorer.n_features} features)")
+
+    # Round-trip through the exported .npz
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'scorer.npz')
+        scorer.save(path)
+        check_parity(pipeline, CompiledSpamScorer.load(path), test_texts)
+        print(f"✅ Parity OK after export ({os.path.getsize(path) / 1024:.0f} KB on disk)")
+
+    # Per-request cost, as /analyze used to pay it: predict + predict_proba on one text
+    sample = test_texts[:500]
+
+    def sklearn_request(text):
+        pipeline.predict([text])
+        pipeline.predict_proba([text])
+
+    pipeline_cost = time_per_call(sklearn_request, sample)
+    scorer_cost = time_per_call(lambda text: scorer.predict_with_proba([text]), sample)
+
+    print(f"sklearn pipeline : {pipeline_cost * 1e6:8.1f} µs/request")
+    print(f"compiled scorer  : {scorer_cost * 1e6:8.1f} µs/request")
+    print(f"speedup          : {pipeline_cost / scorer_cost:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
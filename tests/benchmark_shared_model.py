@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory report: sklearn pipeline vs compiled scorer vs memory-mapped scorer
+Forks workers the way gunicorn does with preload_app and reports RSS, PSS and
+private (unshared) memory of each worker after it has served some requests.
+Linux only (reads /proc/self/smaps_rollup).
+Usage: python tests/benchmark_shared_model.py [workers] [corpus_size]
+"""
+import gc
+import os
+import sys
+import json
+import tempfile
+import subprocess
+
+import joblib
+
+from bench_corpus import make_corpus, make_large_corpus, build_pipeline
+from spam_scorer import compile_pipeline, MappedSpamScorer
+
+
+def memory_kb():
+    """Rss / Pss / Private memory of the current process in kB"""
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':'):
+                values[parts[0][:-1]] = int(parts[1])
+    return {
+        'rss': values.get('Rss', 0),
+        'pss': values.get('Pss', 0),
+        'private': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+
+def run_workers(label, predict, texts, workers):
+    """Fork workers that serve requests, then report their memory"""
+    gc.collect()
+    reports = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for text in texts:
+                predict(text)
+            gc.collect()
+            os.write(write_fd, json.dumps(memory_kb()).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            reports.append(json.loads(pipe.read()))
+        os.waitpid(pid, 0)
+
+    avg = {key: sum(report[key] for report in reports) / len(reports) for key in reports[0]}
+    print(f"{label:<22} {avg['rss'] / 1024:9.1f} {avg['pss'] / 1024:9.1f} {avg['private'] / 1024:12.1f}")
+    return avg
+
+
+def serve_mode(mode, model_path, mmap_path, workers):
+    """Load one model flavour in a fresh master process and fork workers from it"""
+    requests = make_corpus(300, seed=9)[0]
+    if mode == 'pipeline':
+        model = joblib.load(model_path)
+        predict = lambda text: (model.predict([text]), model.predict_proba([text]))
+        label = 'sklearn pipeline'
+    elif mode == 'compiled':
+        scorer = compile_pipeline(joblib.load(model_path))
+        predict = lambda text: scorer.predict_with_proba([text])
+        label = 'compiled (dict vocab)'
+    else:
+        # One mapped file shared through the page cache, GC frozen like gunicorn.conf.py
+        mapped = MappedSpamScorer.open(mmap_path)
+        gc.freeze()
+        predict = lambda text: mapped.predict_with_proba([text])
+        label = 'memory-mapped'
+    master = memory_kb()
+    avg = run_workers(label, predict, requests, workers)
+    print(json.dumps({'master': master, 'worker': avg}))
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        serve_mode(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]))
+        return
+
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    corpus_size = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    texts, labels = make_large_corpus(corpus_size)
+    pipeline = build_pipeline()
+    pipeline.set_params(tfidfvectorizer__max_features=None)
+    pipeline.fit(texts, labels)
+
+    print(f"🧠 Per-worker memory with {workers} forked workers, "
+          f"{len(pipeline[0].vocabulary_)} features")
+    print("=" * 60)
+    print(f"{'mode':<22} {'RSS MB':>9} {'PSS MB':>9} {'private MB':>12}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = os.path.join(tmp, 'spam_model.joblib')
+        mmap_path = os.path.join(tmp, 'spam_model.mmap')
+        joblib.dump(pipeline, model_path)
+        compile_pipeline(pipeline).save_mapped(mmap_path)
+
+        for mode in ('pipeline', 'compiled', 'mapped'):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--serve', mode, model_path, mmap_path, str(workers)],
+                capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()
+            print(output[0])
+            results[mode] = json.loads(output[-1])['worker']
+
+        print(f"\nmapped artifact on disk: {os.path.getsize(mmap_path) / 1024 / 1024:.1f} MB")
+
+    print(f"RSS per worker:            {results['pipeline']['rss'] / 1024:.1f} MB -> {results['mapped']['rss'] / 1024:.1f} MB")
+    print(f"private memory per worker: {results['pipeline']['private'] / 1024:.1f} MB -> {results['mapped']['private'] / 1024:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Correctness check and benchmark for Unicode folding in the analyzer
+Usage: python tests/benchmark_unicode_fold.py
+"""
+import io
+import random
+
+import joblib
+
+from bench_corpus import make_corpus, build_pipeline, time_per_call
+from spam_scorer import compile_pipeline
+from text_analyzer import SpamTextAnalyzer, fold_text, CONFUSABLES
+
+FOLD_CASES = [
+    ("Ｆｒｅｅ ｍｏｎｅｙ", "Free money"),                 # fullwidth
+    ("𝐖𝐈𝐍𝐍𝐄𝐑 𝓬𝓵𝓲𝓬𝓴", "WINNER click"),                 # math alphanumerics
+    ("V​i‌a‍g⁠r﻿a", "Viagra"),  # zero-width characters
+    ("Сlіck hеrе", "Click here"),                         # Cyrillic look-alikes
+    ("Vïägrä gυaranteed", "Viagra guaranteed"),           # accents, Greek upsilon
+    ("f̶r̶e̶e̶", "free"),             # strike-through combining marks
+    ("ﬁnancial ﬂow", "financial flow"),                   # ligatures
+    ("plain ASCII stays the same", "plain ASCII stays the same"),
+]
+
+_FULLWIDTH = {chr(code): chr(code + 0xFEE0) for code in range(0x21, 0x7F)}
+_LOOKALIKES = {}
+for _char, _ascii in CONFUSABLES.items():
+    _LOOKALIKES.setdefault(_ascii, _char)
+
+
+def obfuscate(text, rng, rate=0.3):
+    """Spammer-style copy: look-alike letters, fullwidth letters and zero-width joiners"""
+    out = []
+    for char in text:
+        roll = rng.random()
+        if roll < rate and char in _LOOKALIKES:
+            out.append(_LOOKALIKES[char])
+        elif roll < rate * 1.5 and char in _FULLWIDTH:
+            out.append(_FULLWIDTH[char])
+        else:
+            out.append(char)
+        if char.isalpha() and rng.random() < rate / 3:
+            out.append('​')
+    return ''.join(out)
+
+
+def main():
+    print("🔡 Unicode folding check + benchmark")
+    print("=" * 50)
+
+    for text, expected in FOLD_CASES:
+        assert fold_text(text) == expected, f"{text!r} folded to {fold_text(text)!r}"
+        assert fold_text(fold_text(text)) == fold_text(text)
+    print(f"✅ {len(FOLD_CASES)} obfuscation styles fold to ASCII")
+
+    rng = random.Random(12)
+    texts, labels = make_corpus(3000, seed=13)
+    train, train_labels = texts[:2000], labels[:2000]
+    test = texts[2000:]
+    obfuscated = [obfuscate(text, rng) for text in test]
+
+    folding = build_pipeline().fit(train, train_labels)
+    plain = build_pipeline().set_params(tfidfvectorizer__analyzer=SpamTextAnalyzer(
+        stop_words='english', ngram_range=(1, 3), fold_unicode=False)).fit(train, train_labels)
+    reference = folding.predict(test)
+    plain_agreement = (plain.predict(obfuscated) == reference).mean()
+    folded_agreement = (folding.predict(obfuscated) == reference).mean()
+    assert folded_agreement == 1.0
+    print(f"✅ Verdicts on obfuscated copies match the clean text: {plain_agreement:.1%} without folding, "
+          f"{folded_agreement:.1%} with")
+
+    # Training and serving share the analyzer: pickled and compiled models fold the same way
+    buffer = io.BytesIO()
+    joblib.dump(folding, buffer)
+    buffer.seek(0)
+    restored = joblib.load(buffer)
+    scorer = compile_pipeline(restored)
+    assert (restored.predict(obfuscated) == reference).all()
+    assert all(scorer.analyze(text) == restored.steps[0][1].analyzer(text) for text in obfuscated[:300])
+    print("✅ Pickled pipeline and compiled scorer fold identically")
+
+    with_fold = SpamTextAnalyzer(stop_words='english', ngram_range=(1, 3))
+    without_fold = SpamTextAnalyzer(stop_words='english', ngram_range=(1, 3), fold_unicode=False)
+    for name, sample in (('ASCII', test[:1000]), ('obfuscated', obfuscated[:1000])):
+        base = time_per_call(without_fold, sample)
+        folded = time_per_call(with_fold, sample)
+        fold_only = time_per_call(fold_text, sample)
+        print(f"{name:>10}: analyzer {base * 1e6:6.1f} µs -> {folded * 1e6:6.1f} µs with folding "
+              f"(fold_text alone {fold_only * 1e6:5.1f} µs, {sum(map(len, sample)) / len(sample):.0f} chars)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Text normalization and tokenization shared by clean_text(), training and serving
+normalize_text() does clean_text()'s whitespace collapsing and '!!'/'??' squashing
+in a single regex scan. SpamTextAnalyzer lowercases, tokenizes, drops stop words
+and emits n-grams in one pass; it is passed to TfidfVectorizer as its analyzer
+and reused by the compiled scorers, so a model sees exactly the same terms when
+it is trained and when it serves.
+
+fold_text() undoes the usual vocabulary-dodging tricks before tokenizing: NFKC
+(fullwidth and math-alphanumeric letters, ligatures), then one str.translate
+with a table built at import that deletes zero-width and other invisible
+characters and leftover combining marks, folds accented Latin letters to their
+base letter and Cyrillic/Greek look-alikes to ASCII (genuine Cyrillic or Greek
+words fold too, the same way in training and serving). ASCII text is returned
+untouched, so only messages that contain other characters pay for it.
+"""
+import re
+import unicodedata
+
+DEFAULT_TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+
+# Only runs that change: 2+ whitespace, any non-space whitespace, repeated ! or ?
+_NORMALIZE_RE = re.compile(r'\s\s+|[^\S ]|!!+|\?\?+')
+
+
+def _normalize_match(match):
+    first = match.group()[0]
+    return first if first in '!?' else ' '
+
+
+def normalize_text(text):
+    """Collapse whitespace to single spaces, squash repeated !/? and strip"""
+    return _NORMALIZE_RE.sub(_normalize_match, text).strip()
+
+
+# Format, joiner, bidi-control, filler and variation-selector characters that render as nothing
+_INVISIBLE_RANGES = [
+    (0x00AD, 0x00AD), (0x034F, 0x034F), (0x061C, 0x061C), (0x115F, 0x1160), (0x17B4, 0x17B5),
+    (0x180B, 0x180F), (0x200B, 0x200F), (0x202A, 0x202E), (0x2060, 0x2064), (0x2066, 0x206F),
+    (0x3164, 0x3164), (0xFE00, 0xFE0F), (0xFEFF, 0xFEFF), (0xFFA0, 0xFFA0), (0xE0000, 0xE007F),
+]
+
+# Combining marks NFKC cannot compose into a letter (strike-through, underline, stacked accents)
+_COMBINING_RANGES = [
+    (0x0300, 0x036F), (0x0483, 0x0489), (0x1AB0, 0x1AFF), (0x1DC0, 0x1DFF), (0x20D0, 0x20FF), (0xFE20, 0xFE2F),
+]
+
+# Letters from other scripts that render like ASCII letters (the ones NFKC leaves alone)
+CONFUSABLES = {
+    # Cyrillic
+    'а': 'a', 'с': 'c', 'ԁ': 'd', 'е': 'e', 'ё': 'e', 'һ': 'h', 'і': 'i', 'ї': 'i', 'ј': 'j', 'к': 'k',
+    'ӏ': 'l', 'о': 'o', 'р': 'p', 'ԛ': 'q', 'ѕ': 's', 'у': 'y', 'ԝ': 'w', 'х': 'x',
+    'А': 'A', 'В': 'B', 'С': 'C', 'Ԁ': 'D', 'Е': 'E', 'Ё': 'E', 'Н': 'H', 'Һ': 'H', 'І': 'I', 'Ї': 'I',
+    'Ӏ': 'I', 'Ј': 'J', 'К': 'K', 'М': 'M', 'О': 'O', 'Р': 'P', 'Ԛ': 'Q', 'Ѕ': 'S', 'Т': 'T', 'У': 'Y',
+    'Ԝ': 'W', 'Х': 'X',
+    # Greek
+    'α': 'a', 'ϲ': 'c', 'ε': 'e', 'ι': 'i', 'ϳ': 'j', 'κ': 'k', 'ν': 'v', 'ο': 'o', 'ρ': 'p', 'τ': 't',
+    'υ': 'u', 'χ': 'x', 'Α': 'A', 'Β': 'B', 'Ϲ': 'C', 'Ε': 'E', 'Η': 'H', 'Ι': 'I', 'Κ': 'K', 'Μ': 'M',
+    'Ν': 'N', 'Ο': 'O', 'Ρ': 'P', 'Τ': 'T', 'Υ': 'Y', 'Χ': 'X', 'Ζ': 'Z',
+    # Armenian and Latin extensions
+    'օ': 'o', 'ս': 'u', 'ı': 'i', 'ȷ': 'j', 'ɑ': 'a', 'ɡ': 'g', 'ʏ': 'y', 'ɩ': 'i', 'ꓲ': 'I',
+}
+
+
+def _build_fold_table():
+    table = {}
+    for start, end in _INVISIBLE_RANGES + _COMBINING_RANGES:
+        table.update(dict.fromkeys(range(start, end + 1)))
+    for codepoint in range(0x00C0, 0x0250):
+        base = unicodedata.normalize('NFD', chr(codepoint))[0]
+        if base.isascii() and base.isalpha():
+            table[codepoint] = base
+    table.update((ord(char), replacement) for char, replacement in CONFUSABLES.items())
+    return table
+
+
+_FOLD_TABLE = _build_fold_table()
+
+
+def fold_text(text):
+    """NFKC, invisible-character stripping and look-alike folding; ASCII text is returned as is"""
+    if text.isascii():
+        return text
+    return unicodedata.normalize('NFKC', text).translate(_FOLD_TABLE)
+
+
+class SpamTextAnalyzer:
+    """Fused fold -> lowercase -> tokenize -> stop words -> n-grams
+
+    With fold_unicode=False the output is the same as sklearn's word analyzer.
+    """
+
+    def __init__(self, stop_words='english', ngram_range=(1, 1), lowercase=True, token_pattern=DEFAULT_TOKEN_PATTERN,
+                 fold_unicode=True):
+        if stop_words == 'english':
+            from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+            stop_words = ENGLISH_STOP_WORDS
+        self.stop_words = frozenset(stop_words) if stop_words else None
+        self.ngram_range = tuple(ngram_range)
+        self.lowercase = lowercase
+        self.token_pattern = token_pattern
+        self.fold_unicode = fold_unicode
+        self._token_re = re.compile(token_pattern)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_token_re']
+        return state
+
+    def __setstate__(self, state):
+        # Analyzers pickled before folding existed were trained without it
+        state.setdefault('fold_unicode', False)
+        self.__dict__.update(state)
+        self._token_re = re.compile(self.token_pattern)
+
+    def __repr__(self):
+        return f"SpamTextAnalyzer(ngram_range={self.ngram_range}, lowercase={self.lowercase}, fold_unicode={self.fold_unicode})"
+
+    def tokens(self, text):
+        """Fold, lowercase, split on the token pattern and drop stop words"""
+        if self.fold_unicode:
+            text = fold_text(text)
+        if self.lowercase:
+            text = text.lower()
+        stop_words = self.stop_words
+        if stop_words is None:
+            return self._token_re.findall(text)
+        return [token for token in self._token_re.findall(text) if token not in stop_words]
+
+    def ngrams(self, tokens):
+        """Expand tokens into n-grams in sklearn's order (unigrams, then bigrams, ...)"""
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+
+        n_tokens = len(tokens)
+        if min_n == 1:
+            terms = list(tokens)
+            min_n = 2
+        else:
+            terms = []
+        for n in range(min_n, min(max_n, n_tokens) + 1):
+            terms.extend(' '.join(tokens[i:i + n]) for i in range(n_tokens - n + 1))
+        return terms
+
+    def __call__(self, text):
+        return self.ngrams(self.tokens(text))
@@ -0,0 +1,203 @@
+"""
+Verdict cache
+In-process LRU + TTL cache of spam verdicts keyed by a hash of the cleaned text
+and the model version, with an optional SQLite tier shared by all gunicorn
+workers on the same host. Changing the model version invalidates every entry.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SharedVerdictStore:
+    """SQLite-backed verdict tier shared across worker processes"""
+
+    def __init__(self, path, max_entries=100000, prune_every=500):
+        self.path = path
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._writes = 0
+        self._init_schema()
+
+    def _connect(self):
+        """One connection per thread per process (connections must not cross a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS verdicts (
+                key TEXT PRIMARY KEY,
+                model_version TEXT NOT NULL,
+                label TEXT NOT NULL,
+                probabilities TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT label, probabilities FROM verdicts WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put(self, key, model_version, label, probabilities, expires_at):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO verdicts (key, model_version, label, probabilities, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (key, model_version, json.dumps(label), json.dumps(probabilities), expires_at)
+        )
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune(conn)
+
+    def prune(self, conn=None):
+        """Drop expired rows, then the oldest rows beyond max_entries"""
+        conn = conn or self._connect()
+        conn.execute("DELETE FROM verdicts WHERE expires_at <= ?", (time.time(),))
+        conn.execute("""
+            DELETE FROM verdicts WHERE key IN (
+                SELECT key FROM verdicts ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+    def drop_other_versions(self, model_version):
+        self._connect().execute("DELETE FROM verdicts WHERE model_version != ?", (model_version,))
+
+
+class VerdictCache:
+    """LRU + TTL verdict cache with hit/miss/eviction counters"""
+
+    def __init__(self, max_entries=10000, ttl_seconds=3600, shared_path=None, shared_max_entries=100000):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.model_version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.shared = None
+        if shared_path:
+            try:
+                self.shared = SharedVerdictStore(shared_path, max_entries=shared_max_entries)
+                logger.info(f"Shared verdict cache at {shared_path}")
+            except Exception as e:
+                logger.warning(f"Shared verdict cache unavailable, using in-process cache only: {e}")
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.shared_hits = 0
+        self.invalidations = 0
+
+    def key_for(self, text):
+        """Cache key for a cleaned text under the current model version"""
+        digest = hashlib.sha256(text.encode('utf-8', 'surrogatepass'))
+        digest.update(b'\0' + str(self.model_version).encode('utf-8'))
+        return digest.hexdigest()
+
+    def set_model_version(self, model_version):
+        """Switch model version; every cached verdict from the old model becomes unreachable"""
+        with self._lock:
+            if model_version == self.model_version:
+                return
+            self.model_version = model_version
+            self._entries.clear()
+            self.invalidations += 1
+        if self.shared is not None:
+            try:
+                self.shared.drop_other_versions(model_version)
+            except Exception as e:
+                logger.warning(f"Could not prune shared verdict cache: {e}")
+
+    def get(self, text):
+        """Return (label, probabilities) for a cleaned text, or None on a miss"""
+        key = self.key_for(text)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1], entry[2]
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.shared is not None:
+            try:
+                found = self.shared.get(key)
+            except Exception as e:
+                logger.warning(f"Shared verdict cache read failed: {e}")
+                found = None
+            if found is not None:
+                label, probabilities = found
+                probabilities = np.asarray(probabilities, dtype=np.float64)
+                self._store_local(key, label, probabilities, now + self.ttl)
+                with self._lock:
+                    self.hits += 1
+                    self.shared_hits += 1
+                return label, probabilities
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text, label, probabilities):
+        """Cache the verdict for a cleaned text"""
+        key = self.key_for(text)
+        label = np.asarray(label).tolist()
+        expires_at = time.time() + self.ttl
+        self._store_local(key, label, np.asarray(probabilities, dtype=np.float64), expires_at)
+
+        if self.shared is not None:
+            try:
+                self.shared.put(key, str(self.model_version), label, np.asarray(probabilities).tolist(), expires_at)
+            except Exception as e:
+                logger.warning(f"Shared verdict cache write failed: {e}")
+
+    def _store_local(self, key, label, probabilities, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, label, probabilities)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'model_version': self.model_version,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'shared_tier': self.shared.path if self.shared else None,
+                'shared_hits': self.shared_hits,
+            }